@@ -14,9 +14,24 @@ from db.models import (
 from db.connect import engine
 from admin.auth import admin_auth
 from admin.сustom_admin import CustomAdmin
+from services.catalog import bump_catalog_version
+from utils.redis_connect import get_redis_no_decode
 from utils.s3_utils import upload_to_s3, get_s3_url, delete_from_s3
 
 
+class CatalogModelView(ModelView):
+    """
+    Представление моделей каталога: после изменения или удаления
+    меняется версия каталога и готовые ответы API пересобираются
+    """
+
+    async def after_model_change(self, data, model, is_created, request):
+        await bump_catalog_version(await get_redis_no_decode())
+
+    async def after_model_delete(self, model, request):
+        await bump_catalog_version(await get_redis_no_decode())
+
+
 class UserAdmin(ModelView, model=User):
     column_list = [
         "id",
@@ -48,7 +63,7 @@ class UserAdmin(ModelView, model=User):
     can_export = False
 
 
-class CategoryAdmin(ModelView, model=Category):
+class CategoryAdmin(CatalogModelView, model=Category):
     column_list = [
         "id",
         "name",
@@ -67,7 +82,7 @@ class CategoryAdmin(ModelView, model=Category):
     can_export = False
 
 
-class ProductAdmin(ModelView, model=Product):
+class ProductAdmin(CatalogModelView, model=Product):
     column_list = [
         "id",
         "name",
@@ -127,7 +142,7 @@ class ProductAdmin(ModelView, model=Product):
             )
 
 
-class SizeAdmin(ModelView, model=Size):
+class SizeAdmin(CatalogModelView, model=Size):
     column_list = ["id", "name"]
     column_searchable_list = ["id", "name"]
     column_sortable_list = ["id"]
@@ -136,7 +151,7 @@ class SizeAdmin(ModelView, model=Size):
     can_export = False
 
 
-class ProductSizeAdmin(ModelView, model=ProductSize):
+class ProductSizeAdmin(CatalogModelView, model=ProductSize):
     column_list = [
         "product_id",
         "product",
@@ -163,7 +178,7 @@ class OrderAdmin(ModelView, model=Order):
         "created_at",
     ]
     column_default_sort = [
-        ("status_sort", False),
+        ("status_rank", False),
         ("created_at", True),
     ]
     column_searchable_list = [
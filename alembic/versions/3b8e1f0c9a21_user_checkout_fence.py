@@ -0,0 +1,35 @@
+"""user_checkout_fence
+
+Revision ID: 3b8e1f0c9a21
+Revises: 72f264754325
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b8e1f0c9a21"
+down_revision: Union[str, None] = "72f264754325"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column(
+            "checkout_fence",
+            sa.BigInteger(),
+            server_default="0",
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("user", "checkout_fence")
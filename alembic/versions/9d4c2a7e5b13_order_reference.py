@@ -0,0 +1,34 @@
+"""order_reference
+
+Revision ID: 9d4c2a7e5b13
+Revises: 3b8e1f0c9a21
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4c2a7e5b13"
+down_revision: Union[str, None] = "3b8e1f0c9a21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "order",
+        sa.Column("reference", sa.String(), nullable=True),
+    )
+    op.create_unique_constraint(
+        "order_reference_key", "order", ["reference"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("order_reference_key", "order", type_="unique")
+    op.drop_column("order", "reference")
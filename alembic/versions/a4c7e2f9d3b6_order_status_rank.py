@@ -0,0 +1,47 @@
+"""order_status_rank
+
+Revision ID: a4c7e2f9d3b6
+Revises: f2b8c6d4a7e1
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c7e2f9d3b6"
+down_revision: Union[str, None] = "f2b8c6d4a7e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "order",
+        sa.Column(
+            "status_rank",
+            sa.Integer(),
+            sa.Computed(
+                "CASE status WHEN 'CREATED' THEN 1 WHEN 'COOKING' THEN 2 "
+                "WHEN 'READY' THEN 3 WHEN 'DELIVERING' THEN 4 "
+                "WHEN 'COMPLETED' THEN 5 ELSE 6 END",
+                persisted=True,
+            ),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "ix_order_status_rank_created_at",
+        "order",
+        ["status_rank", sa.text("created_at DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_status_rank_created_at", table_name="order")
+    op.drop_column("order", "status_rank")
@@ -0,0 +1,38 @@
+"""outbox_coalesce_key
+
+Revision ID: e7a3d9b1c4f2
+Revises: c51f7b2d8e64
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a3d9b1c4f2"
+down_revision: Union[str, None] = "c51f7b2d8e64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "outbox",
+        sa.Column("coalesce_key", sa.String(), nullable=True),
+    )
+    op.create_index(
+        "ix_outbox_coalesce_key",
+        "outbox",
+        ["coalesce_key"],
+        unique=False,
+        postgresql_where=sa.text("coalesce_key IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_coalesce_key", table_name="outbox")
+    op.drop_column("outbox", "coalesce_key")
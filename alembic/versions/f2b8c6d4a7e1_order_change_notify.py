@@ -0,0 +1,46 @@
+"""order_change_notify
+
+Revision ID: f2b8c6d4a7e1
+Revises: e7a3d9b1c4f2
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b8c6d4a7e1"
+down_revision: Union[str, None] = "e7a3d9b1c4f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_order_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify(
+                'order_changes',
+                CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER order_change_notify
+        AFTER INSERT OR DELETE OR UPDATE OF status ON "order"
+        FOR EACH ROW EXECUTE FUNCTION notify_order_change()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS order_change_notify ON "order"')
+    op.execute("DROP FUNCTION IF EXISTS notify_order_change()")
@@ -0,0 +1,156 @@
+"""
+Сравнение stdlib json и utils.json_codec (orjson) на реальных формах
+данных: ответы OrderOut и ProductOut, значения кэша fastapi-cache
+и поля корзины в Redis.
+
+Запуск из корня проекта:
+    python benchmarks/bench_json.py [--orders 50] [--products 100]
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi_cache.coder import JsonCoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from schemas.order import OrderOut  # noqa: E402
+from schemas.product import ProductOut  # noqa: E402
+from utils.json_codec import (  # noqa: E402
+    OrjsonCoder,
+    OrjsonResponse,
+    dumps,
+    loads,
+)
+
+
+NOW = datetime(2025, 1, 1, 12, 30)
+
+
+def make_orders(count: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "user_order_id": i,
+            "order_items": [
+                {
+                    "product_id": j,
+                    "name": f"Продукт {j}",
+                    "size_id": 1,
+                    "size_name": "Средний",
+                    "quantity": 2,
+                    "total_price": Decimal("399.80"),
+                }
+                for j in range(5)
+            ],
+            "total_amount": Decimal("1999.00"),
+            "status": "cooking",
+            "delivery": {
+                "id": i,
+                "order_id": i,
+                "delivery_type": "courier",
+                "delivery_address": "ул. Ленина, д. 1, кв. 1",
+            },
+            "created_at": NOW,
+            "updated_at": NOW,
+        }
+        for i in range(count)
+    ]
+
+
+def make_products(count: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "name": f"Продукт {i}",
+            "description": "Описание продукта " * 5,
+            "photo_name": None,
+            "category_id": 1,
+            "product_sizes": [
+                {
+                    "size": {"id": size_id, "name": f"Размер {size_id}"},
+                    "price": Decimal("199.90") * size_id,
+                    "discount": 10,
+                    "created_at": NOW,
+                    "updated_at": NOW,
+                }
+                for size_id in range(1, 4)
+            ],
+            "created_at": NOW,
+            "updated_at": NOW,
+        }
+        for i in range(count)
+    ]
+
+
+def bench(name: str, stdlib, fast, number: int):
+    stdlib_us = timeit.timeit(stdlib, number=number) / number * 1e6
+    fast_us = timeit.timeit(fast, number=number) / number * 1e6
+    print(
+        f"{name:<28}{stdlib_us:>12.1f}{fast_us:>12.1f}"
+        f"{stdlib_us / fast_us:>9.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    OrderOut.model_rebuild()
+
+    print(f"{'payload':<28}{'stdlib, us':>12}{'orjson, us':>12}{'gain':>10}")
+    for name, schema, rows in (
+        ("OrderOut", OrderOut, make_orders(args.orders)),
+        ("ProductOut", ProductOut, make_products(args.products)),
+    ):
+        adapter = TypeAdapter(list[schema])
+        # то, что FastAPI передаёт в класс ответа после response_model
+        content = adapter.dump_python(
+            adapter.validate_python(rows), mode="json"
+        )
+        bench(
+            f"{name} response",
+            lambda: JSONResponse(content),
+            lambda: OrjsonResponse(content),
+            args.number,
+        )
+        json_cached = JsonCoder.encode(rows)
+        orjson_cached = OrjsonCoder.encode(rows)
+        bench(
+            f"{name} cache encode",
+            lambda: JsonCoder.encode(rows),
+            lambda: OrjsonCoder.encode(rows),
+            args.number,
+        )
+        bench(
+            f"{name} cache decode",
+            lambda: JsonCoder.decode(json_cached),
+            lambda: OrjsonCoder.decode(orjson_cached),
+            args.number,
+        )
+
+    item = {"product_id": 1, "size_id": 2, "quantity": 3}
+    raw = json.dumps(item)
+    bench(
+        "cart item dumps",
+        lambda: json.dumps(item),
+        lambda: dumps(item),
+        args.number * 100,
+    )
+    bench(
+        "cart item loads",
+        lambda: json.loads(raw),
+        lambda: loads(raw),
+        args.number * 100,
+    )
+
+
+if __name__ == "__main__":
+    main()
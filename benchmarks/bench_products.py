@@ -0,0 +1,126 @@
+"""
+Сравнение сборки ответа /products/: ORM объекты + ProductOut
+против JSON, собранного в Postgres (ProductDO.get_all_json).
+
+Данные создаются в отдельной схеме БД из настроек и удаляются
+после замера. Запуск из корня проекта:
+    python benchmarks/bench_products.py [--sizes 100 1000 10000]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from decimal import Decimal
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import insert, text  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    async_sessionmaker,
+    create_async_engine,
+)
+from db.connect import DATABASE_URL  # noqa: E402
+from db.models import Base, Category, Product, ProductSize, Size  # noqa: E402
+from db.operations import ProductDO  # noqa: E402
+from routers.products import products_adapter  # noqa: E402
+from services.catalog import _encode  # noqa: E402
+
+
+SCHEMA = "bench_products"
+SIZES_PER_PRODUCT = 3
+
+
+async def fill(engine, count: int):
+    """Пересоздание таблиц схемы и count продуктов с размерами"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Category), [{"id": 1, "name": "Бургеры"}])
+        await conn.execute(
+            insert(Size),
+            [
+                {"id": i, "name": f"Размер {i}"}
+                for i in range(1, SIZES_PER_PRODUCT + 1)
+            ],
+        )
+        await conn.execute(
+            insert(Product),
+            [
+                {
+                    "id": i,
+                    "name": f"Продукт {i}",
+                    "description": "Описание продукта " * 5,
+                    "category_id": 1,
+                }
+                for i in range(1, count + 1)
+            ],
+        )
+        await conn.execute(
+            insert(ProductSize),
+            [
+                {
+                    "product_id": product_id,
+                    "size_id": size_id,
+                    "price": Decimal("199.90") * size_id,
+                    "discount": product_id % 30,
+                }
+                for product_id in range(1, count + 1)
+                for size_id in range(1, SIZES_PER_PRODUCT + 1)
+            ],
+        )
+
+
+async def orm_path(session) -> bytes:
+    products = await ProductDO.get_all(session=session)
+    return _encode(products_adapter, products)
+
+
+async def sql_path(session) -> bytes:
+    return (await ProductDO.get_all_json(session=session)).encode()
+
+
+async def measure(sessionmaker, build, repeat: int) -> tuple[float, int]:
+    """Медиана времени сборки тела в мс и размер тела в байтах"""
+    timings = []
+    for _ in range(repeat):
+        async with sessionmaker() as session:
+            start = time.perf_counter()
+            body = await build(session)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(body)
+
+
+async def run(sizes: list[int], repeat: int):
+    engine = create_async_engine(DATABASE_URL).execution_options(
+        schema_translate_map={None: SCHEMA}
+    )
+    sessionmaker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+    try:
+        print(f"{'products':>10}{'orm, ms':>10}{'sql, ms':>10}{'bytes':>10}")
+        for count in sizes:
+            await fill(engine, count)
+            orm_ms, _ = await measure(sessionmaker, orm_path, repeat)
+            sql_ms, size = await measure(sessionmaker, sql_path, repeat)
+            print(f"{count:>10}{orm_ms:>10.1f}{sql_ms:>10.1f}{size:>10}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
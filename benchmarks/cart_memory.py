@@ -0,0 +1,80 @@
+"""
+Память Redis на корзину: значения полей в прежнем формате (JSON)
+и в текущем (количество числом). Корзины создаются под отдельным
+префиксом в Redis из настроек и удаляются после замера.
+
+Запуск из корня проекта:
+    python benchmarks/cart_memory.py [--carts 1000] [--items 5]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.json_codec import dumps  # noqa: E402
+from utils.redis_connect import get_redis, redis_pool  # noqa: E402
+
+
+PREFIX = "bench:cart"
+
+
+def legacy_value(product_id: int, size_id: int, quantity: int) -> bytes:
+    return dumps(
+        {"product_id": product_id, "size_id": size_id, "quantity": quantity}
+    )
+
+
+def compact_value(product_id: int, size_id: int, quantity: int) -> int:
+    return quantity
+
+
+async def measure(redis, encode, carts: int, items: int) -> float:
+    """Средний MEMORY USAGE корзины в байтах"""
+    keys = [f"{PREFIX}:{user_id}" for user_id in range(carts)]
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hset(
+                key,
+                mapping={
+                    f"{product_id}:{product_id % 3 + 1}": encode(
+                        product_id, product_id % 3 + 1, product_id % 4 + 1
+                    )
+                    for product_id in range(1, items + 1)
+                },
+            )
+        await pipe.execute()
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.memory_usage(key, samples=0)
+            usage = await pipe.execute()
+    finally:
+        await redis.delete(*keys)
+    return sum(usage) / len(usage)
+
+
+async def run(carts: int, items: int):
+    try:
+        redis = await get_redis()
+        legacy = await measure(redis, legacy_value, carts, items)
+        compact = await measure(redis, compact_value, carts, items)
+    finally:
+        await redis_pool.aclose()
+    print(f"carts: {carts}, items per cart: {items}")
+    print(f"{'legacy JSON':<14}{legacy:>10.0f} bytes per cart")
+    print(f"{'quantity':<14}{compact:>10.0f} bytes per cart")
+    print(f"saved {1 - compact / legacy:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--carts", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.carts, args.items))
+
+
+if __name__ == "__main__":
+    main()
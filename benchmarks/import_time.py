@@ -0,0 +1,58 @@
+"""
+Профиль времени импорта приложения по данным `python -X importtime`,
+агрегированный по модулям верхнего уровня.
+
+Запуск из корня проекта:
+    python benchmarks/import_time.py [модуль] [--top N]
+"""
+import argparse
+import re
+import subprocess
+import sys
+from collections import Counter
+
+
+IMPORTTIME_LINE = re.compile(
+    r"import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| "
+    r"(?P<indent> *)(?P<module>\S+)"
+)
+
+
+def profile_imports(module: str = "main") -> tuple[float, Counter]:
+    """
+    Импорт модуля в отдельном процессе с -X importtime.
+    Возвращает общее время импорта в секундах и собственное время
+    (без вложенных импортов) по пакетам верхнего уровня в миллисекундах
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us = int(match["self"])
+        total += self_us
+        packages[match["module"].split(".")[0]] += self_us / 1000
+    return total / 1_000_000, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    total, packages = profile_imports(args.module)
+    print(f"import {args.module}: {total:.3f} s")
+    for package, ms in packages.most_common(args.top):
+        print(f"{ms:10.1f} ms  {package}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
@@ -15,6 +16,83 @@ class Settings(BaseSettings):
 
     STATIC_DIR: str = "static"
 
+    # 0 - по числу ядер
+    WORKERS: int = 0
+    GRACEFUL_TIMEOUT: int = 30
+    # После SIGTERM воркер отвечает 503 на /health/ready и ещё столько
+    # секунд принимает запросы, пока балансировщик снимает его
+    SHUTDOWN_DRAIN_DELAY: float = 5.0
+
+    # Прогрев при старте: соединения пулов и кэш роутов каталога
+    DB_WARMUP_CONNECTIONS: int = 2
+    REDIS_WARMUP_CONNECTIONS: int = 2
+    WARMUP_PATHS: list[str] = ["/category/", "/products/"]
+    # Время жизни результата проверок /health/ready и таймаут проверки
+    HEALTH_CHECK_TTL: float = 2.0
+    HEALTH_CHECK_TIMEOUT: float = 1.0
+
+    # Ограничение нагрузки на процесс: общий лимит запросов, резерв
+    # под оформление заказа, лимиты по префиксам роутов
+    ADMISSION_MAX_IN_FLIGHT: int = 100
+    ADMISSION_RESERVED: dict[str, int] = {"/orders/confirmation/": 10}
+    ADMISSION_ROUTE_LIMITS: dict[str, int] = {
+        "/orders/": 30,
+        "/carts/": 40,
+        "/users/": 20,
+        "/admin": 10,
+    }
+    ADMISSION_EXEMPT_PATHS: list[str] = [
+        "/products/",
+        "/category/",
+        "/health/",
+        "/metrics",
+    ]
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    ADMISSION_MAX_QUEUE: int = 500
+    ADMISSION_RETRY_AFTER: int = 5
+
+    # Объединение одинаковых одновременных GET запросов:
+    # префикс роута -> ключ с пользователем из токена
+    COALESCE_PATHS: dict[str, bool] = {
+        "/products/": False,
+        "/category/": False,
+        "/orders/": True,
+        "/users/profile/": True,
+    }
+
+    # Готовые тела ответов каталога: время жизни версии каталога
+    # (ограничивает устаревание при изменениях в обход админки)
+    # и минимальный размер тела для gzip
+    CATALOG_CACHE_TTL: int = 300
+    CATALOG_GZIP_MIN_SIZE: int = 500
+    # Число готовых тел ответов каталога в памяти процесса
+    CATALOG_MEMORY_ITEMS: int = 256
+    # Сборка JSON списка продуктов в Postgres одним запросом
+    # (photo_path без проверки файла в S3)
+    CATALOG_SQL_RENDER: bool = False
+    # Время жизни блокировки оформления заказа пользователя, мс
+    # (больше худшего времени транзакции заказа)
+    CHECKOUT_LOCK_TTL_MS: int = 5000
+    # Приём заказов через Redis Stream: запрос отвечает 202 с номером
+    # заказа, заказы пишут консьюмеры пачками по ORDER_INTAKE_BATCH_SIZE.
+    # ORDER_INTAKE_CONSUMERS - консьюмеров в каждом процессе приложения
+    # (0 - только отдельный scripts/order_intake_worker.py)
+    ORDER_INTAKE_ENABLED: bool = False
+    ORDER_INTAKE_BATCH_SIZE: int = 20
+    ORDER_INTAKE_CONSUMERS: int = 1
+    ORDER_INTAKE_BLOCK_MS: int = 2000
+    # Через сколько неподтверждённое сообщение забирает другой консьюмер
+    ORDER_INTAKE_CLAIM_IDLE_MS: int = 30000
+
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLE_RATE: float = 0.1
+    LOG_SAMPLED_PATHS: list[str] = ["/products/", "/category/", "/health/"]
+    TRACING_ENABLED: bool = False
+    TRACE_SAMPLE_RATE: float = 0.05
+    OTLP_ENDPOINT: str | None = None
+    TRACE_FILE: str = "logs/traces/traces.jsonl"
+
     S3_HOST: str
     S3_BACKET: str
     S3_ACCESS_KEY: str
@@ -25,9 +103,30 @@ class Settings(BaseSettings):
     DB_HOST: str
     DB_PORT: int
     DB_NAME: str
+    # Лимит соединений на все воркеры, делится поровну между ними
+    # (DB_POOL_SIZE задаёт размер пула на процесс явно)
+    DB_MAX_CONNECTIONS: int = 40
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int = 0
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Кэш prepared statements asyncpg (0 - отключён)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Режим PgBouncer (pool_mode=transaction): без кэша prepared
+    # statements и стартовых параметров соединения
+    DB_PGBOUNCER: bool = False
+    # Ограничение времени запроса на стороне сервера (0 - без ограничения)
+    DB_STATEMENT_TIMEOUT_MS: int = 10000
+    # Реплика для чтения (если не задана - всё идёт в основную БД)
+    DB_REPLICA_HOST: str | None = None
+    DB_REPLICA_PORT: int | None = None
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0
 
     REDIS_HOST: str
     REDIS_PORT: int
+    REDIS_MAX_CONNECTIONS: int = 200
 
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
@@ -40,6 +139,26 @@ class Settings(BaseSettings):
     RMQ_PLAGIN_PORT: int
     RMQ_USER: str
     RMQ_PASSWORD: str
+    # Topic exchange событий заказов
+    RMQ_ORDERS_EXCHANGE: str = "orders"
+    RMQ_PUBLISH_TIMEOUT: float = 5.0
+    # Релей outbox: релеев в каждом процессе приложения
+    # (0 - только отдельный scripts/outbox_relay.py), размер пачки,
+    # пауза при пустой очереди и максимальная задержка повтора, с
+    OUTBOX_RELAYS: int = 1
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 0.5
+    OUTBOX_MAX_BACKOFF: int = 300
+    # Окно объединения смен статуса одного заказа в одно событие, с
+    ORDER_STATUS_COALESCE_WINDOW: float = 2.0
+    # Лента заказов кухни /kitchen/ws: LISTEN требует сессионного
+    # соединения, поэтому при PgBouncer задайте адрес самого Postgres.
+    # Уведомления за KITCHEN_DIFF_INTERVAL секунд отправляются одной
+    # пачкой, экран с очередью больше KITCHEN_CLIENT_QUEUE отключается
+    KITCHEN_DB_HOST: str | None = None
+    KITCHEN_DB_PORT: int | None = None
+    KITCHEN_DIFF_INTERVAL: float = 0.05
+    KITCHEN_CLIENT_QUEUE: int = 100
 
     GRAFANA_USER: str
     GRAFANA_PASSWORD: str
@@ -49,5 +168,20 @@ class Settings(BaseSettings):
         env_file_encoding="utf-8",
     )
 
+    @property
+    def workers_count(self) -> int:
+        return self.WORKERS or os.cpu_count() or 1
+
+    @property
+    def db_pool_size(self) -> int:
+        if self.DB_POOL_SIZE:
+            return self.DB_POOL_SIZE
+        per_worker = self.DB_MAX_CONNECTIONS // self.workers_count
+        return max(per_worker - self.DB_MAX_OVERFLOW, 1)
+
+    @property
+    def redis_pool_size(self) -> int:
+        return max(self.REDIS_MAX_CONNECTIONS // self.workers_count, 1)
+
 
 settings = Settings()
@@ -7,8 +7,9 @@ from redis.asyncio import Redis
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from main import app
+from utils.json_codec import OrjsonCoder
 from db.models import Base
-from db.connect import get_session
+from db.connect import get_session, get_read_session
 from utils.redis_connect import get_redis
 from config import settings
 
@@ -61,6 +62,7 @@ async def test_cache_manager():
     FastAPICache.init(
         RedisBackend(redis),
         prefix="test-cache",
+        coder=OrjsonCoder,
     )
     await redis.flushdb()
     yield redis
@@ -108,6 +110,7 @@ def override_secret_keys():
 async def client(test_session, test_redis):
     """Подмена зависимостей и тестовый клиент"""
     app.dependency_overrides[get_session] = lambda: test_session
+    app.dependency_overrides[get_read_session] = lambda: test_session
     app.dependency_overrides[get_redis] = lambda: test_redis
 
     async with AsyncClient(
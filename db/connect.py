@@ -1,22 +1,177 @@
+import asyncio
+import logging
+import time
+from uuid import uuid4
+from sqlalchemy import Select, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncSession,
     async_sessionmaker,
 )
+from utils.metrics import (
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_IN_USE,
+    DB_POOL_SIZE,
+    DB_REPLICA_LAG,
+)
 from config import settings
 
 
-DATABASE_URL = (
-    f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
-    f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
-)
+logger = logging.getLogger("db")
+
+
+def get_database_url(host: str, port: int) -> str:
+    return (
+        f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
+        f"{host}:{port}/{settings.DB_NAME}"
+    )
+
+
+DATABASE_URL = get_database_url(settings.DB_HOST, settings.DB_PORT)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений с замером времени ожидания соединения"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def get_connect_args() -> dict:
+    """
+    Параметры соединения asyncpg: кэш prepared statements
+    и statement_timeout на стороне сервера
+    """
+    if settings.DB_PGBOUNCER:
+        # В transaction режиме PgBouncer соединения с сервером меняются
+        # между транзакциями: кэш prepared statements отключаем, имена
+        # делаем уникальными, а statement_timeout задаётся на роль в БД,
+        # так как PgBouncer не пропускает стартовые параметры
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    connect_args = {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {
+            "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+        }
+    return connect_args
+
+
+def create_engine(url: str, name: str):
+    """
+    Создание движка с настройками пула из конфига, метриками и трейсингом.
+    Размер пула на процесс, чтобы все воркеры вместе
+    не превышали DB_MAX_CONNECTIONS
+    """
+    new_engine = create_async_engine(
+        url=url,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=get_connect_args(),
+    )
+    in_use = DB_POOL_IN_USE.labels(engine=name)
+
+    @event.listens_for(new_engine.sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        in_use.inc()
+
+    @event.listens_for(new_engine.sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        in_use.dec()
+
+    return new_engine
+
+
+engine = create_engine(DATABASE_URL, "primary")
+
+replica_engine = None
+if settings.DB_REPLICA_HOST:
+    replica_engine = create_engine(
+        get_database_url(
+            settings.DB_REPLICA_HOST,
+            settings.DB_REPLICA_PORT or settings.DB_PORT,
+        ),
+        "replica",
+    )
 
 
-engine = create_async_engine(url=DATABASE_URL, echo=False)
+def report_pool_size():
+    """
+    Размер пулов в метрике db_pool_size. Вызывается в каждом воркере
+    после fork: значения multiprocess метрик пишутся по pid процесса
+    """
+    for name, db_engine in (("primary", engine), ("replica", replica_engine)):
+        if db_engine is not None:
+            DB_POOL_SIZE.labels(engine=name).set(
+                settings.db_pool_size + settings.DB_MAX_OVERFLOW
+            )
+
+
+# Доступность реплики по результатам проверки отставания,
+# до первой успешной проверки чтение идёт в основную БД
+replica_available = False
+
+
+class RoutingSession(Session):
+    """
+    Сессия, отправляющая SELECT сессий для чтения на реплику.
+    Запись, SELECT ... FOR UPDATE/SHARE и все запросы после первой записи
+    в этой сессии идут в основную БД
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        is_plain_select = (
+            isinstance(clause, Select) and clause._for_update_arg is None
+        )
+        if not is_plain_select or self._flushing:
+            self.info["wrote"] = True
+        elif (
+            replica_engine is not None
+            and replica_available
+            and self.info.get("read_replica")
+            and not self.info.get("wrote")
+        ):
+            return replica_engine.sync_engine
+        return engine.sync_engine
+
+
+def get_pool_stats() -> dict:
+    """Статистика пулов соединений процесса для мониторинга"""
+    engines = {"primary": engine, "replica": replica_engine}
+    return {
+        name: {
+            "size": db_engine.pool.size(),
+            "checked_in": db_engine.pool.checkedin(),
+            "checked_out": db_engine.pool.checkedout(),
+            "overflow": max(db_engine.pool.overflow(), 0),
+        }
+        for name, db_engine in engines.items()
+        if db_engine is not None
+    }
 
 
 AsyncSessionLocal = async_sessionmaker(
-    bind=engine, class_=AsyncSession, expire_on_commit=False
+    bind=engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
 )
 
 
@@ -24,3 +179,57 @@ async def get_session():
     """Функция для получения сессии"""
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_session():
+    """
+    Функция для получения сессии роутов на чтение:
+    SELECT идут на реплику, пока в сессии не было записи
+    """
+    async with AsyncSessionLocal() as session:
+        session.info["read_replica"] = True
+        yield session
+
+
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+    "END"
+)
+
+
+async def check_replica_lag() -> float | None:
+    """
+    Проверка отставания реплики в секундах: при превышении
+    DB_REPLICA_MAX_LAG или ошибке чтение переключается на основную БД
+    """
+    global replica_available
+    if replica_engine is None:
+        return None
+    try:
+        async with replica_engine.connect() as connection:
+            lag = float(await connection.scalar(REPLICA_LAG_QUERY) or 0)
+    except Exception as e:
+        if replica_available:
+            logger.error("Read replica is unavailable: %s", e)
+        replica_available = False
+        return None
+    DB_REPLICA_LAG.set(lag)
+    available = lag <= settings.DB_REPLICA_MAX_LAG
+    if available != replica_available:
+        logger.warning(
+            "Read replica %s, lag %.2fs",
+            "enabled" if available else "disabled",
+            lag,
+        )
+    replica_available = available
+    return lag
+
+
+async def monitor_replica_lag():
+    """Фоновая проверка отставания реплики на время работы приложения"""
+    while True:
+        await check_replica_lag()
+        await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
@@ -1,13 +1,26 @@
 from typing import List
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import ForeignKey, DECIMAL, Enum, case, func
+from sqlalchemy import (
+    DDL,
+    ForeignKey,
+    DECIMAL,
+    BigInteger,
+    Computed,
+    DateTime,
+    Enum,
+    Index,
+    case,
+    event,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
     mapped_column,
     relationship,
-    column_property,
 )
 from schemas.order import OrderStatus, DeliveryType
 
@@ -54,6 +67,10 @@ class User(Base, TimestampMixin):
     email: Mapped[str] = mapped_column(nullable=False)
     hashed_password: Mapped[str] = mapped_column(nullable=False, default="")
     is_admin: Mapped[bool] = mapped_column(nullable=False, default=False)
+    # Последний fencing token оформления заказа (services/checkout.py)
+    checkout_fence: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
 
     orders: Mapped[List["Order"]] = relationship(
         back_populates="user", cascade="all, delete"
@@ -140,6 +157,24 @@ class ProductSize(Base, TimestampMixin):
         return f"{self.size.name} - {self.price} - {self.discount}"
 
 
+# Место статуса в очереди заказов (Order.status_rank)
+ORDER_STATUS_RANK = {
+    OrderStatus.CREATED: 1,
+    OrderStatus.COOKING: 2,
+    OrderStatus.READY: 3,
+    OrderStatus.DELIVERING: 4,
+    OrderStatus.COMPLETED: 5,
+}
+
+
+def status_rank_case(status):
+    """Выражение места статуса в очереди, неизвестные статусы - в конце"""
+    return case(
+        *((status == value, rank) for value, rank in ORDER_STATUS_RANK.items()),
+        else_=len(ORDER_STATUS_RANK) + 1,
+    )
+
+
 class Order(Base, TimestampMixin):
     __tablename__ = "order"
 
@@ -151,6 +186,8 @@ class Order(Base, TimestampMixin):
         )
     )
     user_order_id: Mapped[int] = mapped_column(nullable=False)
+    # Номер принятого через очередь заказа (services/order_intake.py)
+    reference: Mapped[str] = mapped_column(unique=True, nullable=True)
     total_amount: Mapped[Decimal] = mapped_column(
         DECIMAL(10, 2),
         nullable=False,
@@ -160,15 +197,10 @@ class Order(Base, TimestampMixin):
         default=OrderStatus.CREATED,
     )
 
-    status_sort = column_property(
-        case(
-            (status == OrderStatus.CREATED, 1),
-            (status == OrderStatus.COOKING, 2),
-            (status == OrderStatus.READY, 3),
-            (status == OrderStatus.DELIVERING, 4),
-            (status == OrderStatus.COMPLETED, 5),
-            else_=6,
-        )
+    # Порядок статусов в очереди заказов, хранимая генерируемая колонка
+    # для индекса ix_order_status_rank_created_at
+    status_rank: Mapped[int] = mapped_column(
+        Computed(status_rank_case(status), persisted=True)
     )
 
     user: Mapped["User"] = relationship(back_populates="orders")
@@ -185,6 +217,41 @@ class Order(Base, TimestampMixin):
         return str(self.id)
 
 
+# Сортировка очереди заказов в админке и на кухне идёт по индексу
+Index(
+    "ix_order_status_rank_created_at",
+    Order.status_rank,
+    Order.created_at.desc(),
+)
+
+
+# Уведомление order_changes с id заказа при создании, смене статуса
+# и удалении (services/kitchen.py). Создаётся и при create_all
+ORDER_CHANGES_CHANNEL = "order_changes"
+ORDER_NOTIFY_FUNCTION = DDL(
+    f"""
+    CREATE OR REPLACE FUNCTION notify_order_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify(
+            '{ORDER_CHANGES_CHANNEL}',
+            CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END::text
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """
+)
+ORDER_NOTIFY_TRIGGER = DDL(
+    """
+    CREATE TRIGGER order_change_notify
+    AFTER INSERT OR DELETE OR UPDATE OF status ON "order"
+    FOR EACH ROW EXECUTE FUNCTION notify_order_change()
+    """
+)
+event.listen(Order.__table__, "after_create", ORDER_NOTIFY_FUNCTION)
+event.listen(Order.__table__, "after_create", ORDER_NOTIFY_TRIGGER)
+
+
 class OrderItem(Base):
     __tablename__ = "order_item"
 
@@ -227,3 +294,40 @@ class Delivery(Base):
 
     def __repr__(self):
         return str(self.id)
+
+
+# События для RabbitMQ, записанные в одной транзакции с изменением
+# данных. Публикует и удаляет их services/outbox_relay.py
+class Outbox(Base):
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_available_at", "available_at"),
+        Index(
+            "ix_outbox_coalesce_key",
+            "coalesce_key",
+            postgresql_where=text("coalesce_key IS NOT NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(
+        BigInteger, primary_key=True, autoincrement=True
+    )
+    event: Mapped[str] = mapped_column(nullable=False)
+    exchange: Mapped[str] = mapped_column(nullable=False, default="")
+    routing_key: Mapped[str] = mapped_column(nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    headers: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    # Неопубликованное событие с тем же ключом обновляется, а не
+    # дублируется (смены статуса одного заказа)
+    coalesce_key: Mapped[str] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    # Время следующей попытки публикации (отодвигается при ошибках)
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    def __repr__(self):
+        return f"{self.event} {self.id}"
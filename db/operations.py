@@ -1,7 +1,24 @@
 import logging
-import logging.config
-from sqlalchemy import select, desc, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import (
+    select,
+    insert,
+    update,
+    delete,
+    event,
+    inspect,
+    desc,
+    func,
+    cast,
+    column,
+    values,
+    literal,
+    literal_column,
+    tuple_,
+    Integer,
+    Text,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from db.models import (
@@ -13,14 +30,29 @@ from db.models import (
     Delivery,
     Size,
     ProductSize,
+    Outbox,
+    ORDER_STATUS_RANK,
 )
-from utils.logger import logging_config
+from opentelemetry.propagate import inject
+from schemas.order import OrderStatus
+from config import settings
 
 
-logging.config.dictConfig(logging_config)
 logger = logging.getLogger("db_operations")
 
 
+class StaleFence(Exception):
+    """
+    Fencing token оформления заказа меньше записанного в БД:
+    блокировка истекла и заказ уже оформляет другой запрос
+    """
+
+    def __init__(self, fence: int, current: int):
+        super().__init__(f"Fence {fence} is older than {current}")
+        self.fence = fence
+        self.current = current
+
+
 class BaseDO:
     """Базовый класс с операциями к БД"""
 
@@ -30,14 +62,15 @@ class BaseDO:
     async def get_all(cls, session: AsyncSession):
         """Получить все элементы из БД"""
         try:
-            logger.info(f"Fetching all records for {cls.model.__name__}")
+            logger.info("Fetching all records for %s", cls.model.__name__)
             query = select(cls.model)
             result = await session.execute(query)
             return result.scalars().all()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching all records for "
-                f"{cls.model.__name__}: {e}",
+                "An error occurred while fetching all records for %s: %s",
+                cls.model.__name__,
+                e,
             )
             raise e
 
@@ -45,14 +78,16 @@ class BaseDO:
     async def get_by_id(cls, session: AsyncSession, id: int):
         """Получить элементы по id или вернуть None если нет"""
         try:
-            logger.info(f"Fetching {cls.model.__name__} with id {id}")
+            logger.info("Fetching %s with id %s", cls.model.__name__, id)
             query = select(cls.model).where(cls.model.id == id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching "
-                f"{cls.model.__name__} with id {id}: {e}",
+                "An error occurred while fetching %s with id %s: %s",
+                cls.model.__name__,
+                id,
+                e,
             )
             raise e
 
@@ -63,20 +98,20 @@ class BaseDO:
         session.add(new_instance)
         try:
             await session.commit()
-            logger.info(f"Added new {cls.model.__name__}")
+            logger.info("Added new %s", cls.model.__name__)
         except Exception as e:
             await session.rollback()
-            logger.error(f"Error adding {cls.model.__name__}: {e}")
+            logger.error("Error adding %s: %s", cls.model.__name__, e)
             raise e
         return new_instance
 
     @classmethod
     async def update(cls, session: AsyncSession, id: int, **values):
         """Изменить элементы для id"""
-        logger.info(f"Updating {cls.model.__name__} with id {id}")
+        logger.info("Updating %s with id %s", cls.model.__name__, id)
         instance = await cls.get_by_id(session, id)
         if not instance:
-            logger.warning(f"{cls.model.__name__} with id {id} not found")
+            logger.warning("%s with id %s not found", cls.model.__name__, id)
             return None
 
         for key, value in values.items():
@@ -84,26 +119,26 @@ class BaseDO:
 
         try:
             await session.commit()
-            logger.info(f"Updated {cls.model.__name__} with id {id}")
+            logger.info("Updated %s with id %s", cls.model.__name__, id)
         except Exception as e:
             await session.rollback()
-            logger.error(f"Error updating {cls.model.__name__}: {e}")
+            logger.error("Error updating %s: %s", cls.model.__name__, e)
             raise e
         return instance
 
     @classmethod
     async def delete(cls, session: AsyncSession, id: int):
         """Удалить по id"""
-        logger.info(f"Deleting {cls.model.__name__} with id {id}")
+        logger.info("Deleting %s with id %s", cls.model.__name__, id)
         try:
             data = await cls.get_by_id(session=session, id=id)
             if data:
                 await session.delete(data)
                 await session.commit()
-                logger.info(f"Deleted {cls.model.__name__} with id {id}")
+                logger.info("Deleted %s with id %s", cls.model.__name__, id)
         except Exception as e:
             await session.rollback()
-            logger.error(f"Error deleting {cls.model.__name__}: {e}")
+            logger.error("Error deleting %s: %s", cls.model.__name__, e)
             raise e
 
 
@@ -122,7 +157,8 @@ class UserDO(BaseDO):
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching User by email: {e}",
+                "An error occurred while fetching User by email: %s",
+                e,
             )
             raise e
 
@@ -136,7 +172,8 @@ class UserDO(BaseDO):
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching User by Telegram ID: {e}",
+                "An error occurred while fetching User by Telegram ID: %s",
+                e,
             )
             raise e
 
@@ -164,9 +201,7 @@ class ProductDO(BaseDO):
             result = await session.execute(query)
             return result.scalars().all()
         except Exception as e:
-            logger.error(
-                f"An error occurred while fetching products: {e}",
-            )
+            logger.error("An error occurred while fetching products: %s", e)
             raise e
 
     @classmethod
@@ -177,7 +212,10 @@ class ProductDO(BaseDO):
     ):
         """Получение products для category_id"""
         try:
-            logger.info(f"Fetching all products for category_id {category_id}")
+            logger.info(
+                "Fetching all products for category_id %s",
+                category_id,
+            )
             query = (
                 select(cls.model)
                 .where(cls.model.category_id == category_id)
@@ -190,8 +228,107 @@ class ProductDO(BaseDO):
             return result.scalars().all()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching products for category_id "
-                f"{category_id}: {e}",
+                "An error occurred while fetching products for category_id "
+                "%s: %s",
+                category_id,
+                e,
+            )
+            raise e
+
+    @classmethod
+    async def get_all_json(
+        cls,
+        session: AsyncSession,
+        category_id: int | None = None,
+    ) -> str:
+        """
+        Получение products (или products для category_id) одним запросом
+        в виде готового JSON по схеме ProductOut, собранного в Postgres.
+        photo_path строится без обращения к S3 - вместо даты изменения
+        файла в пути используется updated_at продукта
+        """
+        try:
+            logger.info(
+                "Fetching products JSON for category_id %s",
+                category_id,
+            )
+            price = ProductSize.price
+            final_price = func.round(
+                price - price * ProductSize.discount / 100, 2
+            )
+            product_size = func.json_build_object(
+                "size",
+                func.json_build_object("id", Size.id, "name", Size.name),
+                "price",
+                cast(price, Text),
+                "discount",
+                ProductSize.discount,
+                "created_at",
+                ProductSize.created_at,
+                "updated_at",
+                ProductSize.updated_at,
+                "final_price",
+                cast(final_price, Text),
+            )
+            product_sizes = (
+                select(
+                    func.coalesce(
+                        func.json_agg(
+                            aggregate_order_by(product_size, ProductSize.id)
+                        ),
+                        literal_column("'[]'::json"),
+                    )
+                )
+                .join(Size, Size.id == ProductSize.size_id)
+                .where(ProductSize.product_id == cls.model.id)
+                .scalar_subquery()
+            )
+            photo_path = (
+                literal(f"/{settings.STATIC_DIR}/products/")
+                + cls.model.photo_name
+                + "?"
+                + func.to_char(cls.model.updated_at, "YYYYMMDDHH24MISS")
+            )
+            product = func.json_build_object(
+                "id",
+                cls.model.id,
+                "name",
+                cls.model.name,
+                "description",
+                cls.model.description,
+                "photo_name",
+                cls.model.photo_name,
+                "category_id",
+                cls.model.category_id,
+                "product_sizes",
+                product_sizes,
+                "created_at",
+                cls.model.created_at,
+                "updated_at",
+                cls.model.updated_at,
+                "photo_path",
+                photo_path,
+            )
+            query = select(
+                cast(
+                    func.coalesce(
+                        func.json_agg(
+                            aggregate_order_by(product, cls.model.id)
+                        ),
+                        literal_column("'[]'::json"),
+                    ),
+                    Text,
+                )
+            )
+            if category_id:
+                query = query.where(cls.model.category_id == category_id)
+            return await session.scalar(query)
+        except Exception as e:
+            logger.error(
+                "An error occurred while fetching products JSON for "
+                "category_id %s: %s",
+                category_id,
+                e,
             )
             raise e
 
@@ -199,7 +336,7 @@ class ProductDO(BaseDO):
     async def get_by_id(cls, product_id: int, session: AsyncSession):
         """Получаем продукт по product_id и size_id"""
         try:
-            logger.info(f"Fetching product with id {product_id}")
+            logger.info("Fetching product with id %s", product_id)
             query = (
                 select(cls.model)
                 .where(cls.model.id == product_id)
@@ -212,8 +349,9 @@ class ProductDO(BaseDO):
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching product with id "
-                f"{product_id}: {e}",
+                "An error occurred while fetching product with id %s: %s",
+                product_id,
+                e,
             )
             raise e
 
@@ -221,14 +359,15 @@ class ProductDO(BaseDO):
     async def get_by_photo_name(cls, photo_name: str, session: AsyncSession):
         """Получаем продукт по product_id и size_id"""
         try:
-            logger.info(f"Fetching product with photo_name {photo_name}")
+            logger.info("Fetching product with photo_name %s", photo_name)
             query = select(cls.model).where(cls.model.photo_name == photo_name)
             result = await session.execute(query)
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching product with id "
-                f"{photo_name}: {e}",
+                "An error occurred while fetching product with id %s: %s",
+                photo_name,
+                e,
             )
             raise e
 
@@ -238,8 +377,11 @@ class ProductDO(BaseDO):
     ):
         """Получаем продукт по product_id и size_id"""
         try:
-            logger.info(f"Fetching product with id {product_id} and size_id "
-                        f"{size_id}")
+            logger.info(
+                "Fetching product with id %s and size_id %s",
+                product_id,
+                size_id,
+            )
             query = (
                 select(ProductSize)
                 .join(Product)
@@ -257,9 +399,108 @@ class ProductDO(BaseDO):
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching product with id "
-                f"{product_id} and size_id {size_id}: {e}",
+                "An error occurred while fetching product with id %s and "
+                "size_id %s: %s",
+                product_id,
+                size_id,
+                e,
+            )
+            raise e
+
+    @classmethod
+    async def get_for_ids_by_size_ids(
+        cls,
+        ids: list[tuple[int, int]],
+        session: AsyncSession,
+    ) -> dict[tuple[int, int], ProductSize]:
+        """
+        Получаем продукты по парам (product_id, size_id) одним запросом,
+        результат - словарь по паре, отсутствующих пар в нём нет
+        """
+        if not ids:
+            return {}
+        try:
+            logger.info("Fetching %s products by size_id", len(ids))
+            query = (
+                select(ProductSize)
+                .where(
+                    tuple_(ProductSize.product_id, ProductSize.size_id).in_(
+                        set(ids)
+                    )
+                )
+                .options(
+                    joinedload(ProductSize.product),
+                    joinedload(ProductSize.size),
+                )
+            )
+            result = await session.execute(query)
+            return {
+                (product_size.product_id, product_size.size_id): product_size
+                for product_size in result.scalars()
+            }
+        except Exception as e:
+            logger.error(
+                "An error occurred while fetching products by size_id: %s",
+                e,
+            )
+            raise e
+
+    @classmethod
+    async def get_cart_prices_for_share(
+        cls,
+        cart_items: dict[tuple[int, int], int],
+        session: AsyncSession,
+    ) -> list:
+        """
+        Позиции корзины {(product_id, size_id): quantity} с ценами
+        из product_size одним запросом: цена позиции считается в БД,
+        строки product_size блокируются FOR SHARE до конца транзакции,
+        чтобы цена не изменилась до записи заказа.
+        Отсутствующих в БД продуктов в результате нет
+        """
+        logger.info("Pricing %s cart items for share", len(cart_items))
+        cart = (
+            values(
+                column("product_id", Integer),
+                column("size_id", Integer),
+                column("quantity", Integer),
+                name="cart",
+            )
+            .data(
+                [
+                    (product_id, size_id, quantity)
+                    for (product_id, size_id), quantity in cart_items.items()
+                ]
+            )
+        )
+        price = ProductSize.price
+        final_price = func.round(
+            price - price * ProductSize.discount / 100, 2
+        )
+        query = (
+            select(
+                ProductSize.product_id,
+                ProductSize.size_id,
+                Product.name,
+                Size.name.label("size_name"),
+                cart.c.quantity,
+                (final_price * cart.c.quantity).label("total_price"),
+            )
+            .join(
+                cart,
+                (cart.c.product_id == ProductSize.product_id)
+                & (cart.c.size_id == ProductSize.size_id),
             )
+            .join(Product, Product.id == ProductSize.product_id)
+            .join(Size, Size.id == ProductSize.size_id)
+            .order_by(ProductSize.product_id, ProductSize.size_id)
+            .with_for_update(read=True, of=ProductSize)
+        )
+        try:
+            result = await session.execute(query)
+            return result.all()
+        except Exception as e:
+            logger.error("An error occurred while pricing cart items: %s", e)
             raise e
 
 
@@ -273,26 +514,32 @@ class OrderItemDO(BaseDO):
         cls,
         order: Order,
         session: AsyncSession,
-        values: dict,
+        items: list,
     ):
-        """Добавление order_items для order"""
-        logger.info(f"Adding multiple order items for order {order.id}")
-        for item in values.cart_items:
-            new_instance = cls.model(
-                order_id=order.id,
-                product_id=item.product.id,
-                name=item.product.name,
-                size_id=item.product.size_id,
-                size_name=item.product.size_name,
-                quantity=item.quantity,
-                total_price=item.total_price,
-            )
-            session.add(new_instance)
+        """
+        Добавление order_items для order одной вставкой
+        (items - позиции из ProductDO.get_cart_prices_for_share)
+        """
+        logger.info("Adding multiple order items for order %s", order.id)
         try:
-            await session.flush()
-            logger.info(f"Added order items for order {order.id}")
+            await session.execute(
+                insert(cls.model),
+                [
+                    {
+                        "order_id": order.id,
+                        "product_id": item.product_id,
+                        "name": item.name,
+                        "size_id": item.size_id,
+                        "size_name": item.size_name,
+                        "quantity": item.quantity,
+                        "total_price": item.total_price,
+                    }
+                    for item in items
+                ],
+            )
+            logger.info("Added order items for order %s", order.id)
         except Exception as e:
-            logger.error(f"Error adding order items: {e}")
+            logger.error("Error adding order items: %s", e)
             raise e
 
 
@@ -306,7 +553,7 @@ class DeliveryDO(BaseDO):
         cls, order: Order, session: AsyncSession, delivery_data: Delivery
     ):
         """Добавление delivery info для order"""
-        logger.info(f"Adding delivery info for order {order.id}")
+        logger.info("Adding delivery info for order %s", order.id)
         new_instance = cls.model(
             order_id=order.id,
             delivery_type=delivery_data.delivery_type,
@@ -315,9 +562,9 @@ class DeliveryDO(BaseDO):
         session.add(new_instance)
         try:
             await session.flush()
-            logger.info(f"Added delivery info for order {order.id}")
+            logger.info("Added delivery info for order %s", order.id)
         except Exception as e:
-            logger.error(f"Error adding delivery info: {e}")
+            logger.error("Error adding delivery info: %s", e)
             raise e
 
 
@@ -330,7 +577,7 @@ class OrderDO(BaseDO):
     async def get_all(cls, user_id: int, session: AsyncSession):
         """Получение всех orders для user_id"""
         try:
-            logger.info(f"Fetching all Order for user ID {user_id}")
+            logger.info("Fetching all Order for user ID %s", user_id)
             query = (
                 select(cls.model)
                 .where(cls.model.user_id == user_id)
@@ -344,8 +591,9 @@ class OrderDO(BaseDO):
             return result.scalars().all()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching orders for user ID "
-                f"{user_id}: {e}",
+                "An error occurred while fetching orders for user ID %s: %s",
+                user_id,
+                e,
             )
             raise e
 
@@ -358,7 +606,7 @@ class OrderDO(BaseDO):
     ):
         """Получение всех orders для user_id по указанному статусу"""
         try:
-            logger.info(f"Fetching all Order for user ID {user_id}")
+            logger.info("Fetching all Order for user ID %s", user_id)
             query = (
                 select(cls.model)
                 .where(cls.model.user_id == user_id)
@@ -373,8 +621,9 @@ class OrderDO(BaseDO):
             return result.scalars().all()
         except Exception as e:
             logger.error(
-                f"An error occurred while fetching orders for user ID "
-                f"{user_id}: {e}",
+                "An error occurred while fetching orders for user ID %s: %s",
+                user_id,
+                e,
             )
             raise e
 
@@ -388,8 +637,9 @@ class OrderDO(BaseDO):
         """Получение всех orders для user_id по указанным статусам"""
         try:
             logger.info(
-                f"Fetching orders for user ID {user_id} with statuses: "
-                f"{statuses}"
+                "Fetching orders for user ID %s with statuses: %s",
+                user_id,
+                statuses,
             )
             query = (
                 select(cls.model)
@@ -406,8 +656,10 @@ class OrderDO(BaseDO):
             return orders
         except Exception as e:
             logger.error(
-                f"Error fetching orders for user ID {user_id}: {e}",
-                exc_info=True
+                "Error fetching orders for user ID %s: %s",
+                user_id,
+                e,
+                exc_info=True,
             )
             raise
 
@@ -420,7 +672,9 @@ class OrderDO(BaseDO):
     ):
         """Получение orders по order_id для указанного пользователя"""
         logger.info(
-            f"Fetching order (ID: {order_id}) for user (ID: {user_id})"
+            "Fetching order (ID: %s) for user (ID: %s)",
+            order_id,
+            user_id,
         )
         try:
             query = (
@@ -436,8 +690,10 @@ class OrderDO(BaseDO):
             return order
         except Exception as e:
             logger.exception(
-                f"Error fetching order (ID: {order_id}) for user (ID: "
-                f"{user_id}): {e}"
+                "Error fetching order (ID: %s) for user (ID: %s): %s",
+                order_id,
+                user_id,
+                e,
             )
             raise e
 
@@ -446,37 +702,356 @@ class OrderDO(BaseDO):
         cls,
         user_id: int,
         session: AsyncSession,
-        values: dict,
+        cart_items: dict[tuple[int, int], int],
         delivery_data: Delivery,
+        fence: int | None = None,
+        reference: str | None = None,
+        commit: bool = True,
     ):
-        """Добавление order для user_id"""
-        logger.info(f"Creating new order for user_id {user_id}")
-        max_user_order_id_query = select(
-            func.max(cls.model.user_order_id)
-        ).where(
-            cls.model.user_id == user_id
-        )
-        result = await session.execute(max_user_order_id_query)
-        max_user_order_id = result.scalar() or 0
-        new_instance = cls.model(
-            user_id=user_id,
-            total_amount=values.total_amount,
-            user_order_id=max_user_order_id + 1,
-        )
-        session.add(new_instance)
+        """
+        Добавление order для user_id из позиций корзины
+        {(product_id, size_id): quantity}. Цены берутся из БД в той же
+        транзакции, что и запись заказа. Если ни одного продукта
+        корзины нет в БД - заказ не создаётся и возвращается None.
+        fence - fencing token блокировки оформления: заказ пишется,
+        только если он больше последнего записанного, иначе StaleFence.
+        Без fence строка user блокируется, чтобы параллельные заказы
+        пользователя не получили одинаковый user_order_id.
+        reference - номер заказа, принятого через очередь.
+        commit=False - заказ только записывается в транзакцию
+        (flush), commit и откат остаются вызывающему
+        """
+        logger.info("Creating new order for user_id %s", user_id)
         try:
+            if fence is not None:
+                await cls.check_fence(
+                    user_id=user_id, fence=fence, session=session
+                )
+            else:
+                await cls.lock_user(user_id=user_id, session=session)
+            items = await ProductDO.get_cart_prices_for_share(
+                cart_items=cart_items,
+                session=session,
+            )
+            if len(items) < len(cart_items):
+                logger.warning(
+                    "%s cart items of user_id %s not found in database",
+                    len(cart_items) - len(items),
+                    user_id,
+                )
+            if not items:
+                if commit:
+                    await session.rollback()
+                return None
+            max_user_order_id_query = select(
+                func.max(cls.model.user_order_id)
+            ).where(
+                cls.model.user_id == user_id
+            )
+            result = await session.execute(max_user_order_id_query)
+            max_user_order_id = result.scalar() or 0
+            new_instance = cls.model(
+                user_id=user_id,
+                total_amount=sum(item.total_price for item in items),
+                user_order_id=max_user_order_id + 1,
+                reference=reference,
+            )
+            session.add(new_instance)
             await session.flush()
             await OrderItemDO.add_many_by_order(
-                order=new_instance, session=session, values=values
+                order=new_instance, session=session, items=items
             )
             await DeliveryDO.add_by_order(
                 order=new_instance,
                 session=session,
                 delivery_data=delivery_data,
             )
-            await session.commit()
+            OutboxDO.stage(
+                session=session,
+                event="order_created",
+                exchange=settings.RMQ_ORDERS_EXCHANGE,
+                routing_key="order.created",
+                payload={
+                    "event": "order_created",
+                    "order_id": new_instance.id,
+                    "user_order_id": new_instance.user_order_id,
+                    "user_id": user_id,
+                    "total_amount": str(new_instance.total_amount),
+                    "reference": reference,
+                },
+            )
+            if commit:
+                await session.commit()
+            else:
+                await session.flush()
             logger.info("Added new Order")
+            return new_instance
         except Exception as e:
-            await session.rollback()
-            logger.error(f"Error adding Order: {e}")
+            if commit:
+                await session.rollback()
+            logger.error("Error adding Order: %s", e)
+            raise e
+
+    @classmethod
+    async def get_active_with_items(cls, session: AsyncSession):
+        """
+        Незавершённые заказы с позициями и доставкой в порядке
+        очереди кухни (как сортировка по умолчанию в админке)
+        """
+        try:
+            logger.info("Fetching active orders for kitchen")
+            query = (
+                select(cls.model)
+                .where(
+                    cls.model.status_rank
+                    < ORDER_STATUS_RANK[OrderStatus.COMPLETED]
+                )
+                .options(
+                    selectinload(cls.model.order_items),
+                    selectinload(cls.model.delivery),
+                )
+                .order_by(cls.model.status_rank, desc(cls.model.created_at))
+            )
+            result = await session.execute(query)
+            return result.scalars().all()
+        except Exception as e:
+            logger.error("Error fetching active orders: %s", e)
+            raise e
+
+    @classmethod
+    async def get_by_ids_with_items(
+        cls, ids: List[int], session: AsyncSession
+    ):
+        """Заказы по списку id с позициями и доставкой"""
+        try:
+            query = (
+                select(cls.model)
+                .where(cls.model.id.in_(ids))
+                .options(
+                    selectinload(cls.model.order_items),
+                    selectinload(cls.model.delivery),
+                )
+            )
+            result = await session.execute(query)
+            return result.scalars().all()
+        except Exception as e:
+            logger.error("Error fetching orders %s: %s", ids, e)
+            raise e
+
+    @classmethod
+    async def get_existing_references(
+        cls, references: List[str], session: AsyncSession
+    ) -> set[str]:
+        """Номера из references, заказы с которыми уже записаны"""
+        try:
+            result = await session.execute(
+                select(cls.model.reference).where(
+                    cls.model.reference.in_(references)
+                )
+            )
+            return set(result.scalars().all())
+        except Exception as e:
+            logger.error("Error fetching order references: %s", e)
+            raise e
+
+    @staticmethod
+    async def lock_user(user_id: int, session: AsyncSession):
+        """Блокировка строки user до конца транзакции"""
+        await session.execute(
+            select(User.id).where(User.id == user_id).with_for_update()
+        )
+
+    @staticmethod
+    async def check_fence(user_id: int, fence: int, session: AsyncSession):
+        """
+        Запись fencing token пользователя, если он новее записанного.
+        Строка user остаётся заблокированной до конца транзакции
+        """
+        result = await session.execute(
+            update(User)
+            .where(User.id == user_id, User.checkout_fence < fence)
+            .values(checkout_fence=fence, updated_at=User.updated_at)
+        )
+        if result.rowcount == 0:
+            current = await session.scalar(
+                select(User.checkout_fence).where(User.id == user_id)
+            )
+            logger.warning(
+                "Stale checkout fence %s for user_id %s (current %s)",
+                fence,
+                user_id,
+                current,
+            )
+            raise StaleFence(fence=fence, current=current or 0)
+
+
+class OutboxDO(BaseDO):
+    """Класс c операциями для модели Outbox"""
+
+    model = Outbox
+
+    @classmethod
+    def stage(
+        cls,
+        session: AsyncSession | Session,
+        event: str,
+        routing_key: str,
+        payload: dict,
+        exchange: str = "",
+        coalesce_key: str | None = None,
+        delay: float = 0,
+    ):
+        """
+        Добавление события в сессию без commit: оно записывается
+        в той же транзакции, что и изменение, к которому относится.
+        delay - через сколько секунд событие можно публиковать
+        """
+        # traceparent, чтобы консьюмер продолжил трейс запроса
+        headers = {}
+        inject(headers)
+        outbox_event = cls.model(
+            event=event,
+            exchange=exchange,
+            routing_key=routing_key,
+            payload=payload,
+            headers=headers or None,
+            attempts=0,
+            coalesce_key=coalesce_key,
+        )
+        if delay:
+            outbox_event.available_at = func.now() + func.make_interval(
+                0, 0, 0, 0, 0, 0, delay
+            )
+        session.add(outbox_event)
+
+    @classmethod
+    async def lock_batch(cls, limit: int, session: AsyncSession):
+        """
+        Пачка готовых к публикации событий. Строки блокируются до конца
+        транзакции, занятые другими релеями пропускаются
+        """
+        try:
+            result = await session.execute(
+                select(cls.model)
+                .where(cls.model.available_at <= func.now())
+                .order_by(cls.model.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            return result.scalars().all()
+        except Exception as e:
+            logger.error("Error locking outbox batch: %s", e)
             raise e
+
+    @classmethod
+    async def delete_many(cls, ids: List[int], session: AsyncSession):
+        """Удаление опубликованных событий (без commit)"""
+        if ids:
+            await session.execute(
+                delete(cls.model).where(cls.model.id.in_(ids))
+            )
+
+    @classmethod
+    async def postpone(cls, ids: List[int], session: AsyncSession):
+        """
+        Перенос следующей попытки публикации с экспоненциальной
+        задержкой до OUTBOX_MAX_BACKOFF секунд (без commit)
+        """
+        if ids:
+            backoff = func.least(
+                func.power(2.0, cls.model.attempts),
+                settings.OUTBOX_MAX_BACKOFF,
+            )
+            await session.execute(
+                update(cls.model)
+                .where(cls.model.id.in_(ids))
+                .values(
+                    attempts=cls.model.attempts + 1,
+                    available_at=func.now()
+                    + func.make_interval(0, 0, 0, 0, 0, 0, backoff),
+                )
+            )
+
+
+def order_status_routing_key(tg_id: str | None, user_id: int) -> str:
+    """
+    Ключ события смены статуса: order.status.{tg_id} для пользователей
+    бота (бот слушает order.status.*), остальным - order.status.user.{id}
+    """
+    if tg_id:
+        return f"order.status.{tg_id}"
+    return f"order.status.user.{user_id}"
+
+
+def stage_order_status_event(
+    session: Session,
+    order: Order,
+    status_from: str | None,
+    status_to: str,
+):
+    """
+    Событие смены статуса заказа в outbox. Пока событие заказа
+    не опубликовано (ORDER_STATUS_COALESCE_WINDOW после первой смены),
+    следующие смены объединяются с ним, и быстрые COOKING -> READY дают
+    одно сообщение. Событие, которое сейчас публикует релей, заблокировано
+    и пропускается - тогда пишется новое
+    """
+    coalesce_key = f"order_status:{order.id}"
+    pending = (
+        session.execute(
+            select(Outbox)
+            .where(Outbox.coalesce_key == coalesce_key)
+            .with_for_update(skip_locked=True)
+        )
+        .scalars()
+        .first()
+    )
+    if pending is not None:
+        if pending.payload["status_from"] == status_to:
+            # статус вернулся к исходному - сообщать не о чем
+            session.delete(pending)
+        else:
+            pending.payload = {**pending.payload, "status_to": status_to}
+        return
+    tg_id = session.execute(
+        select(User.tg_id).where(User.id == order.user_id)
+    ).scalar()
+    OutboxDO.stage(
+        session=session,
+        event="order_status_changed",
+        exchange=settings.RMQ_ORDERS_EXCHANGE,
+        routing_key=order_status_routing_key(tg_id, order.user_id),
+        payload={
+            "event": "order_status_changed",
+            "order_id": order.id,
+            "user_order_id": order.user_order_id,
+            "user_id": order.user_id,
+            "tg_id": tg_id,
+            "status_from": status_from,
+            "status_to": status_to,
+        },
+        coalesce_key=coalesce_key,
+        delay=settings.ORDER_STATUS_COALESCE_WINDOW,
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def stage_order_status_events(session: Session, flush_context, instances):
+    """
+    Событие outbox на каждое изменение Order.status, в том числе
+    из админки: оно записывается в той же транзакции, что и статус
+    """
+    for instance in list(session.dirty):
+        if not isinstance(instance, Order):
+            continue
+        history = inspect(instance).attrs.status.history
+        if not history.added:
+            continue
+        status_from = None
+        if history.deleted:
+            status_from = OrderStatus(history.deleted[0]).value
+        status_to = OrderStatus(history.added[0]).value
+        if status_from != status_to:
+            stage_order_status_event(
+                session, instance, status_from, status_to
+            )
@@ -0,0 +1,53 @@
+import gc
+import os
+import shutil
+from config import settings
+
+
+# Каталог для метрик Prometheus всех воркеров, задаём до импорта приложения
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+wsgi_app = "main:app"
+bind = "0.0.0.0:8000"
+workers = settings.workers_count
+worker_class = "utils.workers.AppUvicornWorker"
+# Приложение импортируется в мастере один раз,
+# воркеры получают его через fork (copy-on-write)
+preload_app = True
+# На SIGTERM воркеры SHUTDOWN_DRAIN_DELAY секунд отвечают 503
+# на /health/ready, затем перестают принимать соединения
+# и дожидаются текущих запросов (utils/workers.py)
+graceful_timeout = settings.GRACEFUL_TIMEOUT + settings.SHUTDOWN_DRAIN_DELAY
+timeout = 60
+keepalive = 5
+accesslog = None
+
+
+def when_ready(server):
+    """
+    Перед fork воркеров переносим объекты приложения в постоянное
+    поколение GC, чтобы сборщик в воркерах не трогал их страницы памяти
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Соединения пула, открытые в мастере, не должны использоваться
+    в воркерах - сбрасываем пул без закрытия чужих соединений
+    """
+    from db.connect import engine, replica_engine
+
+    engine.sync_engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.sync_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Удаляем файлы live метрик завершившегося воркера"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
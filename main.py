@@ -1,21 +1,47 @@
-import uvicorn
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from routers import products, category, users, carts, orders
+from routers import (
+    products,
+    category,
+    users,
+    carts,
+    orders,
+    metrics,
+    health,
+    kitchen,
+)
 from admin.view import setup_admin
 from utils.middlewares import (
     http_exception_handler,
     validation_exception_handler,
     global_exception_handler,
     LogRequestsMiddleware,
+    MetricsMiddleware,
+    TracingMiddleware,
+    AdmissionControlMiddleware,
+    CoalescingMiddleware,
 )
-from utils.cache_manager import lifespan
+from utils.lifespan import lifespan
+from utils.json_codec import OrjsonResponse
+from utils.logger import setup_logging
+from utils.tracing import setup_tracing
 
 
-app = FastAPI(title="FastFood API", lifespan=lifespan)
-# Подключение миддлвари и обработчиков ошибок для логов
+# Настройка логирования и трейсинга один раз на процесс
+setup_logging()
+setup_tracing()
+app = FastAPI(
+    title="FastFood API",
+    lifespan=lifespan,
+    default_response_class=OrjsonResponse,
+)
+# Подключение миддлвари и обработчиков ошибок для логов, трейсов и метрик
+app.add_middleware(CoalescingMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(LogRequestsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, global_exception_handler)
@@ -26,7 +52,12 @@ app.include_router(category.router)
 app.include_router(users.router)
 app.include_router(carts.router)
 app.include_router(orders.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
+app.include_router(kitchen.router)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
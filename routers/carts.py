@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from schemas.cart import CartItemModify
+from schemas.cart import CartItemModify, CartItemsBatch, CartOut
 from schemas.user import UserOut
 from db.connect import get_session
 from utils.redis_connect import get_redis
@@ -58,6 +58,39 @@ async def update_item_to_cart(
     )
 
 
+# Роутер добавления нескольких продуктов в корзину,
+# возвращает корзину целиком
+@router.post("/items:batch", response_model=CartOut, status_code=201)
+async def add_items_to_cart(
+    batch: CartItemsBatch,
+    user: UserOut = Depends(get_current_user),
+    redis=Depends(get_redis),
+    session: AsyncSession = Depends(get_session),
+):
+    return await CartDO.add_items(
+        items=batch.items,
+        user_id=user.id,
+        redis=redis,
+        session=session,
+    )
+
+
+# Роутер замены содержимого корзины, возвращает корзину целиком
+@router.put("/", response_model=CartOut)
+async def replace_cart(
+    batch: CartItemsBatch,
+    user: UserOut = Depends(get_current_user),
+    redis=Depends(get_redis),
+    session: AsyncSession = Depends(get_session),
+):
+    return await CartDO.replace_cart(
+        items=batch.items,
+        user_id=user.id,
+        redis=redis,
+        session=session,
+    )
+
+
 # Роутер получения корзины пользователя
 @router.get("/")
 async def get_cart_user(
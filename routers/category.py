@@ -1,20 +1,29 @@
-from fastapi import APIRouter, Depends
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, Depends, Request
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.connect import get_session
+from db.connect import get_read_session
 from schemas.category import CategoryOut
 from db.operations import CategoryDO
-from utils.cache_manager import request_key_builder
+from services.catalog import get_catalog_response
+from utils.redis_connect import get_redis_no_decode
 
 
 router = APIRouter(prefix="/category", tags=["Category"])
 
+category_adapter = TypeAdapter(list[CategoryOut])
+
 
 # Роутер получения всех категорий
 @router.get("/", response_model=list[CategoryOut])
-@cache(expire=60, key_builder=request_key_builder)
 async def get_category(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+    redis: Redis = Depends(get_redis_no_decode),
 ):
-    category = await CategoryDO.get_all(session=session)
-    return category
+    async def load():
+        return await CategoryDO.get_all(session=session)
+
+    return await get_catalog_response(
+        request, "category", load, category_adapter, redis
+    )
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from db.connect import engine, replica_engine, get_pool_stats
+from utils.redis_connect import get_redis
+from db import connect
+from utils import lifespan
+from config import settings
+
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+# Последний результат проверок, чтобы частые пробы не нагружали БД и Redis
+_checks = {"at": 0.0, "result": None}
+_checks_lock = asyncio.Lock()
+
+
+async def check_db():
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def check_redis():
+    redis = await get_redis()
+    await redis.ping()
+
+
+async def run_checks() -> dict:
+    """Проверка зависимостей с таймаутом HEALTH_CHECK_TIMEOUT"""
+    checks = {"db": check_db(), "redis": check_redis()}
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(check, settings.HEALTH_CHECK_TIMEOUT)
+            for check in checks.values()
+        ),
+        return_exceptions=True,
+    )
+    return {
+        name: not isinstance(result, BaseException)
+        for name, result in zip(checks, results)
+    }
+
+
+async def get_checks() -> dict:
+    """Результат проверок, кэшированный на HEALTH_CHECK_TTL секунд"""
+    async with _checks_lock:
+        if time.monotonic() - _checks["at"] > settings.HEALTH_CHECK_TTL:
+            _checks["result"] = await run_checks()
+            _checks["at"] = time.monotonic()
+        return _checks["result"]
+
+
+# Роутер проверки, что процесс жив
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+
+# Роутер проверки готовности принимать запросы:
+# прогрев завершён, остановка не началась, БД и Redis доступны
+@router.get("/ready")
+async def ready():
+    checks = await get_checks()
+    is_ready = lifespan.ready and not lifespan.draining and all(
+        checks.values()
+    )
+    content = {
+        "status": "ok" if is_ready else "unavailable",
+        "checks": checks,
+        "pool": get_pool_stats(),
+    }
+    if replica_engine is not None:
+        content["replica"] = connect.replica_available
+    return JSONResponse(content=content, status_code=200 if is_ready else 503)
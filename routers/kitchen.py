@@ -0,0 +1,68 @@
+import asyncio
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from db.connect import AsyncSessionLocal
+from services.auth import decode_access_token, load_user
+from services.kitchen import kitchen_feed
+
+
+router = APIRouter(prefix="/kitchen", tags=["Kitchen"])
+
+
+async def is_staff(token: str) -> bool:
+    """Проверка access токена: лента доступна только администраторам"""
+    try:
+        email = decode_access_token(token)
+        async with AsyncSessionLocal() as session:
+            user = await load_user(email=email, session=session)
+    except HTTPException:
+        return False
+    return user.is_admin
+
+
+async def send_updates(websocket: WebSocket, queue: asyncio.Queue):
+    while (message := await queue.get()) is not None:
+        await websocket.send_text(message)
+    # экран отстал или подписка перезапускается - клиент
+    # переподключается и получает свежий снимок
+    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+
+
+async def wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+# Лента заказов кухни: снимок незавершённых заказов,
+# затем изменения по уведомлениям БД (снимок - первое
+# сообщение очереди подписки)
+@router.websocket("/ws")
+async def kitchen_ws(websocket: WebSocket, token: str = Query(...)):
+    if not await is_staff(token):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    try:
+        queue = await kitchen_feed.subscribe()
+    except ConnectionError:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    tasks = set()
+    try:
+        tasks = {
+            asyncio.create_task(send_updates(websocket, queue)),
+            asyncio.create_task(wait_disconnect(websocket)),
+        }
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        kitchen_feed.unsubscribe(queue)
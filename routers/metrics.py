@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from utils.metrics import render_metrics
+
+
+router = APIRouter(tags=["Metrics"])
+
+
+# Роутер метрик для Prometheus
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    content = await run_in_threadpool(render_metrics)
+    return Response(content=content, media_type=CONTENT_TYPE_LATEST)
@@ -3,7 +3,7 @@ from fastapi.responses import JSONResponse
 from fastapi_cache.decorator import cache
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
-from db.connect import get_session
+from db.connect import get_session, get_read_session
 from schemas.order import OrderOut, DeliveryCreate, OrderStatus
 from schemas.user import UserOut
 from schemas.cart import CartItemCreate
@@ -11,7 +11,10 @@ from db.operations import OrderDO
 from utils.redis_connect import get_redis
 from utils.cache_manager import request_key_builder
 from services.redis_cart import CartDO
-from services.auth import get_current_user
+from services.checkout import checkout_lock, CheckoutInProgress
+from services.order_intake import submit_order_intent
+from services.auth import get_current_user, get_lazy_user, LazyUser
+from config import settings
 
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
@@ -25,29 +28,58 @@ async def confirmation_order(
     redis: Redis = Depends(get_redis),
     session: AsyncSession = Depends(get_session),
 ):
-    cart = await CartDO.get_cart(
-        user_id=user.id,
-        redis=redis,
-        session=session,
-    )
-    if cart and cart.cart_items:
-        await OrderDO.add(
-            user_id=user.id,
-            session=session,
-            values=cart,
-            delivery_data=delivery_data,
-        )
-        await CartDO.remove_cart(
-            user_id=user.id,
-            redis=redis,
+    reference = None
+    try:
+        async with checkout_lock(user_id=user.id, redis=redis) as fence:
+            cart_items = await CartDO.get_cart_quantities(
+                user_id=user.id, redis=redis
+            )
+            accepted = False
+            if cart_items and settings.ORDER_INTAKE_ENABLED:
+                # заказ запишет консьюмер очереди, клиент получает номер
+                reference = await submit_order_intent(
+                    user_id=user.id,
+                    cart_items=cart_items,
+                    delivery_data=delivery_data,
+                    redis=redis,
+                    session=session,
+                )
+                accepted = reference is not None
+            elif cart_items:
+                # цены позиций берутся из БД в транзакции создания заказа
+                order = await OrderDO.add(
+                    user_id=user.id,
+                    session=session,
+                    cart_items=cart_items,
+                    delivery_data=delivery_data,
+                    fence=fence,
+                )
+                accepted = order is not None
+            if not accepted:
+                raise HTTPException(
+                    status_code=400,
+                    detail="No products in cart",
+                )
+            # списываем только оформленное: добавленное во время
+            # оформления остаётся в корзине
+            await CartDO.consume_cart(
+                user_id=user.id,
+                cart_items=cart_items,
+                redis=redis,
+            )
+    except CheckoutInProgress:
+        raise HTTPException(
+            status_code=409,
+            detail="Checkout already in progress",
         )
+    if reference is not None:
         return JSONResponse(
-            content={"message": "Order successfully created"},
-            status_code=201,
+            content={"message": "Order accepted", "reference": reference},
+            status_code=202,
         )
-    return HTTPException(
-        status_code=400,
-        detail="No products in cart",
+    return JSONResponse(
+        content={"message": "Order successfully created"},
+        status_code=201,
     )
 
 
@@ -57,17 +89,18 @@ async def confirmation_order(
 @cache(expire=30, key_builder=request_key_builder)
 async def get_all_orders(
     status: str = Query(None),
-    user: UserOut = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    user: LazyUser = Depends(get_lazy_user),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    current_user = await user.load()
     if not status:
         orders = await OrderDO.get_all(
-            user_id=user.id,
+            user_id=current_user.id,
             session=session,
         )
     else:
         orders = await OrderDO.get_all_by_status(
-            user_id=user.id,
+            user_id=current_user.id,
             status=status,
             session=session,
         )
@@ -78,11 +111,12 @@ async def get_all_orders(
 @router.get("/history/", response_model=list[OrderOut])
 @cache(expire=30, key_builder=request_key_builder)
 async def get_order_history(
-    user: UserOut = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    user: LazyUser = Depends(get_lazy_user),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    current_user = await user.load()
     orders = await OrderDO.get_all_by_status(
-        user_id=user.id,
+        user_id=current_user.id,
         status=OrderStatus.COMPLETED.value,
         session=session,
     )
@@ -93,16 +127,17 @@ async def get_order_history(
 @router.get("/current/", response_model=list[OrderOut])
 @cache(expire=30, key_builder=request_key_builder)
 async def get_current_orders(
-    user: UserOut = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    user: LazyUser = Depends(get_lazy_user),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    current_user = await user.load()
     statuses = [
         status.value
         for status in OrderStatus
         if status != OrderStatus.COMPLETED
     ]
     orders = await OrderDO.get_all_by_statuses(
-        user_id=user.id,
+        user_id=current_user.id,
         statuses=statuses,
         session=session,
     )
@@ -114,12 +149,13 @@ async def get_current_orders(
 @cache(expire=30, key_builder=request_key_builder)
 async def get_order(
     order_id: int,
-    user: UserOut = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    user: LazyUser = Depends(get_lazy_user),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    current_user = await user.load()
     order = await OrderDO.get_by_id(
         order_id=order_id,
-        user_id=user.id,
+        user_id=current_user.id,
         session=session,
     )
     return order
@@ -134,14 +170,6 @@ async def repeat_order_to_cart(
     session: AsyncSession = Depends(get_session),
     redis: Redis = Depends(get_redis),
 ):
-    # чистим корзину перед добавлением товаров из заказа
-    cart = await CartDO.get_cart(
-        user_id=user.id,
-        redis=redis,
-        session=session,
-    )
-    if cart and cart.cart_items:
-        await CartDO.remove_cart(user.id, redis)
     db_order = await OrderDO.get_by_id(
         order_id=order_id,
         user_id=user.id,
@@ -149,23 +177,25 @@ async def repeat_order_to_cart(
     )
     if not db_order:
         raise HTTPException(status_code=404, detail="Order not found")
-    # проходимся по всем элементам заказа и повторяем
-    for order_item in db_order.order_items:
-        cart_item = CartItemCreate(
-            product_id=order_item.product_id,
-            size_id=order_item.size_id,
-            quantity=order_item.quantity,
-        )
-        await CartDO.repeat_item_to_cart(
-            cart_item=cart_item,
-            user_id=user.id,
-            redis=redis,
-            session=session,
-        )
+    # корзина заменяется продуктами заказа, которые ещё есть в продаже
+    skipped_items = await CartDO.repeat_order(
+        items=[
+            CartItemCreate(
+                product_id=order_item.product_id,
+                size_id=order_item.size_id,
+                quantity=order_item.quantity,
+            )
+            for order_item in db_order.order_items
+        ],
+        user_id=user.id,
+        redis=redis,
+        session=session,
+    )
 
     return JSONResponse(
         content={
-            "message": "Products from the order have been added to the cart"
+            "message": "Products from the order have been added to the cart",
+            "skipped_items": [item.model_dump() for item in skipped_items],
         },
         status_code=200,
     )
@@ -1,42 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.connect import get_session
+from db.connect import get_read_session
 from schemas.product import ProductOut
 from db.operations import ProductDO
-from utils.cache_manager import request_key_builder
+from services.catalog import get_catalog_response
+from utils.redis_connect import get_redis_no_decode
+from config import settings
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+products_adapter = TypeAdapter(list[ProductOut])
+product_adapter = TypeAdapter(ProductOut)
+
 
 # Роутер получения всех продуктов по категории
 # (если category_id=None то выводит все продукты)
 @router.get("/", response_model=list[ProductOut])
-@cache(expire=60, key_builder=request_key_builder)
 async def get_products(
+    request: Request,
     category_id: int = Query(None),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    redis: Redis = Depends(get_redis_no_decode),
 ):
-    if not category_id:
-        products = await ProductDO.get_all(session=session)
-    else:
-        products = await ProductDO.get_all_by_category_id(
+    async def load():
+        if settings.CATALOG_SQL_RENDER:
+            return await ProductDO.get_all_json(
+                session=session, category_id=category_id
+            )
+        if not category_id:
+            return await ProductDO.get_all(session=session)
+        return await ProductDO.get_all_by_category_id(
             category_id=category_id, session=session
         )
-    return products
+
+    key = f"products:{category_id}" if category_id else "products"
+    return await get_catalog_response(
+        request, key, load, products_adapter, redis
+    )
 
 
 # Роутер получения продукта по id
 @router.get("/{product_id}/", response_model=ProductOut)
-@cache(expire=60, key_builder=request_key_builder)
 async def get_product(
+    request: Request,
     product_id: int,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    redis: Redis = Depends(get_redis_no_decode),
 ):
-    product = await ProductDO.get_by_id(
-        product_id=product_id,
-        session=session,
+    async def load():
+        product = await ProductDO.get_by_id(
+            product_id=product_id,
+            session=session,
+        )
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return product
+
+    return await get_catalog_response(
+        request, f"product:{product_id}", load, product_adapter, redis
     )
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
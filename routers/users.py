@@ -12,20 +12,21 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
 from db.connect import get_session
 from schemas.user import UserOut, UserDataTg, UserDataWeb
-from db.operations import UserDO
+from db.operations import UserDO, OutboxDO
 from services.auth import (
     authentificate_user,
     create_access_token,
     create_refresh_token,
     get_hash_password,
     get_current_user,
+    get_lazy_user,
+    LazyUser,
     create_email_confirmation_token,
     verify_email_confirmation_token,
 )
 from schemas.token import Token, RefreshTokenRequest
 from utils.redis_connect import get_redis
 from utils.send_email import send_confirmation_email
-from utils.rmq_producer import publish_confirmations
 from utils.cache_manager import request_key_builder
 from config import settings
 
@@ -135,6 +136,19 @@ async def confirmation_email(
             status_code=400,
             detail="Email already confirmed",
         )
+    # событие для бота записывается в транзакции пользователя
+    # и публикуется релеем outbox
+    if "tg_id" in user_data:
+        OutboxDO.stage(
+            session=session,
+            event="user_confirmed",
+            routing_key="user_confirmations",
+            payload={
+                "event": "user_confirmed",
+                "email": user_data["email"],
+                "tg_id": user_data["tg_id"],
+            },
+        )
     if not db_user:
         await UserDO.add(session=session, **user_data)
     else:
@@ -170,16 +184,8 @@ async def confirmation_email(
             },
             status_code=200,
         )
-    # если пользователь пришел через tg бота - выводим
-    # сообщение об успехе и передаём в бота через rabbit
+    # если пользователь пришел через tg бота - выводим сообщение об успехе
     if "tg_id" in user_data:
-        await publish_confirmations(
-            {
-                "event": "user_confirmed",
-                "email": user_data["email"],
-                "tg_id": user_data["tg_id"],
-            }
-        )
         return JSONResponse(
             content={"message": "Email successfully confirmed!"},
             status_code=200,
@@ -231,8 +237,8 @@ async def logout_user(
 # Роутер профиля пользователя
 @router.get("/profile/", response_model=UserOut)
 @cache(expire=60, key_builder=request_key_builder)
-async def get_profile(user: UserOut = Depends(get_current_user)):
-    return user
+async def get_profile(user: LazyUser = Depends(get_lazy_user)):
+    return await user.load()
 
 
 # Роутер обновления access токена
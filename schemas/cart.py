@@ -69,3 +69,10 @@ class CartItemModify(BaseModel):
         ge=1,
         description="Quantity must be at least 1",
     )
+
+
+class CartItemsBatch(BaseModel):
+    items: List[CartItemCreate] = Field(
+        max_length=100,
+        description="Items to add or to replace the cart with",
+    )
@@ -25,6 +25,7 @@ class OrderItemOut(BaseModel):
 class OrderOut(BaseModel):
     id: int
     user_order_id: int
+    reference: str | None = None
     order_items: List[OrderItemOut]
     total_amount: Decimal
     status: OrderStatus
@@ -48,3 +49,19 @@ class DeliveryOut(BaseModel):
     order_id: int
     delivery_type: DeliveryType
     delivery_address: str | None
+
+
+# Заказ, принятый в очередь: позиции (product_id, size_id, quantity)
+class OrderIntent(BaseModel):
+    reference: str
+    user_id: int
+    items: List[tuple[int, int, int]]
+    delivery: DeliveryCreate
+
+    @property
+    def cart_items(self) -> dict[tuple[int, int], int]:
+        """Позиции в виде корзины {(product_id, size_id): quantity}"""
+        return {
+            (product_id, size_id): quantity
+            for product_id, size_id, quantity in self.items
+        }
@@ -0,0 +1,38 @@
+"""
+Одноразовая миграция корзин в Redis: значения полей cart:{user_id}
+из JSON {"product_id", "size_id", "quantity"} в количество числом.
+Приложение читает оба формата, поэтому миграцию можно запускать
+на работающем сервисе; повторный запуск ничего не меняет.
+
+Запуск из корня проекта:
+    python scripts/migrate_cart_values.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.redis_connect import get_redis, redis_pool  # noqa: E402
+from services.redis_cart import migrate_cart_values  # noqa: E402
+
+
+async def run(batch_size: int):
+    try:
+        redis = await get_redis()
+        migrated = await migrate_cart_values(redis, batch_size=batch_size)
+        print(f"Migrated {migrated} cart values")
+    finally:
+        await redis_pool.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Отдельный процесс консьюмеров очереди приёма заказов
+(ORDER_INTAKE_ENABLED): пишет заказы из потока orders:intake в БД
+пачками по ORDER_INTAKE_BATCH_SIZE. Можно запускать в нескольких
+экземплярах, в том числе вместе с консьюмерами в процессах приложения.
+
+Запуск из корня проекта:
+    python scripts/order_intake_worker.py [--consumers 4]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db.connect import engine  # noqa: E402
+from utils.redis_connect import redis_pool  # noqa: E402
+from services.order_intake import start_intake_consumers  # noqa: E402
+from utils.logger import setup_logging, stop_logging  # noqa: E402
+
+
+async def run(consumers: int):
+    tasks = await start_intake_consumers(consumers)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await redis_pool.aclose()
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--consumers", type=int, default=4)
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(run(args.consumers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
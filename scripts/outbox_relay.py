@@ -0,0 +1,49 @@
+"""
+Отдельный процесс релея outbox: публикует события из таблицы outbox
+в RabbitMQ пачками по OUTBOX_BATCH_SIZE с подтверждением брокера.
+Можно запускать в нескольких экземплярах, в том числе вместе
+с релеями в процессах приложения (OUTBOX_RELAYS).
+
+Запуск из корня проекта:
+    python scripts/outbox_relay.py [--relays 2]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db.connect import engine  # noqa: E402
+from services.outbox_relay import start_outbox_relays  # noqa: E402
+from utils.rmq_producer import close_rmq_connection  # noqa: E402
+from utils.logger import setup_logging, stop_logging  # noqa: E402
+
+
+async def run(relays: int):
+    tasks = start_outbox_relays(relays)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await close_rmq_connection()
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--relays", type=int, default=2)
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(run(args.relays))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
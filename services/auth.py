@@ -1,14 +1,15 @@
 import jwt
 from datetime import datetime, timedelta
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Request, status
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 
 from itsdangerous import URLSafeTimedSerializer
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.connect import get_session
+from db.connect import get_session, get_read_session
 from schemas.token import TokenData
 from db.operations import UserDO
+from utils.logger import bind_log_context
 from config import settings
 
 
@@ -69,11 +70,11 @@ def create_refresh_token(data: dict, secret_key: str):
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: AsyncSession = Depends(get_session),
-):
-    """Функция возврата юзера по access токену"""
+def decode_access_token(token: str) -> str:
+    """
+    Функция получения email из access токена веба или бота,
+    проверяет подпись и срок действия без обращения к БД
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -110,14 +111,68 @@ async def get_current_user(
     email = payload.get("email")
     if not email:
         raise credentials_exception
-    token_data = TokenData(email=email)
-    # Проверяем пользователя в БД по email
-    user = await UserDO.get_by_email(email=token_data.email, session=session)
+    return TokenData(email=email).email
+
+
+async def load_user(email: str, session: AsyncSession):
+    """Функция получения пользователя из БД по email из токена"""
+    user = await UserDO.get_by_email(email=email, session=session)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+    bind_log_context(user_id=user.id, user_email=user.email)
     return user
 
 
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_session),
+):
+    """Функция возврата юзера по access токену"""
+    email = decode_access_token(token)
+    # Проверяем пользователя в БД по email
+    return await load_user(email=email, session=session)
+
+
+class LazyUser:
+    """
+    Пользователь из access токена для кэшируемых роутов:
+    токен проверяется сразу, а запрос в БД выполняется только
+    при вызове load(), то есть при промахе кэша
+    """
+
+    def __init__(self, email: str, session: AsyncSession):
+        self.email = email
+        self._session = session
+        self._user = None
+
+    async def load(self):
+        if self._user is None:
+            self._user = await load_user(
+                email=self.email,
+                session=self._session,
+            )
+        return self._user
+
+
+async def get_lazy_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_read_session),
+) -> LazyUser:
+    """
+    Функция возврата ленивого юзера по access токену,
+    email пользователя попадает в ключ кэша (request_key_builder)
+    и в контекст логов (user_id известен только после load())
+    """
+    email = decode_access_token(token)
+    request.state.user_email = email
+    bind_log_context(user_email=email)
+    return LazyUser(email=email, session=session)
+
+
 def create_email_confirmation_token(email: str):
     """Функция создания токена для подтверждения регистрации"""
     serializer = URLSafeTimedSerializer(settings.SECRET_KEY_EMAIL)
@@ -0,0 +1,151 @@
+import gzip
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from utils.metrics import CATALOG_PAYLOADS
+from config import settings
+
+
+logger = logging.getLogger("catalog")
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+# Готовые тела ответов текущей версии каталога в памяти процесса,
+# не больше CATALOG_MEMORY_ITEMS (давно не запрошенные вытесняются)
+_payloads: OrderedDict[str, "CatalogPayload"] = OrderedDict()
+_payloads_version: str | None = None
+
+
+class CatalogPayload:
+    """Закодированное тело ответа и его gzip вариант"""
+
+    __slots__ = ("body", "gzip_body")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = None
+        if len(body) >= settings.CATALOG_GZIP_MIN_SIZE:
+            self.gzip_body = gzip.compress(body, compresslevel=6)
+
+
+def _encode(adapter: TypeAdapter, items: Any) -> bytes:
+    """Валидация ORM объектов по схеме ответа и кодирование в JSON"""
+    return adapter.dump_json(
+        adapter.validate_python(items, from_attributes=True)
+    )
+
+
+async def get_catalog_version(redis: Redis) -> str:
+    """
+    Текущая версия каталога из Redis, общая для всех воркеров.
+    Если версии нет (истекла или сброшена) - создаём новую
+    """
+    version = await redis.get(CATALOG_VERSION_KEY)
+    if version is None:
+        new_version = uuid4().hex
+        await redis.set(
+            CATALOG_VERSION_KEY,
+            new_version,
+            nx=True,
+            ex=settings.CATALOG_CACHE_TTL,
+        )
+        version = await redis.get(CATALOG_VERSION_KEY) or new_version
+    return version.decode() if isinstance(version, bytes) else version
+
+
+async def bump_catalog_version(redis: Redis):
+    """Новая версия каталога - готовые тела ответов пересобираются"""
+    await redis.set(
+        CATALOG_VERSION_KEY,
+        uuid4().hex,
+        ex=settings.CATALOG_CACHE_TTL,
+    )
+    logger.info("Catalog version bumped")
+
+
+def is_empty(items: Any) -> bool:
+    """Пустой список (в том числе собранный в БД JSON)"""
+    return items == "[]" if isinstance(items, str) else not items
+
+
+async def get_catalog_payload(
+    key: str,
+    load: Callable[[], Awaitable[Any]],
+    adapter: TypeAdapter,
+    redis: Redis,
+) -> tuple[CatalogPayload, str]:
+    """
+    Тело ответа каталога для key: из памяти процесса, затем из Redis
+    (собранное другим воркером), иначе load из БД и кодирование.
+    load возвращает ORM объекты или уже готовый JSON строкой.
+    Пустые ответы (например, несуществующая категория) не кэшируются,
+    чтобы перебор id не заполнял кэш. Возвращает тело и источник
+    (memory, redis, build или empty)
+    """
+    global _payloads_version
+    version = await get_catalog_version(redis)
+    if version != _payloads_version:
+        _payloads.clear()
+        _payloads_version = version
+    payload = _payloads.get(key)
+    if payload is not None:
+        _payloads.move_to_end(key)
+        CATALOG_PAYLOADS.labels(source="memory").inc()
+        return payload, "memory"
+
+    redis_key = f"catalog:{version}:{key}"
+    body = await redis.get(redis_key)
+    source = "redis"
+    if body is None:
+        logger.info("Building catalog payload %s", key)
+        items = await load()
+        if is_empty(items):
+            CATALOG_PAYLOADS.labels(source="empty").inc()
+            return CatalogPayload(b"[]"), "empty"
+        source = "build"
+        if isinstance(items, str):
+            # JSON уже собран в БД
+            body = items.encode()
+        else:
+            # computed поля схем обращаются к S3 синхронно
+            body = await run_in_threadpool(_encode, adapter, items)
+        await redis.set(redis_key, body, ex=settings.CATALOG_CACHE_TTL)
+    payload = await run_in_threadpool(CatalogPayload, body)
+    # версия могла смениться, пока собирали тело
+    if version == _payloads_version:
+        _payloads[key] = payload
+        while len(_payloads) > settings.CATALOG_MEMORY_ITEMS:
+            _payloads.popitem(last=False)
+    CATALOG_PAYLOADS.labels(source=source).inc()
+    return payload, source
+
+
+async def get_catalog_response(
+    request: Request,
+    key: str,
+    load: Callable[[], Awaitable[Any]],
+    adapter: TypeAdapter,
+    redis: Redis,
+) -> Response:
+    """
+    Готовый ответ каталога без валидации и сериализации. Заголовок
+    X-FastAPI-Cache как у fastapi-cache, чтобы MetricsMiddleware
+    учитывал попадания в cache_requests_total
+    """
+    payload, source = await get_catalog_payload(key, load, adapter, redis)
+    headers = {
+        "Vary": "Accept-Encoding",
+        "X-FastAPI-Cache": "HIT" if source in ("memory", "redis") else "MISS",
+    }
+    body = payload.body
+    if payload.gzip_body is not None and "gzip" in request.headers.get(
+        "Accept-Encoding", ""
+    ):
+        body = payload.gzip_body
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,79 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from redis.asyncio import Redis
+from db.operations import StaleFence
+from config import settings
+
+
+logger = logging.getLogger("checkout")
+
+# Блокировка берётся, только если она свободна; значение - fencing
+# token из монотонного счётчика пользователя
+ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local fence = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], fence, 'PX', ARGV[1])
+return fence
+"""
+
+# Снятие только своей блокировки (чужую, взятую после истечения
+# TTL, не трогаем)
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Подтягивание счётчика к значению из БД, если он отстал
+# (например, Redis потерял ключ)
+RESYNC_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if current < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+class CheckoutInProgress(Exception):
+    """Заказ пользователя уже оформляется другим запросом"""
+
+
+def lock_key(user_id: int) -> str:
+    return f"checkout:lock:{user_id}"
+
+
+def fence_key(user_id: int) -> str:
+    return f"checkout:fence:{user_id}"
+
+
+@asynccontextmanager
+async def checkout_lock(user_id: int, redis: Redis) -> AsyncIterator[int]:
+    """
+    Блокировка оформления заказа пользователя на время чтения корзины,
+    записи заказа и списания корзины. Отдаёт fencing token, который
+    OrderDO.add сверяет с БД: запрос, чья блокировка истекла, не
+    запишет заказ поверх более нового. Запись в корзину блокировку
+    не ждёт - оформление списывает только прочитанные количества
+    """
+    fence = await redis.eval(
+        ACQUIRE_SCRIPT,
+        2,
+        lock_key(user_id),
+        fence_key(user_id),
+        settings.CHECKOUT_LOCK_TTL_MS,
+    )
+    if not fence:
+        logger.warning("Checkout already in progress for user %s", user_id)
+        raise CheckoutInProgress
+    try:
+        yield fence
+    except StaleFence as e:
+        await redis.eval(RESYNC_SCRIPT, 1, fence_key(user_id), e.current)
+        raise CheckoutInProgress from e
+    finally:
+        await redis.eval(RELEASE_SCRIPT, 1, lock_key(user_id), fence)
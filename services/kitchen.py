@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import asyncpg
+from pydantic import TypeAdapter
+from db.connect import AsyncSessionLocal
+from db.models import ORDER_CHANGES_CHANNEL
+from db.operations import OrderDO
+from schemas.order import OrderOut, OrderStatus
+from utils.json_codec import dumps
+from config import settings
+
+
+logger = logging.getLogger("kitchen")
+
+orders_adapter = TypeAdapter(list[OrderOut])
+
+
+def dump_orders(orders) -> list:
+    """Заказы из ORM объектов в JSON-совместимые словари OrderOut"""
+    return orders_adapter.dump_python(
+        orders_adapter.validate_python(orders, from_attributes=True),
+        mode="json",
+    )
+
+
+async def kitchen_snapshot() -> str:
+    """Снимок очереди кухни: все незавершённые заказы с позициями"""
+    async with AsyncSessionLocal() as session:
+        orders = await OrderDO.get_active_with_items(session=session)
+    return dumps({"type": "snapshot", "orders": dump_orders(orders)}).decode()
+
+
+async def kitchen_diff(ids: set[int]) -> str:
+    """
+    Изменения очереди по id заказов из уведомлений: незавершённые
+    заказы целиком (upsert), завершённые и удалённые - в remove
+    """
+    async with AsyncSessionLocal() as session:
+        orders = await OrderDO.get_by_ids_with_items(
+            ids=list(ids), session=session
+        )
+    active = [
+        order for order in orders if order.status != OrderStatus.COMPLETED
+    ]
+    removed = ids - {order.id for order in active}
+    return dumps(
+        {
+            "type": "diff",
+            "upsert": dump_orders(active),
+            "remove": sorted(removed),
+        }
+    ).decode()
+
+
+class KitchenFeed:
+    """
+    Общая на процесс подписка на уведомления order_changes: одно
+    соединение LISTEN и одна загрузка изменённых заказов на пачку
+    уведомлений для всех подключённых экранов. Экран получает
+    очередь сообщений, первым в ней идёт снимок, None в очереди -
+    сигнал переподключиться
+    """
+
+    def __init__(self):
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+        self._listening = asyncio.Event()
+        # снимок и изменения читаются из БД по очереди, поэтому
+        # изменения после снимка не старше его
+        self._reading = asyncio.Lock()
+
+    async def subscribe(self) -> asyncio.Queue:
+        """
+        Очередь сообщений нового экрана со снимком очереди кухни
+        первым сообщением. Снимок читается, когда LISTEN уже
+        выполнен, поэтому изменения не теряются, а изменения,
+        прочитанные раньше снимка, из очереди убираются
+        """
+        queue = asyncio.Queue(maxsize=settings.KITCHEN_CLIENT_QUEUE)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._listening.clear()
+            self._task = asyncio.create_task(self._listen())
+        listening = asyncio.create_task(self._listening.wait())
+        await asyncio.wait(
+            {listening, self._task}, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not listening.done():
+            listening.cancel()
+            self.unsubscribe(queue)
+            raise ConnectionError("Kitchen feed is not listening")
+        try:
+            async with self._reading:
+                snapshot = await kitchen_snapshot()
+                if queue not in self._subscribers:
+                    raise ConnectionError("Kitchen feed is restarting")
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(snapshot)
+        except BaseException:
+            self.unsubscribe(queue)
+            raise
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Отписка экрана, без экранов соединение LISTEN закрывается"""
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _broadcast(self, message: str):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # экран не успевает - отключаем, при переподключении
+                # он получит свежий снимок
+                logger.warning("Kitchen screen is too slow, disconnecting")
+                self._disconnect(queue)
+
+    def _disconnect(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _listen(self):
+        changed: asyncio.Queue[int | None] = asyncio.Queue()
+
+        def on_notify(connection, pid, channel, payload):
+            changed.put_nowait(int(payload))
+
+        def on_terminate(connection):
+            changed.put_nowait(None)
+
+        connection = None
+        try:
+            connection = await asyncpg.connect(
+                user=settings.DB_USER,
+                password=settings.DB_PASSWORD,
+                host=settings.KITCHEN_DB_HOST or settings.DB_HOST,
+                port=settings.KITCHEN_DB_PORT or settings.DB_PORT,
+                database=settings.DB_NAME,
+            )
+            connection.add_termination_listener(on_terminate)
+            await connection.add_listener(ORDER_CHANGES_CHANNEL, on_notify)
+            self._listening.set()
+            logger.info("Kitchen feed is listening for order changes")
+            while True:
+                ids = {await changed.get()}
+                # уведомления за интервал уходят одной пачкой
+                await asyncio.sleep(settings.KITCHEN_DIFF_INTERVAL)
+                while not changed.empty():
+                    ids.add(changed.get_nowait())
+                if None in ids:
+                    raise ConnectionError("LISTEN connection is closed")
+                async with self._reading:
+                    self._broadcast(await kitchen_diff(ids))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # уведомления могли потеряться - экраны переподключатся
+            # и получат снимок, подписка запустится заново
+            logger.error("Kitchen feed failed: %s", e, exc_info=True)
+            for queue in list(self._subscribers):
+                self._disconnect(queue)
+        finally:
+            self._listening.clear()
+            if connection is not None:
+                await connection.close()
+
+
+kitchen_feed = KitchenFeed()
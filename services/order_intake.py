@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import socket
+from uuid import uuid4
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.connect import AsyncSessionLocal
+from db.operations import OrderDO, ProductDO
+from schemas.order import DeliveryCreate, OrderIntent
+from services.redis_cart import CartDO
+from utils.metrics import (
+    ORDER_INTAKE_BATCH_LATENCY,
+    ORDER_INTAKE_INTENTS,
+    observe,
+)
+from utils.redis_connect import get_redis
+from config import settings
+
+
+logger = logging.getLogger("order_intake")
+
+INTAKE_STREAM = "orders:intake"
+INTAKE_GROUP = "order-writers"
+
+
+async def submit_order_intent(
+    user_id: int,
+    cart_items: dict[tuple[int, int], int],
+    delivery_data: DeliveryCreate,
+    redis: Redis,
+    session: AsyncSession,
+) -> str | None:
+    """
+    Проверка продуктов корзины одним запросом и запись неизменяемого
+    намерения заказа в поток приёма заказов. Возвращает номер, с которым
+    заказ появится в /orders/, или None, если продуктов нет в БД
+    """
+    product_sizes = await ProductDO.get_for_ids_by_size_ids(
+        ids=list(cart_items), session=session
+    )
+    items = [
+        (product_id, size_id, quantity)
+        for (product_id, size_id), quantity in cart_items.items()
+        if (product_id, size_id) in product_sizes
+    ]
+    if not items:
+        return None
+    reference = uuid4().hex
+    intent = OrderIntent(
+        reference=reference,
+        user_id=user_id,
+        items=items,
+        delivery=delivery_data,
+    )
+    await redis.xadd(INTAKE_STREAM, {"intent": intent.model_dump_json()})
+    ORDER_INTAKE_INTENTS.labels(result="accepted").inc()
+    logger.info("Accepted order %s for user_id %s", reference, user_id)
+    return reference
+
+
+async def write_order_intents(
+    messages: list,
+    redis: Redis,
+    session: AsyncSession,
+) -> int:
+    """
+    Запись пачки сообщений потока одной транзакцией БД: каждый заказ
+    пишется через OrderDO.add в своей точке сохранения, commit - один
+    на пачку. Заказы с уже записанным номером (повторная доставка)
+    пропускаются. После commit сообщения пачки подтверждаются и
+    удаляются из потока одной транзакцией Redis, при ошибке БД пачка
+    откатывается целиком и будет забрана повторно (невалидные
+    сообщения подтверждаются сразу). Позиции заказов, для которых
+    продуктов не осталось, возвращаются в корзину пользователя.
+    Возвращает число созданных заказов
+    """
+    intents = {}
+    done = []
+    for message_id, fields in messages:
+        try:
+            intents[message_id] = OrderIntent.model_validate_json(
+                fields["intent"]
+            )
+        except (KeyError, ValidationError) as e:
+            logger.error("Invalid order intent %s: %s", message_id, e)
+            ORDER_INTAKE_INTENTS.labels(result="invalid").inc()
+            done.append(message_id)
+    results = {}
+    try:
+        with observe(ORDER_INTAKE_BATCH_LATENCY):
+            existing = await OrderDO.get_existing_references(
+                references=[intent.reference for intent in intents.values()],
+                session=session,
+            )
+            # строки user блокируются в одном порядке во всех пачках,
+            # заказы одного пользователя остаются в порядке потока
+            for message_id, intent in sorted(
+                intents.items(), key=lambda item: item[1].user_id
+            ):
+                results[message_id] = await write_order_intent(
+                    intent, existing, session
+                )
+            await session.commit()
+        # продукты заказа пропали из БД после приёма: корзина уже
+        # списана, позиции возвращаются в неё
+        for message_id, result in results.items():
+            if result == "empty":
+                intent = intents[message_id]
+                await CartDO.restore_items(
+                    user_id=intent.user_id,
+                    cart_items=intent.cart_items,
+                    redis=redis,
+                )
+        done.extend(results)
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        if done:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.xack(INTAKE_STREAM, INTAKE_GROUP, *done)
+                pipe.xdel(INTAKE_STREAM, *done)
+                await pipe.execute()
+    for result in results.values():
+        ORDER_INTAKE_INTENTS.labels(result=result).inc()
+    return sum(result == "created" for result in results.values())
+
+
+async def write_order_intent(
+    intent: OrderIntent,
+    existing: set[str],
+    session: AsyncSession,
+) -> str:
+    """
+    Запись одного заказа пачки в точке сохранения, возвращает
+    результат для метрики
+    """
+    if intent.reference in existing:
+        logger.info("Order %s is already written", intent.reference)
+        return "duplicate"
+    try:
+        async with session.begin_nested():
+            order = await OrderDO.add(
+                user_id=intent.user_id,
+                session=session,
+                cart_items=intent.cart_items,
+                delivery_data=intent.delivery,
+                reference=intent.reference,
+                commit=False,
+            )
+    except IntegrityError as e:
+        # номер записан другим консьюмером или пользователя уже нет
+        logger.warning(
+            "Order %s is not written: %s", intent.reference, e.orig
+        )
+        return "duplicate"
+    if order is None:
+        logger.warning("Order %s has no products left", intent.reference)
+        return "empty"
+    return "created"
+
+
+async def ensure_intake_group(redis: Redis):
+    """Создание потока и группы консьюмеров, если их ещё нет"""
+    try:
+        await redis.xgroup_create(
+            INTAKE_STREAM, INTAKE_GROUP, id="0", mkstream=True
+        )
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def read_order_intents(redis: Redis, consumer: str) -> list:
+    """
+    Пачка сообщений: сначала давно неподтверждённые (консьюмер упал
+    или БД была недоступна), затем новые
+    """
+    claimed = await redis.xautoclaim(
+        INTAKE_STREAM,
+        INTAKE_GROUP,
+        consumer,
+        min_idle_time=settings.ORDER_INTAKE_CLAIM_IDLE_MS,
+        count=settings.ORDER_INTAKE_BATCH_SIZE,
+    )
+    if claimed[1]:
+        return claimed[1]
+    response = await redis.xreadgroup(
+        INTAKE_GROUP,
+        consumer,
+        {INTAKE_STREAM: ">"},
+        count=settings.ORDER_INTAKE_BATCH_SIZE,
+        block=settings.ORDER_INTAKE_BLOCK_MS,
+    )
+    return response[0][1] if response else []
+
+
+async def consume_order_intents(consumer: str):
+    """Цикл консьюмера приёма заказов, работает до отмены задачи"""
+    redis = await get_redis()
+    logger.info("Order intake consumer %s started", consumer)
+    while True:
+        try:
+            messages = await read_order_intents(redis, consumer)
+            if messages:
+                async with AsyncSessionLocal() as session:
+                    await write_order_intents(messages, redis, session)
+        except asyncio.CancelledError:
+            raise
+        except ResponseError as e:
+            if "NOGROUP" not in str(e):
+                raise
+            # поток пропал вместе с группой (например, сброс Redis)
+            await ensure_intake_group(redis)
+        except Exception as e:
+            logger.error(
+                "Order intake consumer %s failed: %s",
+                consumer,
+                e,
+                exc_info=True,
+            )
+            await asyncio.sleep(1)
+
+
+async def start_intake_consumers(count: int) -> list[asyncio.Task]:
+    """Запуск count консьюмеров в текущем процессе"""
+    try:
+        await ensure_intake_group(await get_redis())
+    except Exception as e:
+        # группу создаст консьюмер, когда Redis станет доступен
+        logger.warning("Order intake group is not created: %s", e)
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    return [
+        asyncio.create_task(consume_order_intents(f"{prefix}-{i}"))
+        for i in range(count)
+    ]
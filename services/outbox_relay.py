@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.connect import AsyncSessionLocal
+from db.operations import OutboxDO
+from utils.metrics import (
+    OUTBOX_FAILED,
+    OUTBOX_LAG,
+    OUTBOX_OLDEST_AGE,
+    OUTBOX_PUBLISHED,
+)
+from utils.rmq_producer import publish_message
+from config import settings
+
+
+logger = logging.getLogger("outbox_relay")
+
+
+async def relay_outbox_batch(session: AsyncSession) -> int:
+    """
+    Публикация пачки событий outbox, заблокированных через
+    FOR UPDATE SKIP LOCKED, поэтому релеи могут работать параллельно.
+    Подтверждённые брокером события удаляются, остальные переносятся
+    на следующую попытку - всё в транзакции блокировки.
+    Возвращает размер пачки
+    """
+    events = await OutboxDO.lock_batch(
+        limit=settings.OUTBOX_BATCH_SIZE, session=session
+    )
+    now = datetime.now(timezone.utc)
+    OUTBOX_OLDEST_AGE.set(
+        max((now - event.created_at).total_seconds() for event in events)
+        if events
+        else 0
+    )
+    if not events:
+        await session.commit()
+        return 0
+    results = await asyncio.gather(
+        *(
+            publish_message(
+                exchange=event.exchange,
+                routing_key=event.routing_key,
+                payload=event.payload,
+                headers=event.headers,
+                message_id=str(event.id),
+            )
+            for event in events
+        ),
+        return_exceptions=True,
+    )
+    published, failed = [], []
+    confirmed_at = datetime.now(timezone.utc)
+    for event, result in zip(events, results):
+        if isinstance(result, Exception):
+            logger.warning(
+                "Failed to publish outbox event %s (%s): %s",
+                event.id,
+                event.event,
+                result,
+            )
+            OUTBOX_FAILED.labels(event=event.event).inc()
+            failed.append(event.id)
+        else:
+            OUTBOX_PUBLISHED.labels(event=event.event).inc()
+            OUTBOX_LAG.observe(
+                (confirmed_at - event.created_at).total_seconds()
+            )
+            published.append(event.id)
+    await OutboxDO.delete_many(ids=published, session=session)
+    await OutboxDO.postpone(ids=failed, session=session)
+    await session.commit()
+    return len(events)
+
+
+async def run_outbox_relay(name: str):
+    """Цикл релея outbox, работает до отмены задачи"""
+    logger.info("Outbox relay %s started", name)
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                count = await relay_outbox_batch(session)
+            if count < settings.OUTBOX_BATCH_SIZE:
+                await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                "Outbox relay %s failed: %s", name, e, exc_info=True
+            )
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+
+def start_outbox_relays(count: int) -> list[asyncio.Task]:
+    """Запуск count релеев в текущем процессе"""
+    return [
+        asyncio.create_task(run_outbox_relay(f"relay-{i}"))
+        for i in range(count)
+    ]
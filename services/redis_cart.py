@@ -1,10 +1,10 @@
 import logging
-import logging.config
-import json
 from redis.asyncio import Redis
+from redis.exceptions import ResponseError
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.operations import ProductDO
+from utils.json_codec import loads
 from schemas.cart import (
     CartItemModify,
     CartItemOut,
@@ -12,12 +12,94 @@ from schemas.cart import (
     CartItemCreate,
     ProductCartOut,
 )
-from utils.logger import logging_config
 
 
-logging.config.dictConfig(logging_config)
 logger = logging.getLogger("redis_operations")
 
+CART_TTL = 60 * 60
+
+# Поле хэша cart:{user_id} - "{product_id}:{size_id}", значение -
+# количество целым числом. Прежний формат значения - JSON
+# {"product_id", "size_id", "quantity"} - читается до миграции
+# migrate_cart_values
+MIGRATE_CART_SCRIPT = """
+local fields = redis.call('HGETALL', KEYS[1])
+local migrated = 0
+for i = 1, #fields, 2 do
+    local value = fields[i + 1]
+    if string.sub(value, 1, 1) == '{' then
+        local quantity = cjson.decode(value)['quantity']
+        redis.call('HSET', KEYS[1], fields[i], quantity)
+        migrated = migrated + 1
+    end
+end
+return migrated
+"""
+
+# Списание оформленных количеств: ARGV - пары поле, количество.
+# Добавленное в корзину во время оформления остаётся в ней
+CONSUME_CART_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local value = redis.call('HGET', KEYS[1], ARGV[i])
+    if value then
+        if string.sub(value, 1, 1) == '{' then
+            value = cjson.decode(value)['quantity']
+        end
+        local left = tonumber(value) - tonumber(ARGV[i + 1])
+        if left > 0 then
+            redis.call('HSET', KEYS[1], ARGV[i], left)
+        else
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+end
+return redis.call('HLEN', KEYS[1])
+"""
+
+
+def cart_item_quantity(value: str | bytes | int) -> int:
+    """Количество товара из значения поля корзины любого формата"""
+    if not isinstance(value, int) and value[:1] in ("{", b"{"):
+        return loads(value)["quantity"]
+    return int(value)
+
+
+def parse_cart_item_id(cart_item_id: str | bytes) -> tuple[int, int]:
+    """product_id и size_id из имени поля корзины"""
+    if isinstance(cart_item_id, bytes):
+        cart_item_id = cart_item_id.decode()
+    product_id, size_id = cart_item_id.split(":")
+    return int(product_id), int(size_id)
+
+
+async def migrate_cart_values(redis: Redis, batch_size: int = 500) -> int:
+    """
+    Перевод значений всех корзин из JSON в число (атомарно для каждой
+    корзины, повторный запуск безопасен). Возвращает число полей
+    """
+    migrate = redis.register_script(MIGRATE_CART_SCRIPT)
+    migrated = 0
+    async for cart_key in redis.scan_iter(
+        match="cart:*", count=batch_size, _type="hash"
+    ):
+        migrated += await migrate(keys=[cart_key])
+    logger.info("Migrated %s cart values", migrated)
+    return migrated
+
+
+def product_cart_out(product_size) -> ProductCartOut:
+    """Продукт корзины из ProductSize с загруженными product и size"""
+    return ProductCartOut(
+        id=product_size.product.id,
+        name=product_size.product.name,
+        description=product_size.product.description,
+        photo_name=product_size.product.photo_name,
+        size_id=product_size.size.id,
+        size_name=product_size.size.name,
+        price=product_size.price,
+        discount=product_size.discount,
+    )
+
 
 class CartDO:
     """
@@ -34,8 +116,10 @@ class CartDO:
     ):
         """Добавление продукта в корзину"""
         logger.info(
-            f"Adding product {product_id} size {size_id} to user_id "
-            f"{user_id} cart"
+            "Adding product %s size %s to user_id %s cart",
+            product_id,
+            size_id,
+            user_id,
         )
         product_size = await ProductDO.get_for_id_by_size_id(
             product_id=product_id,
@@ -43,7 +127,7 @@ class CartDO:
             session=session,
         )
         if not product_size:
-            logger.warning(f"Product {product_id} size {size_id} not found")
+            logger.warning("Product %s size %s not found", product_id, size_id)
             raise HTTPException(
                 status_code=404,
                 detail="Product not found in database",
@@ -51,21 +135,20 @@ class CartDO:
 
         cart_key = f"cart:{user_id}"
         cart_item_id = f"{product_id}:{size_id}"
-        existing_item = await redis.hget(cart_key, cart_item_id)
-
-        if existing_item:
-            existing_item = json.loads(existing_item)
-            existing_item["quantity"] += 1
-        else:
-            existing_item = CartItemCreate(
-                product_id=product_id,
-                size_id=size_id,
-                quantity=1,
-            ).__dict__
-        cart_items = await redis.hlen(cart_key)
-        await redis.hset(cart_key, cart_item_id, json.dumps(existing_item))
-        if not cart_items:
-            await redis.expire(cart_key, 60 * 60)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(cart_key, cart_item_id, 1)
+                # TTL только у новой корзины, как и раньше
+                pipe.expire(cart_key, CART_TTL, nx=True)
+                await pipe.execute()
+        except ResponseError:
+            # значение прежнего формата (JSON) - переписываем числом
+            existing_item = await redis.hget(cart_key, cart_item_id)
+            await redis.hset(
+                cart_key,
+                cart_item_id,
+                cart_item_quantity(existing_item) + 1,
+            )
 
     @staticmethod
     async def update_cart_item(
@@ -78,8 +161,10 @@ class CartDO:
     ):
         """Обновление количества продукта в корзине"""
         logger.info(
-            f"Updating product {product_id} size {size_id} in user_id "
-            f"{user_id} cart"
+            "Updating product %s size %s in user_id %s cart",
+            product_id,
+            size_id,
+            user_id,
         )
         cart_key = f"cart:{user_id}"
         cart_item_id = f"{product_id}:{size_id}"
@@ -90,7 +175,7 @@ class CartDO:
             session=session,
         )
         if not product_size:
-            logger.warning(f"Product {product_id} size {size_id} not found")
+            logger.warning("Product %s size %s not found", product_id, size_id)
             raise HTTPException(
                 status_code=404,
                 detail="Product not found in database",
@@ -98,16 +183,16 @@ class CartDO:
 
         if not existing_item:
             logger.warning(
-                f"Product {product_id} size {size_id} not found in cart"
+                "Product %s size %s not found in cart",
+                product_id,
+                size_id,
             )
             raise HTTPException(
                 status_code=404,
                 detail="Product not found in cart",
             )
 
-        existing_item = json.loads(existing_item)
-        existing_item["quantity"] = quantity
-        await redis.hset(cart_key, cart_item_id, json.dumps(existing_item))
+        await redis.hset(cart_key, cart_item_id, quantity)
 
     @staticmethod
     async def get_cart(
@@ -116,53 +201,162 @@ class CartDO:
         session: AsyncSession,
     ):
         """Получение корзины по user_id"""
-        logger.info(f"Fetching cart for user {user_id}")
+        logger.info("Fetching cart for user %s", user_id)
         cart_key = f"cart:{user_id}"
         cart_items = await redis.hgetall(cart_key)
+        return await CartDO.hydrate_cart(cart_key, cart_items, redis, session)
+
+    @staticmethod
+    async def get_cart_quantities(
+        user_id: int,
+        redis: Redis,
+    ) -> dict[tuple[int, int], int]:
+        """Позиции корзины {(product_id, size_id): quantity} без БД"""
+        cart_items = await redis.hgetall(f"cart:{user_id}")
+        return {
+            parse_cart_item_id(cart_item_id): cart_item_quantity(item_data)
+            for cart_item_id, item_data in cart_items.items()
+        }
 
-        if not cart_items:
-            return CartOut(
-                cart_items=[],
-                total_amount=0,
+    @staticmethod
+    async def hydrate_cart(
+        cart_key: str,
+        cart_items: dict,
+        redis: Redis,
+        session: AsyncSession,
+        product_sizes: dict | None = None,
+    ):
+        """
+        Корзина с данными продуктов одним запросом к БД (product_sizes -
+        уже загруженные продукты). Продукты, которых больше нет в БД,
+        удаляются из корзины
+        """
+        product_sizes = dict(product_sizes or {})
+        unknown = [
+            ids
+            for ids in map(parse_cart_item_id, cart_items)
+            if ids not in product_sizes
+        ]
+        if unknown:
+            product_sizes.update(
+                await ProductDO.get_for_ids_by_size_ids(
+                    ids=unknown,
+                    session=session,
+                )
             )
         items = []
+        removed = []
         for cart_item_id, item_data in cart_items.items():
-            item = json.loads(item_data)
-            product_id = item["product_id"]
-            size_id = item["size_id"]
-            item = json.loads(item_data)
-            product_size = await ProductDO.get_for_id_by_size_id(
-                product_id=product_id,
-                size_id=size_id,
-                session=session,
-            )
+            product_size = product_sizes.get(parse_cart_item_id(cart_item_id))
             if not product_size:
-                logger.warning(
-                    f"Product {product_id} size {size_id} not found in DB, "
-                    f"removing from cart"
-                )
-                await redis.hdel(cart_key, cart_item_id)
+                removed.append(cart_item_id)
                 continue
-            product_data = ProductCartOut(
-                id=product_size.product.id,
-                name=product_size.product.name,
-                description=product_size.product.description,
-                photo_name=product_size.product.photo_name,
-                size_id=product_size.size.id,
-                size_name=product_size.size.name,
-                price=product_size.price,
-                discount=product_size.discount,
-            )
             items.append(
                 CartItemOut(
-                    product=product_data,
-                    quantity=item["quantity"],
+                    product=product_cart_out(product_size),
+                    quantity=cart_item_quantity(item_data),
                 )
             )
+        if removed:
+            logger.warning(
+                "Products %s not found in DB, removing from cart %s",
+                removed,
+                cart_key,
+            )
+            await redis.hdel(cart_key, *removed)
         return CartOut(
             cart_items=items,
         )
 
+    @staticmethod
+    async def validate_items(
+        items: list[CartItemCreate],
+        session: AsyncSession,
+    ) -> dict:
+        """Проверка всех продуктов одним запросом к БД"""
+        product_sizes = await ProductDO.get_for_ids_by_size_ids(
+            ids=[(item.product_id, item.size_id) for item in items],
+            session=session,
+        )
+        missing = [
+            (item.product_id, item.size_id)
+            for item in items
+            if (item.product_id, item.size_id) not in product_sizes
+        ]
+        if missing:
+            logger.warning("Products (id, size_id) %s not found", missing)
+            raise HTTPException(
+                status_code=404,
+                detail="Product not found in database",
+            )
+        return product_sizes
+
+    @staticmethod
+    async def add_items(
+        items: list[CartItemCreate],
+        user_id: int,
+        redis: Redis,
+        session: AsyncSession,
+    ):
+        """Добавление нескольких продуктов в корзину одной транзакцией"""
+        logger.info("Adding %s items to user_id %s cart", len(items), user_id)
+        product_sizes = await CartDO.validate_items(items, session)
+        cart_key = f"cart:{user_id}"
+        async with redis.pipeline(transaction=True) as pipe:
+            # значения прежнего формата переводим в число до HINCRBY
+            pipe.eval(MIGRATE_CART_SCRIPT, 1, cart_key)
+            for item in items:
+                pipe.hincrby(
+                    cart_key,
+                    f"{item.product_id}:{item.size_id}",
+                    item.quantity,
+                )
+            pipe.expire(cart_key, CART_TTL, nx=True)
+            pipe.hgetall(cart_key)
+            *_, cart_items = await pipe.execute()
+        return await CartDO.hydrate_cart(
+            cart_key, cart_items, redis, session, product_sizes
+        )
+
+    @staticmethod
+    async def set_cart_items(
+        cart_key: str,
+        items: list[CartItemCreate],
+        redis: Redis,
+    ) -> dict[str, int]:
+        """Атомарная замена содержимого корзины, пустой список - удаление"""
+        cart_items = {
+            f"{item.product_id}:{item.size_id}": item.quantity
+            for item in items
+        }
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(cart_key)
+            if cart_items:
+                pipe.hset(cart_key, mapping=cart_items)
+                pipe.expire(cart_key, CART_TTL)
+            await pipe.execute()
+        return cart_items
+
+    @staticmethod
+    async def replace_cart(
+        items: list[CartItemCreate],
+        user_id: int,
+        redis: Redis,
+        session: AsyncSession,
+    ):
+        """Замена содержимого корзины одной транзакцией"""
+        logger.info(
+            "Replacing user_id %s cart with %s items",
+            user_id,
+            len(items),
+        )
+        product_sizes = await CartDO.validate_items(items, session)
+        cart_key = f"cart:{user_id}"
+        cart_items = await CartDO.set_cart_items(cart_key, items, redis)
+        return await CartDO.hydrate_cart(
+            cart_key, cart_items, redis, session, product_sizes
+        )
+
     @staticmethod
     async def get_cart_item(
         product_id: int,
@@ -173,8 +367,10 @@ class CartDO:
     ):
         """Получение одного товара из корзины"""
         logger.info(
-            f"Fetching product {product_id} size {size_id} from user "
-            f"{user_id} cart"
+            "Fetching product %s size %s from user %s cart",
+            product_id,
+            size_id,
+            user_id,
         )
         cart_key = f"cart:{user_id}"
         cart_item_id = f"{product_id}:{size_id}"
@@ -182,35 +378,26 @@ class CartDO:
 
         if not item_data:
             logger.warning(
-                f"Product {product_id} size {size_id} not found in cart"
+                "Product %s size %s not found in cart",
+                product_id,
+                size_id,
             )
             raise HTTPException(
                 status_code=404,
                 detail="Product not found in cart",
             )
 
-        item = json.loads(item_data)
         product_size = await ProductDO.get_for_id_by_size_id(
             product_id=product_id,
             size_id=size_id,
             session=session,
         )
         if not product_size:
-            logger.warning(f"Product {product_id} not found in database")
+            logger.warning("Product %s not found in database", product_id)
             raise HTTPException(status_code=404, detail="Product not found")
-        product_data = ProductCartOut(
-            id=product_size.product.id,
-            name=product_size.product.name,
-            description=product_size.product.description,
-            photo_name=product_size.product.photo_name,
-            size_id=product_size.size.id,
-            size_name=product_size.size.name,
-            price=product_size.price,
-            discount=product_size.discount,
-        )
         return CartItemOut(
-            product=product_data,
-            quantity=item["quantity"],
+            product=product_cart_out(product_size),
+            quantity=cart_item_quantity(item_data),
         )
 
     @staticmethod
@@ -222,16 +409,20 @@ class CartDO:
     ):
         """Удаление продукта из корзины"""
         logger.info(
-            f"Removing product {product_id} size {size_id} from user_id "
-            f"{user_id} cart"
+            "Removing product %s size %s from user_id %s cart",
+            product_id,
+            size_id,
+            user_id,
         )
         cart_key = f"cart:{user_id}"
         cart_item_id = f"{product_id}:{size_id}"
         removed = await redis.hdel(cart_key, cart_item_id)
         if not removed:
             logger.warning(
-                f"Product {product_id} size {size_id} not found in cart "
-                f"{cart_key}"
+                "Product %s size %s not found in cart %s",
+                product_id,
+                size_id,
+                cart_key,
             )
             raise HTTPException(
                 status_code=404,
@@ -241,44 +432,83 @@ class CartDO:
     @staticmethod
     async def remove_cart(user_id: int, redis: Redis):
         """Очистка корзины"""
-        logger.info(f"Clearing cart for user {user_id}")
+        logger.info("Clearing cart for user %s", user_id)
         cart_key = f"cart:{user_id}"
         deleted = await redis.delete(cart_key)
         if not deleted:
-            logger.warning(f"Cart {cart_key} not found")
+            logger.warning("Cart %s not found", cart_key)
             raise HTTPException(status_code=404, detail="Cart not found")
 
     @staticmethod
-    async def repeat_item_to_cart(
-        cart_item: CartItemCreate,
+    async def consume_cart(
         user_id: int,
+        cart_items: dict[tuple[int, int], int],
+        redis: Redis,
+    ) -> int:
+        """
+        Списание из корзины позиций {(product_id, size_id): quantity},
+        прочитанных при оформлении заказа. Возвращает число
+        оставшихся в корзине позиций
+        """
+        logger.info("Consuming ordered items from user %s cart", user_id)
+        args = []
+        for (product_id, size_id), quantity in cart_items.items():
+            args += [f"{product_id}:{size_id}", quantity]
+        return await redis.eval(
+            CONSUME_CART_SCRIPT, 1, f"cart:{user_id}", *args
+        )
+
+    @staticmethod
+    async def restore_items(
+        user_id: int,
+        cart_items: dict[tuple[int, int], int],
         redis: Redis,
-        session: AsyncSession,
     ):
-        """Повторяет продукты в корзину из заказа по id"""
+        """
+        Возврат в корзину списанных позиций заказа, который не удалось
+        записать: количества прибавляются к текущим
+        """
+        logger.info("Restoring ordered items to user %s cart", user_id)
+        cart_key = f"cart:{user_id}"
+        async with redis.pipeline(transaction=True) as pipe:
+            # значения прежнего формата переводим в число до HINCRBY
+            pipe.eval(MIGRATE_CART_SCRIPT, 1, cart_key)
+            for (product_id, size_id), quantity in cart_items.items():
+                pipe.hincrby(cart_key, f"{product_id}:{size_id}", quantity)
+            pipe.expire(cart_key, CART_TTL, nx=True)
+            await pipe.execute()
+
+    @staticmethod
+    async def repeat_order(
+        items: list[CartItemCreate],
+        user_id: int,
+        redis: Redis,
+        session: AsyncSession,
+    ) -> list[CartItemCreate]:
+        """
+        Замена корзины продуктами из заказа: все продукты проверяются
+        одним запросом, отсутствующие в БД пропускаются и возвращаются
+        """
         logger.info(
-            f"Adding product {cart_item.product_id} size "
-            f"{cart_item.size_id} to user_id {user_id} cart"
+            "Repeating %s order items to user_id %s cart",
+            len(items),
+            user_id,
         )
-        product_size = await ProductDO.get_for_id_by_size_id(
-            product_id=cart_item.product_id,
-            size_id=cart_item.size_id,
+        product_sizes = await ProductDO.get_for_ids_by_size_ids(
+            ids=[(item.product_id, item.size_id) for item in items],
             session=session,
         )
-        if not product_size:
+        available = []
+        skipped = []
+        for item in items:
+            if (item.product_id, item.size_id) in product_sizes:
+                available.append(item)
+            else:
+                skipped.append(item)
+        if skipped:
             logger.warning(
-                f"Skipping product {cart_item.product_id} size "
-                f"{cart_item.size_id} - not found in database"
+                "Skipping products (id, size_id) %s - not found in database",
+                [(item.product_id, item.size_id) for item in skipped],
             )
-            return
-
-        cart_key = f"cart:{user_id}"
-        cart_item_id = f"{cart_item.product_id}:{cart_item.size_id}"
-        cart_items = await redis.hlen(cart_key)
-        await redis.hset(
-            cart_key,
-            cart_item_id,
-            json.dumps(cart_item.__dict__),
-        )
-        if not cart_items:
-            await redis.expire(cart_key, 60 * 60)
+        await CartDO.set_cart_items(f"cart:{user_id}", available, redis)
+        return skipped
@@ -1,5 +1,4 @@
 import factory
-import json
 from faker import Faker
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -144,11 +143,7 @@ class CartFactory:
         )
         cart_key = f"cart:{user_id}"
         cart_item_id = f"{product_id}:{size_id}"
-        await test_redis.hset(
-            cart_key,
-            cart_item_id,
-            json.dumps(cart_item.dict()),
-        )
+        await test_redis.hset(cart_key, cart_item_id, cart_item.quantity)
         return cart_key, cart_item_id
 
     @staticmethod
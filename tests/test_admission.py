@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from utils import middlewares
+from utils.admission import AdmissionController, Overloaded
+from tests.fixtures import products_with_sizes
+
+
+@pytest.mark.asyncio
+async def test_admission_shed(client, test_cache_manager, monkeypatch):
+    """
+    Тест ограничения нагрузки: при занятых слотах запрос получает 503
+    с Retry-After, а кэшируемые GET запросы каталога проходят
+    """
+    controller = AdmissionController(
+        max_in_flight=1,
+        reserved={},
+        route_limits={},
+        queue_timeout=0.05,
+        max_queue=10,
+    )
+    monkeypatch.setattr(middlewares, "admission", controller)
+    acquired = await controller.acquire("/carts/")
+
+    response = await client.get("/carts/")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+    response = await client.get("/products/")
+    assert response.status_code == 200
+
+    controller.release(acquired)
+    response = await client.get("/carts/")
+    assert response.status_code != 503
+
+
+@pytest.mark.asyncio
+async def test_admission_reserved_lane():
+    """
+    Оформление заказа получает свой резерв, даже когда лимит
+    /orders/ занят запросами списка заказов
+    """
+    controller = AdmissionController(
+        max_in_flight=10,
+        reserved={"/orders/confirmation/": 1},
+        route_limits={"/orders/": 2},
+        queue_timeout=0.05,
+        max_queue=10,
+    )
+    acquired = [await controller.acquire("/orders/") for _ in range(2)]
+    with pytest.raises(Overloaded):
+        await controller.acquire("/orders/")
+
+    confirmation = await controller.acquire("/orders/confirmation/")
+    assert confirmation == [controller.reserved["/orders/confirmation/"]]
+
+    for semaphore in acquired + [confirmation]:
+        controller.release(semaphore)
+
+
+@pytest.mark.asyncio
+async def test_admission_timeout_keeps_late_slot():
+    """
+    Слот, полученный одновременно с таймаутом ожидания, не теряется:
+    запрос получает Overloaded, а слот возвращается в общий лимит
+    """
+    controller = AdmissionController(
+        max_in_flight=1,
+        reserved={},
+        route_limits={},
+        queue_timeout=0.05,
+        max_queue=10,
+    )
+    holder = await controller.acquire("/carts/")
+    acquire = controller.shared.acquire
+
+    async def late_acquire():
+        # слот освобождается до таймаута, но результат
+        # acquire доходит только вместе с отменой
+        await acquire()
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    controller.shared.acquire = late_acquire
+    asyncio.get_running_loop().call_later(
+        0.01, controller.release, holder
+    )
+    with pytest.raises(Overloaded):
+        await controller.acquire("/carts/")
+    await asyncio.sleep(0.01)
+
+    assert not controller.shared.locked()
+    controller.shared.acquire = acquire
+    acquired = await controller.acquire("/carts/")
+    controller.release(acquired)
@@ -2,6 +2,7 @@ import pytest
 import json
 from decimal import Decimal, ROUND_HALF_UP
 from db.operations import ProductDO
+from services.redis_cart import migrate_cart_values
 from tests.fixtures import (
     cart_with_items,
     auth_headers_web,
@@ -31,10 +32,7 @@ async def test_add_item_to_cart_new_item(
     item_data = await test_redis.hget(cart_key, cart_item_id)
     assert item_data is not None
 
-    item = json.loads(item_data)
-    assert item["product_id"] == product.id
-    assert item["size_id"] == size.id
-    assert item["quantity"] == 1
+    assert int(item_data) == 1
 
 
 @pytest.mark.asyncio
@@ -63,8 +61,7 @@ async def test_add_item_to_cart_existing_item(
     item_data = await test_redis.hget(cart_key, cart_item_id)
     assert item_data is not None
 
-    item = json.loads(item_data)
-    assert item["quantity"] == 2
+    assert int(item_data) == 2
 
 
 @pytest.mark.asyncio
@@ -90,8 +87,7 @@ async def test_update_cart_item_quantity(
     item_data = await test_redis.hget(cart_key, cart_item_id)
     assert item_data is not None
 
-    item = json.loads(item_data)
-    assert item["quantity"] == 5
+    assert int(item_data) == 5
 
 
 @pytest.mark.asyncio
@@ -266,3 +262,139 @@ async def test_delete_cart_empty(
     )
     assert response.status_code == 404
     assert response.json() == {"detail": "Cart not found"}
+
+
+@pytest.mark.asyncio
+async def test_cart_legacy_json_values(
+    client,
+    test_redis,
+    empty_cart,
+):
+    """
+    Тест корзины со значениями прежнего формата (JSON):
+    чтение, добавление товара и миграция в количество числом
+    """
+    _, cart_key, _, headers, products, sizes = empty_cart
+    first = f"{products[0].id}:{sizes[0].id}"
+    second = f"{products[1].id}:{sizes[0].id}"
+    for cart_item_id, product in zip((first, second), products):
+        item = {"product_id": product.id, "size_id": sizes[0].id, "quantity": 2}
+        await test_redis.hset(cart_key, cart_item_id, json.dumps(item))
+
+    response = await client.get("/carts/", headers=headers)
+    assert response.status_code == 200
+    quantities = [item["quantity"] for item in response.json()["cart_items"]]
+    assert quantities == [2, 2]
+
+    response = await client.post(
+        f"/carts/add/{products[0].id}/{sizes[0].id}/",
+        headers=headers,
+    )
+    assert response.status_code == 201
+    assert await test_redis.hget(cart_key, first) == "3"
+
+    assert await migrate_cart_values(test_redis) == 1
+    assert await test_redis.hget(cart_key, second) == "2"
+    assert await migrate_cart_values(test_redis) == 0
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch(
+    client,
+    test_redis,
+    cart_with_items,
+):
+    """
+    Тест пакетного добавления: количества суммируются с корзиной,
+    в ответе вся корзина
+    """
+    _, cart_key, _, headers, products, sizes = cart_with_items
+    before = await test_redis.hgetall(cart_key)
+    first = f"{products[0].id}:{sizes[0].id}"
+
+    response = await client.post(
+        "/carts/items:batch",
+        json={
+            "items": [
+                {
+                    "product_id": products[0].id,
+                    "size_id": sizes[0].id,
+                    "quantity": 2,
+                },
+                {
+                    "product_id": products[-1].id,
+                    "size_id": sizes[-1].id,
+                    "quantity": 1,
+                },
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 201
+    cart = await test_redis.hgetall(cart_key)
+    assert int(cart[first]) == int(before[first]) + 2
+    data = response.json()
+    assert len(data["cart_items"]) == len(cart)
+    assert Decimal(data["total_amount"]) == sum(
+        Decimal(item["total_price"]) for item in data["cart_items"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch_not_found(
+    client,
+    test_redis,
+    cart_with_items,
+):
+    """Тест пакетного добавления с несуществующим продуктом"""
+    _, cart_key, _, headers, products, sizes = cart_with_items
+    before = await test_redis.hgetall(cart_key)
+
+    response = await client.post(
+        "/carts/items:batch",
+        json={
+            "items": [
+                {
+                    "product_id": products[0].id,
+                    "size_id": sizes[0].id,
+                    "quantity": 1,
+                },
+                {"product_id": 999, "size_id": sizes[0].id, "quantity": 1},
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 404
+    assert await test_redis.hgetall(cart_key) == before
+
+
+@pytest.mark.asyncio
+async def test_replace_cart(
+    client,
+    test_redis,
+    cart_with_items,
+):
+    """Тест замены содержимого корзины"""
+    _, cart_key, _, headers, products, sizes = cart_with_items
+
+    response = await client.put(
+        "/carts/",
+        json={
+            "items": [
+                {
+                    "product_id": products[-1].id,
+                    "size_id": sizes[-1].id,
+                    "quantity": 3,
+                }
+            ]
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert await test_redis.hgetall(cart_key) == {
+        f"{products[-1].id}:{sizes[-1].id}": "3"
+    }
+    data = response.json()
+    assert len(data["cart_items"]) == 1
+    assert data["cart_items"][0]["product"]["id"] == products[-1].id
+    assert data["cart_items"][0]["quantity"] == 3
@@ -0,0 +1,28 @@
+import asyncio
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_coalesce_category_requests(client, test_cache_manager, mocker):
+    """
+    Тест объединения одинаковых одновременных GET запросов:
+    обработчик выполняется один раз, ответ получают все
+    """
+    calls = 0
+
+    async def get_all(session):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return []
+
+    mocker.patch("db.operations.CategoryDO.get_all", side_effect=get_all)
+
+    responses = await asyncio.gather(
+        *(client.get("/category/") for _ in range(10))
+    )
+    assert [response.status_code for response in responses] == [200] * 10
+    assert all(response.json() == [] for response in responses)
+    request_ids = {response.headers["X-Request-ID"] for response in responses}
+    assert len(request_ids) == 10
+    assert calls == 1
@@ -0,0 +1,60 @@
+import asyncio
+import signal
+import pytest
+from uvicorn.config import Config
+from routers import health
+from utils import lifespan
+from utils.workers import DrainingServer
+from config import settings
+
+
+@pytest.fixture(autouse=True)
+def reset_health_checks(monkeypatch):
+    """Кэш проверок /health/ready не переходит между тестами"""
+    monkeypatch.setattr(health, "_checks", {"at": 0.0, "result": None})
+
+
+@pytest.mark.asyncio
+async def test_health_live(client):
+    response = await client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+@pytest.mark.asyncio
+async def test_health_ready(client, monkeypatch):
+    """
+    Тест готовности: до окончания прогрева и во время остановки 503,
+    после прогрева при доступных БД и Redis - 200
+    """
+    monkeypatch.setattr(lifespan, "ready", False)
+    response = await client.get("/health/ready")
+    assert response.status_code == 503
+
+    monkeypatch.setattr(lifespan, "ready", True)
+    response = await client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["checks"] == {"db": True, "redis": True}
+    assert "primary" in response.json()["pool"]
+
+    monkeypatch.setattr(lifespan, "draining", True)
+    response = await client.get("/health/ready")
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_drain_on_sigterm(monkeypatch):
+    """
+    Первый SIGTERM переводит воркер в draining, а остановка сервера
+    начинается только через SHUTDOWN_DRAIN_DELAY
+    """
+    monkeypatch.setattr(lifespan, "draining", False)
+    monkeypatch.setattr(settings, "SHUTDOWN_DRAIN_DELAY", 0.1)
+    server = DrainingServer(Config(app=None))
+
+    server.handle_exit(signal.SIGTERM, None)
+    assert lifespan.draining
+    assert not await server.on_tick(0)
+
+    await asyncio.sleep(0.15)
+    assert await server.on_tick(1)
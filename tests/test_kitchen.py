@@ -0,0 +1,121 @@
+import asyncio
+import json
+import pytest
+from db.models import ORDER_STATUS_RANK
+from db.operations import OrderDO
+from schemas.order import OrderStatus
+from services import kitchen
+from services.kitchen import kitchen_feed, kitchen_snapshot
+from tests.fixtures import (
+    order_with_items,
+    auth_headers_web,
+    cart_with_items,
+    products_with_sizes,
+)
+
+
+async def next_message(queue: asyncio.Queue) -> dict:
+    return json.loads(await asyncio.wait_for(queue.get(), 5))
+
+
+@pytest.mark.asyncio
+async def test_kitchen_feed_diff(order_with_items, test_session):
+    """
+    Смена статуса заказа приходит экрану кухни изменением,
+    завершённый заказ убирается из очереди
+    """
+    order = order_with_items[0]
+    order.status = OrderStatus.CREATED
+    await test_session.commit()
+
+    queue = await kitchen_feed.subscribe()
+    try:
+        message = await next_message(queue)
+        assert message["type"] == "snapshot"
+        assert order.id in [item["id"] for item in message["orders"]]
+
+        order.status = OrderStatus.COOKING
+        await test_session.commit()
+
+        message = await next_message(queue)
+        assert message["type"] == "diff"
+        assert [item["id"] for item in message["upsert"]] == [order.id]
+        assert message["upsert"][0]["status"] == "cooking"
+        assert message["remove"] == []
+
+        order.status = OrderStatus.COMPLETED
+        await test_session.commit()
+
+        message = await next_message(queue)
+        assert message["upsert"] == []
+        assert message["remove"] == [order.id]
+    finally:
+        kitchen_feed.unsubscribe(queue)
+
+    snapshot = json.loads(await kitchen_snapshot())
+    assert snapshot["type"] == "snapshot"
+    assert order.id not in [item["id"] for item in snapshot["orders"]]
+
+
+@pytest.mark.asyncio
+async def test_kitchen_queue_status_rank(order_with_items, test_session):
+    """
+    Место в очереди пересчитывается при смене статуса, очередь
+    кухни идёт по месту статуса и от новых заказов к старым
+    """
+    order = order_with_items[0]
+    order.status = OrderStatus.READY
+    await test_session.commit()
+    await test_session.refresh(order)
+    assert order.status_rank == ORDER_STATUS_RANK[OrderStatus.READY]
+
+    orders = await OrderDO.get_active_with_items(session=test_session)
+    assert order.id in [item.id for item in orders]
+    keys = [(item.status_rank, -item.created_at.timestamp()) for item in orders]
+    assert keys == sorted(keys)
+
+
+@pytest.mark.asyncio
+async def test_kitchen_feed_drops_diffs_before_snapshot(
+    order_with_items, test_session, mocker
+):
+    """
+    Изменения, попавшие в очередь экрана до чтения снимка, не
+    приходят после него: снимок уже содержит состояние новее
+    """
+    order = order_with_items[0]
+    order.status = OrderStatus.READY
+    await test_session.commit()
+
+    stale = json.dumps(
+        {
+            "type": "diff",
+            "upsert": [{"id": order.id, "status": "cooking"}],
+            "remove": [],
+        }
+    )
+    read_snapshot = kitchen.kitchen_snapshot
+
+    async def snapshot_after_diff():
+        kitchen_feed._broadcast(stale)
+        return await read_snapshot()
+
+    mocker.patch.object(
+        kitchen, "kitchen_snapshot", side_effect=snapshot_after_diff
+    )
+    queue = await kitchen_feed.subscribe()
+    try:
+        message = await next_message(queue)
+        assert message["type"] == "snapshot"
+        [item] = [i for i in message["orders"] if i["id"] == order.id]
+        assert item["status"] == "ready"
+        assert queue.empty()
+
+        order.status = OrderStatus.COMPLETED
+        await test_session.commit()
+
+        message = await next_message(queue)
+        assert message["type"] == "diff"
+        assert message["remove"] == [order.id]
+    finally:
+        kitchen_feed.unsubscribe(queue)
@@ -0,0 +1,24 @@
+import pytest
+from tests.fixtures import products_with_sizes
+
+
+@pytest.mark.asyncio
+async def test_get_metrics(client, test_cache_manager):
+    """
+    Тест эндпоинта метрик: время ответа пишется по шаблону роута,
+    повторный запрос каталога - попадание в кэш из памяти процесса
+    """
+    await client.get("/products/")
+    await client.get("/products/")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    metrics = response.text
+    assert "http_request_duration_seconds_bucket" in metrics
+    assert 'route="/products/"' in metrics
+    assert 'cache_requests_total{namespace="/products/",result="hit"}' in (
+        metrics
+    )
+    assert 'catalog_payloads_total{source="memory"}' in metrics
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from datetime import datetime
 from tests.fixtures import (
@@ -8,6 +9,17 @@ from tests.fixtures import (
 )
 from decimal import Decimal
 from services.redis_cart import CartDO
+from db.operations import OrderDO, ProductDO
+from db.connect import get_session, get_read_session
+from conftest import TestingSessionLocal
+from main import app
+from config import settings
+from services.order_intake import (
+    INTAKE_STREAM,
+    ensure_intake_group,
+    read_order_intents,
+    write_order_intents,
+)
 
 
 def normalize_order(order):
@@ -261,6 +273,221 @@ async def test_confirmation_order(
     assert not cart_items
 
 
+@pytest.mark.asyncio
+async def test_confirmation_order_current_prices(
+    client,
+    cart_with_items,
+    test_session,
+):
+    """
+    Тест цен заказа: позиции и сумма считаются по ценам в БД
+    на момент оформления, а не на момент добавления в корзину
+    """
+    user_id, _, items, headers, _, _ = cart_with_items
+    product_id, size_id, quantity = items[0]
+    product_size = await ProductDO.get_for_id_by_size_id(
+        product_id=product_id,
+        size_id=size_id,
+        session=test_session,
+    )
+    product_size.price = Decimal("123.45")
+    product_size.discount = 10
+    await test_session.commit()
+
+    response = await client.post(
+        "/orders/confirmation/",
+        headers=headers,
+        json={"delivery_type": "pickup"},
+    )
+    assert response.status_code == 201
+
+    order = (await OrderDO.get_all(user_id=user_id, session=test_session))[0]
+    order_item = next(
+        item
+        for item in order.order_items
+        if (item.product_id, item.size_id) == (product_id, size_id)
+    )
+    assert order_item.total_price == Decimal("111.11") * quantity
+    assert order.total_amount == sum(
+        item.total_price for item in order.order_items
+    )
+
+
+@pytest.mark.asyncio
+async def test_confirmation_order_empty_cart(
+    client,
+    auth_headers_web,
+):
+    """Тест оформления заказа с пустой корзиной"""
+    headers, _ = auth_headers_web
+
+    response = await client.post(
+        "/orders/confirmation/",
+        headers=headers,
+        json={"delivery_type": "pickup"},
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "No products in cart"}
+
+
+@pytest.mark.asyncio
+async def test_confirmation_order_concurrent_cart_adds(
+    client,
+    cart_with_items,
+    test_session,
+    test_redis,
+):
+    """
+    Стресс-тест оформления: параллельные добавления в корзину и
+    подтверждения заказа. Каждое добавление попадает либо в заказ,
+    либо остаётся в корзине, одна корзина не оформляется дважды
+    """
+    user_id, cart_key, items, headers, products, sizes = cart_with_items
+    initial = sum(quantity for _, _, quantity in items)
+    adds_count = 30
+
+    async def request_session():
+        # у каждого запроса своя сессия, как в приложении
+        async with TestingSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = request_session
+    app.dependency_overrides[get_read_session] = request_session
+    requests = []
+    for i in range(adds_count):
+        requests.append(
+            client.post(
+                f"/carts/add/{products[i % 2].id}/{sizes[0].id}/",
+                headers=headers,
+            )
+        )
+        if i % 5 == 0:
+            requests.append(
+                client.post(
+                    "/orders/confirmation/",
+                    headers=headers,
+                    json={"delivery_type": "pickup"},
+                )
+            )
+    try:
+        responses = await asyncio.gather(*requests)
+    finally:
+        app.dependency_overrides[get_session] = lambda: test_session
+        app.dependency_overrides[get_read_session] = lambda: test_session
+
+    confirmations = [
+        response
+        for response in responses
+        if response.request.url.path == "/orders/confirmation/"
+    ]
+    assert all(
+        response.status_code == 201
+        for response in responses
+        if response not in confirmations
+    )
+    assert {response.status_code for response in confirmations} <= {
+        201,
+        400,
+        409,
+    }
+    created = [
+        response
+        for response in confirmations
+        if response.status_code == 201
+    ]
+    assert created
+
+    orders = await OrderDO.get_all(user_id=user_id, session=test_session)
+    assert len(orders) == len(created)
+    ordered = sum(
+        item.quantity for order in orders for item in order.order_items
+    )
+    left = sum(map(int, (await test_redis.hgetall(cart_key)).values()))
+    assert ordered + left == initial + adds_count
+
+
+@pytest.mark.asyncio
+async def test_confirmation_order_intake(
+    client,
+    cart_with_items,
+    test_session,
+    test_redis,
+    mocker,
+):
+    """
+    Тест приёма заказа через очередь: ответ 202 с номером, корзина
+    списана, консьюмер записывает заказ с этим номером один раз
+    """
+    mocker.patch.object(settings, "ORDER_INTAKE_ENABLED", True)
+    user_id, cart_key, items, headers, _, _ = cart_with_items
+    # поток вместе с группой - без сообщений других запусков
+    await test_redis.delete(INTAKE_STREAM)
+
+    response = await client.post(
+        "/orders/confirmation/",
+        headers=headers,
+        json={"delivery_type": "pickup"},
+    )
+    assert response.status_code == 202
+    reference = response.json()["reference"]
+    assert await test_redis.exists(cart_key) == 0
+    assert await OrderDO.get_all(user_id=user_id, session=test_session) == []
+
+    await ensure_intake_group(test_redis)
+    messages = await read_order_intents(test_redis, "test-consumer")
+    assert len(messages) == 1
+    assert await write_order_intents(messages, test_redis, test_session) == 1
+    # повторная доставка того же сообщения не создаёт второй заказ
+    assert await write_order_intents(messages, test_redis, test_session) == 0
+
+    orders = await OrderDO.get_all(user_id=user_id, session=test_session)
+    assert len(orders) == 1
+    assert orders[0].reference == reference
+    assert {
+        (item.product_id, item.size_id, item.quantity)
+        for item in orders[0].order_items
+    } == set(items)
+
+
+@pytest.mark.asyncio
+async def test_confirmation_order_intake_restores_cart(
+    client,
+    cart_with_items,
+    test_session,
+    test_redis,
+    mocker,
+):
+    """
+    Продукты заказа пропали из БД до записи консьюмером: заказ не
+    создаётся, а списанные позиции возвращаются в корзину
+    """
+    mocker.patch.object(settings, "ORDER_INTAKE_ENABLED", True)
+    user_id, cart_key, items, headers, _, _ = cart_with_items
+    await test_redis.delete(INTAKE_STREAM)
+
+    response = await client.post(
+        "/orders/confirmation/",
+        headers=headers,
+        json={"delivery_type": "pickup"},
+    )
+    assert response.status_code == 202
+    assert await test_redis.exists(cart_key) == 0
+
+    await ensure_intake_group(test_redis)
+    messages = await read_order_intents(test_redis, "test-consumer")
+    mocker.patch.object(
+        ProductDO, "get_cart_prices_for_share", return_value=[]
+    )
+    assert await write_order_intents(messages, test_redis, test_session) == 0
+
+    assert await OrderDO.get_all(user_id=user_id, session=test_session) == []
+    cart = await CartDO.get_cart_quantities(user_id=user_id, redis=test_redis)
+    assert cart == {
+        (product_id, size_id): quantity
+        for product_id, size_id, quantity in items
+    }
+
+
 @pytest.mark.asyncio
 async def test_repeat_order_to_cart(
     client,
@@ -287,7 +514,8 @@ async def test_repeat_order_to_cart(
 
     assert response.status_code == 200
     assert response.json() == {
-        "message": "Products from the order have been added to the cart"
+        "message": "Products from the order have been added to the cart",
+        "skipped_items": [],
     }
 
     cart_after = await CartDO.get_cart(
@@ -298,3 +526,40 @@ async def test_repeat_order_to_cart(
     assert cart_after is not None
     assert cart_after.cart_items
     assert len(cart_after.cart_items) == len(order.order_items)
+
+
+@pytest.mark.asyncio
+async def test_repeat_order_skipped_items(
+    client,
+    order_with_items,
+    auth_headers_web,
+    test_redis,
+    mocker,
+):
+    """
+    Тест повторения заказа, продуктов которого больше нет в продаже:
+    они перечислены в ответе, а корзина остаётся пустой
+    """
+    headers, user = auth_headers_web
+    order = order_with_items[0]
+    await test_redis.hset(f"cart:{user.id}", "1:1", 1)
+    mocker.patch(
+        "db.operations.ProductDO.get_for_ids_by_size_ids",
+        return_value={},
+    )
+
+    response = await client.post(
+        f"/orders/repeat/{order.id}/",
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    skipped = {
+        (item["product_id"], item["size_id"], item["quantity"])
+        for item in response.json()["skipped_items"]
+    }
+    assert skipped == {
+        (item.product_id, item.size_id, item.quantity)
+        for item in order.order_items
+    }
+    assert not await test_redis.exists(f"cart:{user.id}")
@@ -0,0 +1,164 @@
+import pytest
+from sqlalchemy import delete, func, select
+from db.models import Outbox
+from db.operations import OutboxDO
+from schemas.order import OrderStatus
+from services.outbox_relay import relay_outbox_batch
+from conftest import TestingSessionLocal
+from factories import OrderFactory
+from tests.fixtures import (
+    order_with_items,
+    auth_headers_web,
+    auth_headers_tg,
+    cart_with_items,
+    products_with_sizes,
+)
+
+
+async def get_events(session, event: str) -> list[Outbox]:
+    result = await session.execute(
+        select(Outbox)
+        .where(Outbox.event == event)
+        .order_by(Outbox.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_outbox_order_created(client, cart_with_items, test_session):
+    """Событие создания заказа пишется вместе с заказом"""
+    user_id, _, _, headers, _, _ = cart_with_items
+
+    response = await client.post(
+        "/orders/confirmation/",
+        headers=headers,
+        json={"delivery_type": "pickup"},
+    )
+    assert response.status_code == 201
+
+    events = [
+        event
+        for event in await get_events(test_session, "order_created")
+        if event.payload["user_id"] == user_id
+    ]
+    assert len(events) == 1
+    assert events[0].routing_key == "order.created"
+
+
+async def reset_status(order, session):
+    """Статус CREATED без неопубликованных событий смены статуса"""
+    order.status = OrderStatus.CREATED
+    await session.commit()
+    await session.execute(
+        delete(Outbox).where(Outbox.coalesce_key == f"order_status:{order.id}")
+    )
+    await session.commit()
+
+
+async def get_status_events(session, order) -> list[Outbox]:
+    return [
+        event
+        for event in await get_events(session, "order_status_changed")
+        if event.payload["order_id"] == order.id
+    ]
+
+
+@pytest.mark.asyncio
+async def test_outbox_order_status_coalesced(order_with_items, test_session):
+    """
+    Смены статуса заказа в окне объединения дают одно событие
+    с исходным и последним статусом
+    """
+    order = order_with_items[0]
+    await reset_status(order, test_session)
+
+    for status in (OrderStatus.COOKING, OrderStatus.READY):
+        order.status = status
+        await test_session.commit()
+
+    events = await get_status_events(test_session, order)
+    assert len(events) == 1
+    assert events[0].routing_key == f"order.status.user.{order.user_id}"
+    assert events[0].payload["status_from"] == "created"
+    assert events[0].payload["status_to"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_outbox_order_status_reverted(order_with_items, test_session):
+    """Статус, вернувшийся к исходному в окне, не даёт события"""
+    order = order_with_items[0]
+    await reset_status(order, test_session)
+
+    for status in (OrderStatus.COOKING, OrderStatus.CREATED):
+        order.status = status
+        await test_session.commit()
+
+    assert await get_status_events(test_session, order) == []
+
+
+@pytest.mark.asyncio
+async def test_outbox_order_status_tg_routing(auth_headers_tg, test_session):
+    """Событие заказа пользователя бота публикуется с ключом по tg_id"""
+    _, user = auth_headers_tg
+    order = await OrderFactory.create_async(
+        session=test_session,
+        user_id=user.id,
+        user_order_id=1,
+        status=OrderStatus.CREATED,
+    )
+    await test_session.commit()
+
+    order.status = OrderStatus.COOKING
+    await test_session.commit()
+
+    events = await get_status_events(test_session, order)
+    assert len(events) == 1
+    assert events[0].exchange == "orders"
+    assert events[0].routing_key == f"order.status.{user.tg_id}"
+    assert events[0].payload["tg_id"] == user.tg_id
+
+
+@pytest.mark.asyncio
+async def test_outbox_relay_batch(test_session, mocker):
+    """
+    Релей удаляет подтверждённые события, а неопубликованные
+    переносит на следующую попытку
+    """
+    await test_session.execute(
+        delete(Outbox).where(Outbox.event == "test_event")
+    )
+    for routing_key in ("ok", "fail"):
+        OutboxDO.stage(
+            session=test_session,
+            event="test_event",
+            routing_key=routing_key,
+            payload={"routing_key": routing_key},
+        )
+    await test_session.commit()
+
+    async def publish_message(exchange, routing_key, **kwargs):
+        if routing_key == "fail":
+            raise ConnectionError("broker is down")
+
+    mocker.patch("services.outbox_relay.publish_message", publish_message)
+
+    # события других тестов заняты другим "релеем" и пропускаются
+    async with TestingSessionLocal() as other_relay:
+        await other_relay.execute(
+            select(Outbox.id)
+            .where(Outbox.event != "test_event")
+            .with_for_update()
+        )
+
+        assert await relay_outbox_batch(test_session) == 2
+
+        events = await get_events(test_session, "test_event")
+        assert [event.routing_key for event in events] == ["fail"]
+        assert events[0].attempts == 1
+        assert await test_session.scalar(
+            select(events[0].available_at > func.now())
+        )
+        # событие с отложенной попыткой в следующую пачку не попадает
+        assert await relay_outbox_batch(test_session) == 0
+        await other_relay.rollback()
@@ -1,6 +1,9 @@
 import pytest
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
+from services import catalog
+from services.catalog import bump_catalog_version
+from config import settings
 from tests.fixtures import products_with_sizes
 
 
@@ -37,6 +40,30 @@ def normalize_product(product):
     }
 
 
+async def assert_served_from_cache(client, url: str, data: list, mocker):
+    """
+    Повторные запросы отдаются из памяти процесса, а после её очистки -
+    из Redis, ни один загрузчик продуктов из БД не вызывается
+    """
+    loaders = [
+        mocker.patch(f"db.operations.ProductDO.{name}", return_value=[])
+        for name in ("get_all", "get_all_by_category_id", "get_all_json")
+    ]
+    expected = [normalize_product(product) for product in data]
+
+    response = await client.get(url)
+    assert response.headers["X-FastAPI-Cache"] == "HIT"
+    assert [normalize_product(p) for p in response.json()] == expected
+
+    catalog._payloads.clear()
+    response = await client.get(url)
+    assert response.headers["X-FastAPI-Cache"] == "HIT"
+    assert [normalize_product(p) for p in response.json()] == expected
+
+    for loader in loaders:
+        loader.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_get_all_products(
     client,
@@ -85,21 +112,7 @@ async def test_get_all_products(
                 Decimal(product_size_data["final_price"])
                 == expected_final_price
             )
-    fetch_from_db_mock = mocker.patch(
-        "db.operations.ProductDO.get_all", return_value=[]
-    )
-
-    response2 = await client.get("/products/")
-    assert response2.status_code == 200
-
-    normalized_data = [normalize_product(product) for product in data]
-    normalized_response2 = [
-        normalize_product(product) for product in response2.json()
-    ]
-
-    assert normalized_response2 == normalized_data
-
-    fetch_from_db_mock.assert_not_called()
+    await assert_served_from_cache(client, "/products/", data, mocker)
 
 
 @pytest.mark.asyncio
@@ -124,21 +137,10 @@ async def test_get_products_by_category(
     for product_data in data:
         assert product_data["category_id"] == category_id
 
-    fetch_from_db_mock = mocker.patch(
-        "db.operations.ProductDO.get_all_by_category_id",
-        return_value=[],
+    await assert_served_from_cache(
+        client, f"/products/?category_id={category_id}", data, mocker
     )
 
-    response2 = await client.get(f"/products/?category_id={category_id}")
-    assert response2.status_code == 200
-    normalized_data = [normalize_product(product) for product in data]
-    normalized_response2 = [
-        normalize_product(product) for product in response2.json()
-    ]
-    assert normalized_response2 == normalized_data
-
-    fetch_from_db_mock.assert_not_called()
-
 
 @pytest.mark.asyncio
 async def test_get_product_by_id(
@@ -189,3 +191,81 @@ async def test_get_product_by_id_not_found(client):
     assert response.status_code == 404
 
     assert response.json()["detail"] == "Product not found"
+
+
+@pytest.mark.asyncio
+async def test_products_catalog_version(
+    client,
+    products_with_sizes,
+    test_cache_manager,
+    mocker,
+):
+    """
+    Тест готовых ответов каталога: gzip вариант тела
+    и пересборка ответа после смены версии каталога
+    """
+    products, _, _ = products_with_sizes
+
+    response = await client.get(
+        "/products/", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.json()) == len(products)
+
+    response = await client.get(
+        "/products/", headers={"Accept-Encoding": "identity"}
+    )
+    assert "Content-Encoding" not in response.headers
+    assert len(response.json()) == len(products)
+
+    fetch_from_db_mock = mocker.patch(
+        "db.operations.ProductDO.get_all", return_value=[]
+    )
+    await bump_catalog_version(test_cache_manager)
+
+    response = await client.get("/products/")
+    assert response.status_code == 200
+    assert response.json() == []
+    fetch_from_db_mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_products_sql_render(
+    client,
+    products_with_sizes,
+    test_cache_manager,
+    monkeypatch,
+):
+    """
+    Тест сборки списка продуктов в Postgres:
+    ответ совпадает с ответом через ORM и схему ProductOut
+    """
+    response = await client.get("/products/")
+    assert response.status_code == 200
+    data = [normalize_product(product) for product in response.json()]
+
+    monkeypatch.setattr(settings, "CATALOG_SQL_RENDER", True)
+    await bump_catalog_version(test_cache_manager)
+
+    response = await client.get("/products/")
+    assert response.status_code == 200
+    sql_data = [normalize_product(product) for product in response.json()]
+    assert sql_data == data
+
+
+@pytest.mark.asyncio
+async def test_products_catalog_empty_not_cached(
+    client,
+    test_cache_manager,
+):
+    """
+    Пустой ответ для несуществующей категории не попадает в кэш,
+    перебор id не заполняет Redis и память процесса
+    """
+    response = await client.get("/products/?category_id=999999")
+    assert response.status_code == 200
+    assert response.json() == []
+
+    assert await test_cache_manager.keys("catalog:*:products:999999") == []
+    assert "products:999999" not in catalog._payloads
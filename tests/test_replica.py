@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import func, select, text
+from db.connect import AsyncSessionLocal, check_replica_lag
+from config import settings
+
+
+# Для запуска нужны два экземпляра Postgres на разных портах:
+# DB_PORT - основная БД, DB_REPLICA_PORT - реплика
+pytestmark = pytest.mark.skipif(
+    not settings.DB_REPLICA_HOST,
+    reason="DB_REPLICA_HOST is not configured",
+)
+
+REPLICA_PORT = settings.DB_REPLICA_PORT or settings.DB_PORT
+SERVER_PORT = select(func.inet_server_port())
+
+
+@pytest.mark.asyncio
+async def test_read_session_routing():
+    """
+    Тест роутинга сессии чтения: SELECT идёт на реплику,
+    а после записи в сессии - в основную БД
+    """
+    assert await check_replica_lag() is not None
+
+    async with AsyncSessionLocal() as session:
+        session.info["read_replica"] = True
+        assert await session.scalar(SERVER_PORT) == REPLICA_PORT
+
+        await session.execute(text("SELECT 1"))
+        assert await session.scalar(SERVER_PORT) == settings.DB_PORT
+
+    async with AsyncSessionLocal() as session:
+        assert await session.scalar(SERVER_PORT) == settings.DB_PORT
+
+
+@pytest.mark.asyncio
+async def test_replica_lag_fallback(monkeypatch):
+    """Тест отключения реплики при отставании больше допустимого"""
+    monkeypatch.setattr(settings, "DB_REPLICA_MAX_LAG", -1)
+    await check_replica_lag()
+
+    async with AsyncSessionLocal() as session:
+        session.info["read_replica"] = True
+        assert await session.scalar(SERVER_PORT) == settings.DB_PORT
+
+    monkeypatch.undo()
+    await check_replica_lag()
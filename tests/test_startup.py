@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+
+# Бюджет на `import main`, с запасом для медленных CI машин
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+
+# Модули, которые должны загружаться только при первом использовании
+LAZY_MODULES = ("boto3", "fastapi_mail", "aio_pika", "opentelemetry.sdk")
+
+MEASURE_IMPORT = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_import() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_IMPORT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_budget():
+    """
+    Тест времени старта: импорт приложения укладывается в бюджет
+    (берём лучший из трёх запусков, чтобы не зависеть от шума)
+    """
+    runs = [measure_import() for _ in range(3)]
+
+    assert runs[0]["loaded"] == []
+    best = min(run["elapsed"] for run in runs)
+    assert best < IMPORT_BUDGET_SECONDS, (
+        f"import main took {best:.2f}s, budget {IMPORT_BUDGET_SECONDS}s, "
+        "see python benchmarks/import_time.py"
+    )
@@ -0,0 +1,55 @@
+import json
+import pytest
+from sqlalchemy import event
+from tests.fixtures import products_with_sizes
+from db.connect import engine
+from utils.tracing import _start_db_span, setup_tracing, shutdown_tracing
+from config import settings
+
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    """
+    Трейсинг с записью всех спанов в файл на время теста,
+    после теста спаны снова no-op
+    """
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "OTLP_ENDPOINT", None)
+    monkeypatch.setattr(settings, "TRACE_FILE", str(trace_file))
+    setup_tracing()
+    yield trace_file
+    shutdown_tracing()
+
+
+@pytest.mark.asyncio
+async def test_request_span(client, test_cache_manager, trace_file):
+    """
+    Тест трейсинга: спан запроса продолжает трейс из traceparent
+    и выгружается в файл в формате OTLP/JSON, движок БД
+    инструментирован при включении трейсинга
+    """
+    assert event.contains(
+        engine.sync_engine, "before_cursor_execute", _start_db_span
+    )
+    response = await client.get(
+        "/products/",
+        headers={"traceparent": f"00-{TRACE_ID}-b7ad6b7169203331-01"},
+    )
+    assert response.status_code == 200
+    shutdown_tracing()
+
+    spans = [
+        span
+        for line in trace_file.read_text().splitlines()
+        for resource_spans in json.loads(line)["resourceSpans"]
+        for scope_spans in resource_spans["scopeSpans"]
+        for span in scope_spans["spans"]
+    ]
+    request_span = next(s for s in spans if s["name"] == "GET /products/")
+    assert request_span["traceId"] == TRACE_ID
+    assert request_span["parentSpanId"] == "b7ad6b7169203331"
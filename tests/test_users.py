@@ -1,10 +1,16 @@
 import pytest
+from sqlalchemy import select
 from config import settings
+from db.models import Outbox
 from db.operations import UserDO
+from types import SimpleNamespace
 from services.auth import (
+    create_access_token,
     create_email_confirmation_token,
     create_refresh_token,
+    get_lazy_user,
 )
+from utils.logger import log_context
 from fixtures import (
     web_user,
     tg_user,
@@ -174,6 +180,14 @@ async def test_confirm_email_tg(
     assert user is not None
     assert user.tg_id == tg_user.tg_id
 
+    # событие для бота записано в outbox вместе с пользователем
+    events = (
+        await test_session.execute(
+            select(Outbox).where(Outbox.event == "user_confirmed")
+        )
+    ).scalars().all()
+    assert any(event.payload["tg_id"] == tg_user.tg_id for event in events)
+
 
 @pytest.mark.asyncio
 async def test_login_user(client, web_user):
@@ -240,6 +254,33 @@ async def test_get_profile_tg(client, auth_headers_tg):
     assert profile_data["tg_id"] == user.tg_id
 
 
+@pytest.mark.asyncio
+async def test_get_profile_cache_per_user(
+    client,
+    test_cache_manager,
+    auth_headers_web,
+    auth_headers_tg,
+    mocker,
+):
+    """
+    Тест кэша профиля: ключ кэша включает пользователя,
+    а попадание в кэш не делает запросов к БД
+    """
+    web_headers, web_user = auth_headers_web
+    tg_headers, tg_user = auth_headers_tg
+
+    response_web = await client.get("/users/profile/", headers=web_headers)
+    response_tg = await client.get("/users/profile/", headers=tg_headers)
+    assert response_web.json()["email"] == web_user.email
+    assert response_tg.json()["email"] == tg_user.email
+
+    fetch_from_db_mock = mocker.patch("db.operations.UserDO.get_by_email")
+    response_web2 = await client.get("/users/profile/", headers=web_headers)
+    assert response_web2.status_code == 200
+    assert response_web2.json() == response_web.json()
+    fetch_from_db_mock.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_refresh_access_token(client, web_user):
     refresh_token = create_refresh_token(
@@ -261,3 +302,26 @@ async def test_refresh_access_token_invalid(client):
     )
 
     assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_lazy_user_log_context(test_session):
+    """
+    Ленивый пользователь (промах и попадание в кэш) добавляет email
+    в контекст логов ещё до запроса в БД
+    """
+    token = create_access_token(
+        {"email": "lazy@example.com"}, settings.SECRET_KEY
+    )
+    request = SimpleNamespace(state=SimpleNamespace())
+    context = {}
+    reset_token = log_context.set(context)
+    try:
+        user = await get_lazy_user(
+            request=request, token=token, session=test_session
+        )
+    finally:
+        log_context.reset(reset_token)
+
+    assert user.email == "lazy@example.com"
+    assert context == {"user_email": "lazy@example.com"}
@@ -0,0 +1,132 @@
+import asyncio
+from utils.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_SHED
+from config import settings
+
+
+class Overloaded(Exception):
+    """Запрос не получил слот за отведённое время - сбрасываем нагрузку"""
+
+
+def match_prefix(path: str, prefixes) -> str | None:
+    """Самый длинный префикс пути из списка"""
+    matched = [prefix for prefix in prefixes if path.startswith(prefix)]
+    return max(matched, key=len) if matched else None
+
+
+class AdmissionController:
+    """
+    Ограничение числа одновременных запросов процесса:
+    общий лимит max_in_flight, из которого routes_reserved выделен
+    только под указанные роуты, и отдельные лимиты route_limits.
+    Роуты с резервом - отдельная полоса, лимиты route_limits
+    их не касаются.
+    Ожидание слота дольше queue_timeout или очередь больше max_queue
+    приводят к Overloaded
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        reserved: dict[str, int],
+        route_limits: dict[str, int],
+        queue_timeout: float,
+        max_queue: int,
+    ):
+        self.shared = asyncio.Semaphore(
+            max(max_in_flight - sum(reserved.values()), 1)
+        )
+        self.reserved = {
+            prefix: asyncio.Semaphore(limit)
+            for prefix, limit in reserved.items()
+        }
+        self.routes = {
+            prefix: asyncio.Semaphore(limit)
+            for prefix, limit in route_limits.items()
+        }
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.queued = 0
+
+    async def acquire(self, path: str) -> list[asyncio.Semaphore]:
+        """
+        Получение слотов для запроса: зарезервированный слот (если
+        свободен) или общий, для роутов без резерва перед общим
+        слотом - лимит роута. Возвращает захваченные семафоры
+        для release
+        """
+        reserved = match_prefix(path, self.reserved)
+        # /orders/confirmation/ не должен ждать лимита /orders/
+        route = None if reserved else match_prefix(path, self.routes)
+        lane = reserved or route or "default"
+        if self.queued >= self.max_queue:
+            ADMISSION_SHED.labels(lane=lane, reason="queue_full").inc()
+            raise Overloaded
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        acquired = []
+        self.queued += 1
+        ADMISSION_QUEUE_DEPTH.labels(lane=lane).inc()
+        try:
+            if route is not None:
+                await self._acquire(self.routes[route], deadline)
+                acquired.append(self.routes[route])
+            if reserved is not None and not self.reserved[reserved].locked():
+                await self.reserved[reserved].acquire()
+                acquired.append(self.reserved[reserved])
+            else:
+                await self._acquire(self.shared, deadline)
+                acquired.append(self.shared)
+        except asyncio.TimeoutError:
+            self.release(acquired)
+            ADMISSION_SHED.labels(lane=lane, reason="timeout").inc()
+            raise Overloaded
+        finally:
+            self.queued -= 1
+            ADMISSION_QUEUE_DEPTH.labels(lane=lane).dec()
+        return acquired
+
+    @staticmethod
+    async def _acquire(semaphore: asyncio.Semaphore, deadline: float):
+        """
+        Захват слота до deadline. Не через wait_for: таймаут может
+        совпасть с получением слота, и тогда слот теряется. Здесь
+        ожидание отменяется, а слот, который acquire всё же успел
+        получить, возвращается
+        """
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return
+        timeout = deadline - asyncio.get_running_loop().time()
+        waiter = asyncio.ensure_future(semaphore.acquire())
+        try:
+            await asyncio.wait({waiter}, timeout=max(timeout, 0))
+            if not waiter.done():
+                raise asyncio.TimeoutError
+        except BaseException:
+            # таймаут или отмена запроса
+            waiter.cancel()
+            waiter.add_done_callback(
+                lambda waiter: waiter.cancelled() or semaphore.release()
+            )
+            raise
+
+    @staticmethod
+    def release(acquired: list[asyncio.Semaphore]):
+        for semaphore in acquired:
+            semaphore.release()
+
+
+def is_exempt(method: str, path: str) -> bool:
+    """Дешёвые кэшируемые GET запросы идут без очереди"""
+    return method == "GET" and path.startswith(
+        tuple(settings.ADMISSION_EXEMPT_PATHS)
+    )
+
+
+admission = AdmissionController(
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    reserved=settings.ADMISSION_RESERVED,
+    route_limits=settings.ADMISSION_ROUTE_LIMITS,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+)
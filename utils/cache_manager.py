@@ -1,15 +1,4 @@
-from fastapi import FastAPI, Request, Response
-from contextlib import asynccontextmanager
-from utils.redis_connect import get_redis_no_decode
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-
-
-@asynccontextmanager
-async def lifespan(_: FastAPI):
-    redis_client = await get_redis_no_decode()
-    FastAPICache.init(RedisBackend(redis_client), prefix="fastapi-cache")
-    yield
+from fastapi import Request, Response
 
 
 def request_key_builder(
@@ -20,11 +9,17 @@ def request_key_builder(
     *args,
     **kwargs,
 ):
+    """
+    Ключ кэша по методу, пути и параметрам запроса,
+    для роутов с get_lazy_user - ещё и по пользователю,
+    чтобы ответы разных пользователей не смешивались
+    """
     return ":".join(
         [
             namespace,
             request.method.lower(),
             request.url.path,
             repr(sorted(request.query_params.items())),
+            getattr(request.state, "user_email", ""),
         ]
     )
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from fastapi import HTTPException, Request
+from starlette.types import ASGIApp, Message, Scope
+from services.auth import decode_access_token
+from utils.admission import match_prefix
+from utils.cache_manager import request_key_builder
+from utils.metrics import COALESCED_REQUESTS
+from config import settings
+
+
+logger = logging.getLogger("coalescer")
+
+
+def coalesce_key(scope: Scope) -> str | None:
+    """
+    Ключ объединения запросов - тот же, что строит request_key_builder.
+    Для роутов пользователя в ключ входит email из токена,
+    без валидного токена запрос не объединяется
+    """
+    if scope["method"] != "GET":
+        return None
+    prefix = match_prefix(scope["path"], settings.COALESCE_PATHS)
+    if prefix is None:
+        return None
+    request = Request({**scope, "state": {}})
+    if request.headers.get("Cache-Control") in ("no-cache", "no-store"):
+        return None
+    if settings.COALESCE_PATHS[prefix]:
+        scheme, _, token = request.headers.get("Authorization", "").partition(
+            " "
+        )
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            request.state.user_email = decode_access_token(token)
+        except HTTPException:
+            return None
+    key = request_key_builder(None, prefix, request=request)
+    # ответ может быть сжат - не отдаём gzip клиенту, который его не ждёт
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        key += ":gzip"
+    return key
+
+
+async def _no_disconnect() -> Message:
+    """
+    receive для общего выполнения: тело GET пустое, а отключение
+    клиента-инициатора не должно прерывать ответ для остальных
+    """
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+class RequestCoalescer:
+    """
+    Объединение одинаковых одновременных GET запросов процесса:
+    обработчик выполняется один раз, ответ (статус, заголовки и байты
+    тела) раздаётся всем ожидающим
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    async def _run(self, app: ASGIApp, scope: Scope, key: str) -> tuple:
+        start = {}
+        body = []
+
+        async def capture(message: Message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+
+        try:
+            await app(scope, _no_disconnect, capture)
+        finally:
+            self._in_flight.pop(key, None)
+        # роут нужен ожидающим для логов и метрик по шаблону роута
+        return (
+            start["status"],
+            start["headers"],
+            b"".join(body),
+            scope.get("route"),
+        )
+
+    async def get_response(self, app: ASGIApp, scope: Scope, key: str):
+        """
+        Ответ общего выполнения: первый запрос запускает его в отдельной
+        задаче (отмена инициатора её не прерывает), остальные ждут
+        """
+        task = self._in_flight.get(key)
+        is_leader = task is None
+        if is_leader:
+            task = asyncio.create_task(self._run(app, scope, key))
+            # ошибка забирается, даже если ждать ответ уже некому
+            task.add_done_callback(
+                lambda done: done.cancelled() or done.exception()
+            )
+            self._in_flight[key] = task
+        else:
+            COALESCED_REQUESTS.inc()
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            if is_leader:
+                raise
+            # ошибку инициатора не размножаем - выполняем запрос сами
+            logger.warning("Coalesced request %s failed: %s", key, e)
+            return None
+
+
+coalescer = RequestCoalescer()
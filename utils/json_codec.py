@@ -0,0 +1,50 @@
+from decimal import Decimal
+from typing import Any
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi_cache.coder import Coder
+
+
+def _default(obj: Any) -> Any:
+    """
+    Типы, которые orjson не кодирует сам: Decimal - строкой
+    (как в схемах ответов), остальное - через jsonable_encoder
+    """
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Кодирование в JSON (UTF-8 байты)"""
+    return orjson.dumps(obj, default=_default)
+
+
+def loads(data: bytes | str) -> Any:
+    """Декодирование JSON из байтов или строки"""
+    return orjson.loads(data)
+
+
+class OrjsonResponse(JSONResponse):
+    """Ответ JSON по умолчанию для приложения"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class OrjsonCoder(Coder):
+    """
+    Кодировщик значений fastapi-cache. Decimal и datetime
+    сохраняются строками и приводятся к типам схемой ответа роута
+    """
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, JSONResponse):
+            return value.body
+        return dumps(value)
+
+    @classmethod
+    def decode(cls, value: bytes) -> Any:
+        return loads(value)
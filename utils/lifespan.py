@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from db.connect import (
+    engine,
+    replica_engine,
+    monitor_replica_lag,
+    report_pool_size,
+)
+from utils.redis_connect import (
+    get_redis,
+    get_redis_no_decode,
+    redis_pool,
+    redis_pool_no_decode,
+)
+from utils.s3_utils import get_s3_client
+from utils.json_codec import OrjsonCoder
+from utils.logger import stop_logging
+from utils.tracing import shutdown_tracing
+from utils.rmq_producer import close_rmq_connection
+from services.order_intake import start_intake_consumers
+from services.outbox_relay import start_outbox_relays
+from config import settings
+
+
+logger = logging.getLogger("lifespan")
+
+# Состояние процесса для /health/ready: прогрев завершён и остановка
+# ещё не началась (draining выставляет воркер по SIGTERM)
+ready = False
+draining = False
+
+
+async def warm_up_db(db_engine):
+    """Открытие DB_WARMUP_CONNECTIONS соединений пула заранее"""
+    count = min(settings.DB_WARMUP_CONNECTIONS, settings.db_pool_size)
+    async with AsyncExitStack() as stack:
+        for _ in range(count):
+            connection = await stack.enter_async_context(db_engine.connect())
+            await connection.execute(text("SELECT 1"))
+
+
+async def warm_up_redis():
+    """Открытие REDIS_WARMUP_CONNECTIONS соединений каждого пула Redis"""
+    for redis in (await get_redis(), await get_redis_no_decode()):
+        await asyncio.gather(
+            *(redis.ping() for _ in range(settings.REDIS_WARMUP_CONNECTIONS))
+        )
+
+
+async def warm_up_s3():
+    """Создание клиента S3 и соединения с хранилищем"""
+    s3_client = await run_in_threadpool(get_s3_client)
+    await run_in_threadpool(s3_client.head_bucket, Bucket=settings.S3_BACKET)
+
+
+async def warm_up_catalog(app: FastAPI):
+    """
+    Запросы к роутам каталога через само приложение,
+    чтобы ответы попали в кэш до первых запросов пользователей
+    """
+    async with AsyncClient(
+        transport=ASGITransport(app),
+        base_url="http://warmup",
+        headers={"X-Request-ID": "warmup"},
+    ) as client:
+        for path in settings.WARMUP_PATHS:
+            response = await client.get(path)
+            if response.status_code != 200:
+                logger.warning(
+                    "Catalog warm-up %s returned %s",
+                    path,
+                    response.status_code,
+                )
+
+
+async def warm_up(app: FastAPI):
+    """
+    Прогрев соединений и кэша каталога, ошибки прогрева не мешают
+    старту - готовность потом проверяет /health/ready
+    """
+    steps = [
+        ("db", warm_up_db(engine)),
+        ("redis", warm_up_redis()),
+        ("s3", warm_up_s3()),
+    ]
+    if replica_engine is not None:
+        steps.append(("replica", warm_up_db(replica_engine)))
+    results = await asyncio.gather(
+        *(step for _, step in steps),
+        return_exceptions=True,
+    )
+    for (name, _), result in zip(steps, results):
+        if isinstance(result, Exception):
+            logger.warning("Warm-up of %s failed: %s", name, result)
+    try:
+        await warm_up_catalog(app)
+    except Exception as e:
+        logger.warning("Catalog warm-up failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ready
+    report_pool_size()
+    FastAPICache.init(
+        RedisBackend(await get_redis_no_decode()),
+        prefix="fastapi-cache",
+        coder=OrjsonCoder,
+    )
+    replica_monitor = None
+    if replica_engine is not None:
+        replica_monitor = asyncio.create_task(monitor_replica_lag())
+    await warm_up(app)
+    intake_consumers = []
+    if settings.ORDER_INTAKE_ENABLED:
+        intake_consumers = await start_intake_consumers(
+            settings.ORDER_INTAKE_CONSUMERS
+        )
+    outbox_relays = start_outbox_relays(settings.OUTBOX_RELAYS)
+    ready = True
+    logger.info("Application is ready")
+    yield
+    # сервер уже не принимает соединения и дождался текущих запросов
+    # (снятие с балансировщика - utils/workers.py), закрываем ресурсы
+    ready = False
+    if replica_monitor is not None:
+        replica_monitor.cancel()
+    # неподтверждённые сообщения заберут консьюмеры других процессов
+    for consumer in intake_consumers:
+        consumer.cancel()
+    await asyncio.gather(*intake_consumers, return_exceptions=True)
+    # неопубликованные события остаются в outbox до следующего запуска
+    for relay in outbox_relays:
+        relay.cancel()
+    await asyncio.gather(*outbox_relays, return_exceptions=True)
+    await close_rmq_connection()
+    await redis_pool.aclose()
+    await redis_pool_no_decode.aclose()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    # Выгружаем оставшиеся спаны и логи перед завершением
+    shutdown_tracing()
+    stop_logging()
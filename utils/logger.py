@@ -1,9 +1,21 @@
+import atexit
+import copy
+import json
 import logging
 import logging.config
 import os
 import glob
+import queue
+import random
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import (
+    TimedRotatingFileHandler,
+    QueueHandler,
+    QueueListener,
+)
+from opentelemetry import trace
+from config import settings
 
 LOG_DIR_GENERAL = "logs/general"
 LOG_DIR_ERRORS = "logs/errors"
@@ -50,15 +62,92 @@ def get_log_filename(prefix):
     return f"{prefix}_{datetime.now().strftime('%Y-%m-%d')}.txt"
 
 
+# Контекст текущего запроса (request_id, route, user_id и т.д.)
+log_context: ContextVar[dict | None] = ContextVar("log_context", default=None)
+
+# Поля контекста, которые попадают в JSON лог
+CONTEXT_FIELDS = (
+    "request_id",
+    "method",
+    "route",
+    "user_id",
+    "user_email",
+    "status",
+    "latency_ms",
+    "trace_id",
+    "span_id",
+)
+
+
+def bind_log_context(**fields):
+    """Добавление полей в контекст логов текущего запроса"""
+    context = log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def is_sampled_out(path: str) -> bool:
+    """
+    Решение о семплировании INFO логов запроса:
+    для нагруженных роутов пишется только LOG_SAMPLE_RATE запросов
+    """
+    if not path.startswith(tuple(settings.LOG_SAMPLED_PATHS)):
+        return False
+    return random.random() >= settings.LOG_SAMPLE_RATE
+
+
+# Фильтр, переносящий контекст запроса в запись в потоке вызова
+# (форматирование выполняется уже в потоке слушателя)
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, "032x")
+            record.span_id = format(span_context.span_id, "016x")
+        context = log_context.get()
+        if context is None:
+            return True
+        if context.get("sampled_out") and record.levelno <= logging.INFO:
+            return False
+        for field in CONTEXT_FIELDS:
+            if field in context and not hasattr(record, field):
+                setattr(record, field, context[field])
+        return True
+
+
+# Форматтер логов в одну JSON строку для Loki
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        log = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                log[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log["exc"] = record.exc_text
+        return json.dumps(log, ensure_ascii=False, default=str)
+
+
 # Конфигурирование логгера
 logging_config = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": {
-        "default": {
+        "text": {
             "format": "%(filename)s:%(lineno)d #%(levelname)-8s"
             "[%(asctime)s] - %(name)s - %(message)s"
         },
+        "json": {
+            "()": JsonFormatter,
+        },
     },
     "filters": {
         "error_filter": {
@@ -71,21 +160,145 @@ logging_config = {
             "log_dir": LOG_DIR_GENERAL,
             "filename": get_log_filename("app_log"),
             "level": "INFO",
-            "formatter": "default",
+            "formatter": settings.LOG_FORMAT,
         },
         "error_file": {
             "()": DailyRotatingFileHandler,
             "log_dir": LOG_DIR_ERRORS,
             "filename": get_log_filename("error_log"),
             "level": "ERROR",
-            "formatter": "default",
+            "formatter": settings.LOG_FORMAT,
             "filters": ["error_filter"],
         },
         "console": {
             "class": "logging.StreamHandler",
             "level": "INFO",
-            "formatter": "default",
+            "formatter": settings.LOG_FORMAT,
         },
     },
     "root": {"level": "INFO", "handlers": ["file", "error_file", "console"]},
 }
+
+
+# Обработчик для складывания записей в ограниченную очередь
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладёт записи в очередь без блокировки event loop,
+    при переполнении очереди запись отбрасывается и учитывается.
+    Ошибки перед отбрасыванием ждут место в очереди error_timeout секунд
+    """
+
+    def __init__(self, log_queue, error_timeout: float = 0.1):
+        super().__init__(log_queue)
+        self.error_timeout = error_timeout
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Подставляем аргументы в сообщение, а traceback храним отдельно,
+        # чтобы форматтер слушателя мог вывести его отдельным полем
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.ERROR:
+                self.queue.put(record, timeout=self.error_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Слушатель очереди, пишущий записи в файлы и консоль в отдельном потоке
+class FlushingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Ждём место в очереди, чтобы сигнал остановки не потерялся
+        # и все накопленные записи были записаны
+        self.queue.put(self._sentinel)
+
+
+_queue_handler = None
+_listener = None
+
+
+def setup_logging():
+    """
+    Однократная настройка логирования для процесса:
+    root пишет в ограниченную очередь, а файловые и консольный
+    обработчики работают в потоке слушателя
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+    logging.config.dictConfig(logging_config)
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+    root.addHandler(_queue_handler)
+    _listener = FlushingQueueListener(
+        log_queue,
+        *handlers,
+        respect_handler_level=True,
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=_restart_logging_in_child)
+
+
+def _restart_logging_in_child():
+    """
+    После fork (воркеры gunicorn) поток слушателя в дочернем процессе
+    не существует - запускаем новый со своей очередью, записи
+    из очереди родителя дописывает сам родитель
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler.queue = log_queue
+    _queue_handler.dropped = 0
+    _listener = FlushingQueueListener(
+        log_queue,
+        *_listener.handlers,
+        respect_handler_level=True,
+    )
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Остановка слушателя с записью оставшихся в очереди логов,
+    после остановки root пишет в обработчики напрямую
+    """
+    global _queue_handler, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    if _queue_handler.dropped:
+        logging.getLogger("logger").warning(
+            "Dropped %s log records due to full log queue",
+            _queue_handler.dropped,
+        )
+    _queue_handler = None
+    _listener = None
+
+
+def get_dropped_logs():
+    """Количество отброшенных из-за переполнения очереди записей"""
+    return _queue_handler.dropped if _queue_handler else 0
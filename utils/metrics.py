@@ -0,0 +1,158 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+# Метрики HTTP запросов (route - шаблон роута, а не путь)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+)
+
+# Метрики пула соединений SQLAlchemy
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool",
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Connections checked out from the SQLAlchemy pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured SQLAlchemy pool size plus max overflow",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Read replica replay lag seen by the lag monitor",
+    multiprocess_mode="max",
+)
+
+# Метрики Redis
+REDIS_COMMAND_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+)
+
+# Метрики ограничения нагрузки
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ["lane"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Requests rejected with 503 by admission control",
+    ["lane", "reason"],
+)
+
+# Метрики объединения одинаковых запросов
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total",
+    "GET requests served from another in-flight identical request",
+)
+
+# Метрики кэша fastapi-cache (namespace - шаблон роута)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "fastapi-cache lookups by result",
+    ["namespace", "result"],
+)
+
+# Источник готовых тел ответов каталога: memory, redis, build, empty
+CATALOG_PAYLOADS = Counter(
+    "catalog_payloads_total",
+    "Catalog response bodies by source",
+    ["source"],
+)
+
+# Метрики S3
+S3_CALL_LATENCY = Histogram(
+    "s3_call_duration_seconds",
+    "S3 API call latency",
+    ["operation"],
+)
+
+# Метрики RabbitMQ
+RMQ_PUBLISH_LATENCY = Histogram(
+    "rabbitmq_publish_duration_seconds",
+    "RabbitMQ publish latency",
+    ["routing_key"],
+)
+
+
+# Метрики очереди приёма заказов
+ORDER_INTAKE_INTENTS = Counter(
+    "order_intake_intents_total",
+    "Order intents by stage: accepted, created, duplicate, empty, invalid",
+    ["result"],
+)
+ORDER_INTAKE_BATCH_LATENCY = Histogram(
+    "order_intake_batch_duration_seconds",
+    "Time to write one batch of order intents to the database",
+)
+
+
+# Метрики релея outbox (event - тип события)
+OUTBOX_PUBLISHED = Counter(
+    "outbox_published_total",
+    "Outbox events published to RabbitMQ with a broker confirm",
+    ["event"],
+)
+OUTBOX_FAILED = Counter(
+    "outbox_publish_failed_total",
+    "Outbox publish attempts that failed and were postponed",
+    ["event"],
+)
+OUTBOX_LAG = Histogram(
+    "outbox_lag_seconds",
+    "Time from writing an outbox event to its confirmed publish",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+OUTBOX_OLDEST_AGE = Gauge(
+    "outbox_oldest_event_age_seconds",
+    "Age of the oldest ready outbox event seen by a relay",
+    multiprocess_mode="max",
+)
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels):
+    """Контекстный менеджер для замера времени выполнения блока"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric = histogram.labels(**labels) if labels else histogram
+        metric.observe(time.perf_counter() - start)
+
+
+def render_metrics() -> bytes:
+    """
+    Формирование метрик в формате Prometheus.
+    При нескольких воркерах (задан PROMETHEUS_MULTIPROC_DIR)
+    метрики собираются из файлов всех процессов
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
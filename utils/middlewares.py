@@ -1,21 +1,33 @@
 import logging
-import logging.config
+import time
+from uuid import uuid4
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.middleware.base import BaseHTTPMiddleware
-from utils.logger import logging_config
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from opentelemetry.propagate import extract
+from utils.logger import log_context, is_sampled_out
+from utils.metrics import REQUEST_LATENCY, CACHE_REQUESTS
+from utils.tracing import tracer, SpanKind, Status, StatusCode
+from utils.admission import admission, is_exempt, Overloaded
+from utils.coalescer import coalescer, coalesce_key
+from config import settings
 
 
-logging.config.dictConfig(logging_config)
 logger = logging.getLogger("fastapi")
 
+# Заголовок со статусом кэша, который выставляет fastapi-cache
+CACHE_STATUS_HEADER = b"x-fastapi-cache"
+
 
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Обработчик обычных http ошибок пишем в Warning"""
     logger.warning(
-        f"HTTP Exception {exc.status_code}: {exc.detail} | "
-        f"Path: {request.url.path}"
+        "HTTP Exception %s: %s | Path: %s",
+        exc.status_code,
+        exc.detail,
+        request.url.path,
     )
     return JSONResponse(
         status_code=exc.status_code,
@@ -29,8 +41,10 @@ async def validation_exception_handler(
 ):
     """Обработчик валидационных ошибок пишем в Error"""
     logger.error(
-        f"Validation Error: {exc.errors()} | "
-        f"Path: {request.url.path}", exc_info=True
+        "Validation Error: %s | Path: %s",
+        exc.errors(),
+        request.url.path,
+        exc_info=True,
     )
     return JSONResponse(
         status_code=400,
@@ -41,8 +55,10 @@ async def validation_exception_handler(
 async def global_exception_handler(request: Request, exc: Exception):
     """Обработчик ошибок сервера и глобальных пишем в Critical"""
     logger.critical(
-        f"Unhandled Exception: {str(exc)} | "
-        f"Path: {request.url.path}", exc_info=True
+        "Unhandled Exception: %s | Path: %s",
+        exc,
+        request.url.path,
+        exc_info=True,
     )
     return JSONResponse(
         status_code=500,
@@ -51,13 +67,184 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 
 class LogRequestsMiddleware(BaseHTTPMiddleware):
-    """Класс миддлварь для логгирования всех запросов на старте"""
+    """
+    Класс миддлварь для логгирования запроса одной строкой
+    с request_id, шаблоном роута, статусом и временем ответа
+    """
     async def dispatch(self, request: Request, call_next):
-        logger.info(f"{request.method} Path: {request.url.path}")
-        response = await call_next(request)
-        if response.status_code < 400:
-            logger.info(
-                f"Response Status: {response.status_code} | "
-                f"Path: {request.url.path}"
+        request_id = request.headers.get("X-Request-ID") or uuid4().hex
+        context = {
+            "request_id": request_id,
+            "method": request.method,
+            "sampled_out": is_sampled_out(request.url.path),
+        }
+        token = log_context.set(context)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+            # шаблон роута вместо пути, чтобы не плодить уникальные значения
+            route = request.scope.get("route")
+            context["route"] = route.path if route else "other"
+            context["status"] = response.status_code
+            context["latency_ms"] = round(
+                (time.perf_counter() - start) * 1000, 2
+            )
+            if response.status_code >= 400:
+                context["sampled_out"] = False
+            logger.info("Request completed")
+            response.headers["X-Request-ID"] = request_id
+            return response
+        finally:
+            log_context.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    Класс миддлварь для сбора метрик запросов: время ответа по шаблону
+    роута и статусу, попадания в кэш fastapi-cache по роуту
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response_start = {}
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                response_start.update(message)
+            await send(message)
+
+        status = 500
+        try:
+            await self.app(scope, receive, send_wrapper)
+            status = response_start.get("status", 500)
+        finally:
+            route = scope.get("route")
+            route_path = route.path if route else "other"
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=route_path,
+                status=status,
+            ).observe(time.perf_counter() - start)
+            for name, value in response_start.get("headers", []):
+                if name.lower() == CACHE_STATUS_HEADER:
+                    CACHE_REQUESTS.labels(
+                        namespace=route_path,
+                        result=value.decode("latin-1").lower(),
+                    ).inc()
+                    break
+
+
+class TracingMiddleware:
+    """
+    Класс миддлварь для корневого спана запроса: продолжает трейс
+    из заголовка traceparent, имя спана - метод и шаблон роута
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        with tracer.start_as_current_span(
+            scope["method"],
+            context=extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+            },
+        ) as span:
+
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    span.set_attribute("http.response.status_code", status)
+                    if status >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route:
+                    span.set_attribute("http.route", route.path)
+                    span.update_name(f"{scope['method']} {route.path}")
+
+
+class AdmissionControlMiddleware:
+    """
+    Класс миддлварь для ограничения одновременных запросов:
+    при долгом ожидании слота отвечает 503 с Retry-After,
+    дешёвые кэшируемые GET запросы проходят без очереди
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or is_exempt(
+            scope["method"],
+            scope["path"],
+        ):
+            await self.app(scope, receive, send)
+            return
+        try:
+            acquired = await admission.acquire(scope["path"])
+        except Overloaded:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Service overloaded, retry later"},
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
             )
-        return response
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(acquired)
+
+
+class CoalescingMiddleware:
+    """
+    Класс миддлварь для объединения одинаковых одновременных GET запросов:
+    обработчик выполняется один раз, байты ответа получают все
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        key = coalesce_key(scope) if scope["type"] == "http" else None
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        response = await coalescer.get_response(self.app, scope, key)
+        if response is None:
+            await self.app(scope, receive, send)
+            return
+        status, headers, body, route = response
+        if route is not None:
+            scope.setdefault("route", route)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": list(headers),
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -1,20 +1,67 @@
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from utils.metrics import REDIS_COMMAND_LATENCY, observe
+from utils.tracing import start_span
 from config import settings
 
 
-async def get_redis():
-    redis = Redis(
+class InstrumentedPipeline(Pipeline):
+    """Pipeline с замером времени выполнения и спаном трейсинга"""
+
+    async def execute(self, raise_on_error: bool = True):
+        attributes = {
+            "db.system": "redis",
+            "db.redis.pipeline_length": len(self.command_stack),
+        }
+        with (
+            start_span("redis PIPELINE", attributes),
+            observe(REDIS_COMMAND_LATENCY, command="PIPELINE"),
+        ):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedRedis(Redis):
+    """Клиент Redis с замером времени выполнения команд и спанами"""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        with (
+            start_span(f"redis {command}", {"db.system": "redis"}),
+            observe(REDIS_COMMAND_LATENCY, command=command),
+        ):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return InstrumentedPipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
+
+
+def _create_pool(decode_responses: bool) -> BlockingConnectionPool:
+    """
+    Общий на процесс пул соединений, при исчерпании
+    запрос ждёт свободное соединение, а не открывает новое
+    """
+    return BlockingConnectionPool(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
-        decode_responses=True,
+        decode_responses=decode_responses,
+        max_connections=settings.redis_pool_size,
     )
+
+
+redis_pool = _create_pool(decode_responses=True)
+redis_pool_no_decode = _create_pool(decode_responses=False)
+
+
+async def get_redis():
+    redis = InstrumentedRedis(connection_pool=redis_pool)
     return redis
 
 
 async def get_redis_no_decode():
-    redis = Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        decode_responses=False,
-    )
+    redis = InstrumentedRedis(connection_pool=redis_pool_no_decode)
     return redis
@@ -1,34 +1,105 @@
-import aio_pika
-import json
+import asyncio
 import logging
-import logging.config
-from utils.logger import logging_config
+from opentelemetry.propagate import extract, inject
+from utils.json_codec import dumps
+from utils.metrics import RMQ_PUBLISH_LATENCY, observe
+from utils.tracing import start_span, SpanKind
 from config import settings
 
 
-logging.config.dictConfig(logging_config)
 logger = logging.getLogger("rabbit_producer")
 
+_connection = None
+_channel = None
+_exchanges = {}
+_connect_lock = asyncio.Lock()
 
-async def publish_confirmations(event_data: dict):
+
+async def get_rmq_channel():
     """
-    Функция для публикации в rabbitmq информации об
-    успешном подтверждении почты
+    Канал RabbitMQ на общем соединении процесса, соединение открывается
+    при первой публикации и переподключается само (connect_robust)
     """
-    try:
-        connection = await aio_pika.connect_robust(
-            f"amqp://{settings.RMQ_USER}:{settings.RMQ_PASSWORD}@"
-            f"{settings.RMQ_HOST}:{settings.RMQ_PORT}/"
-        )
-        channel = await connection.channel()
-        await channel.default_exchange.publish(
-            aio_pika.Message(body=json.dumps(event_data).encode()),
-            routing_key="user_confirmations",
+    global _connection, _channel, _exchanges
+    async with _connect_lock:
+        if _connection is None:
+            import aio_pika
+
+            _connection = await aio_pika.connect_robust(
+                f"amqp://{settings.RMQ_USER}:{settings.RMQ_PASSWORD}@"
+                f"{settings.RMQ_HOST}:{settings.RMQ_PORT}/"
+            )
+        if _channel is None or _channel.is_closed:
+            # publish ждёт подтверждения брокера (publisher confirms)
+            _channel = await _connection.channel(publisher_confirms=True)
+            _exchanges = {}
+    return _channel
+
+
+async def get_exchange(channel, name: str):
+    """Topic exchange по имени (объявляется один раз на канал)"""
+    if not name:
+        return channel.default_exchange
+    if name not in _exchanges:
+        import aio_pika
+
+        _exchanges[name] = await channel.declare_exchange(
+            name, aio_pika.ExchangeType.TOPIC, durable=True
         )
-        await connection.close()
-        logger.info("Message published")
-    except Exception as e:
-        logger.error(
-            f"Failed to publish message to RabbitMQ: {e}",
-            exc_info=True,
+    return _exchanges[name]
+
+
+async def close_rmq_connection():
+    """Закрытие соединения с RabbitMQ при остановке приложения"""
+    global _connection, _channel, _exchanges
+    if _connection is not None:
+        await _connection.close()
+    _connection = None
+    _channel = None
+    _exchanges = {}
+
+
+async def publish_message(
+    exchange: str,
+    routing_key: str,
+    payload: dict,
+    headers: dict | None = None,
+    message_id: str | None = None,
+):
+    """
+    Публикация сообщения с ожиданием подтверждения брокера.
+    Ошибка публикации или отказ брокера пробрасываются вызывающему
+    """
+    import aio_pika
+
+    channel = await get_rmq_channel()
+    destination = exchange or routing_key
+    attributes = {
+        "messaging.system": "rabbitmq",
+        "messaging.destination.name": destination,
+    }
+    with (
+        start_span(
+            f"rabbitmq publish {destination}",
+            attributes,
+            SpanKind.PRODUCER,
+            context=extract(headers or {}),
+        ),
+        observe(RMQ_PUBLISH_LATENCY, routing_key=destination),
+    ):
+        # traceparent спана публикации, чтобы консьюмер продолжил трейс
+        message_headers = dict(headers or {})
+        inject(message_headers)
+        target = await get_exchange(channel, exchange)
+        await target.publish(
+            aio_pika.Message(
+                body=dumps(payload),
+                headers=message_headers,
+                message_id=message_id,
+                content_type="application/json",
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=routing_key,
+            mandatory=False,
+            timeout=settings.RMQ_PUBLISH_TIMEOUT,
         )
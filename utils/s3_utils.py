@@ -1,29 +1,85 @@
-import boto3
 import logging
-import logging.config
+import threading
+import time
 from fastapi import UploadFile, HTTPException
 from botocore.exceptions import ClientError
-from botocore.config import Config
 from db.connect import AsyncSessionLocal
 from db.operations import ProductDO
 from db.models import Product
-from utils.logger import logging_config
+from utils.metrics import S3_CALL_LATENCY
+from utils.tracing import tracer, SpanKind, Status, StatusCode
 from config import settings
 
 
-logging.config.dictConfig(logging_config)
 logger = logging.getLogger("s3")
 
 
-# Создаем клиент S3 с указанием ссылки на хранилище
-s3_client = boto3.client(
-    "s3",
-    endpoint_url=settings.S3_HOST,
-    aws_access_key_id=settings.S3_ACCESS_KEY,
-    aws_secret_access_key=settings.S3_SECRET_KEY,
-    config=Config(signature_version="s3v4"),
-    use_ssl=False,
-)
+def _start_s3_timer(model, context, **kwargs):
+    """
+    Хук boto3 перед вызовом API - запоминаем операцию, время старта
+    и открываем спан трейсинга
+    """
+    context["metrics_operation"] = model.name
+    context["metrics_start"] = time.perf_counter()
+    context["trace_span"] = tracer.start_span(
+        f"s3 {model.name}",
+        kind=SpanKind.CLIENT,
+        attributes={"rpc.system": "aws-api", "rpc.method": model.name},
+    )
+
+
+def _observe_s3_call(context, **kwargs):
+    """
+    Хук boto3 после вызова API - пишем время выполнения в метрики
+    и закрываем спан (с ошибкой, если вызов упал)
+    """
+    start = context.pop("metrics_start", None)
+    if start is not None:
+        S3_CALL_LATENCY.labels(
+            operation=context.pop("metrics_operation"),
+        ).observe(time.perf_counter() - start)
+    span = context.pop("trace_span", None)
+    if span is not None:
+        if kwargs.get("exception") is not None:
+            span.record_exception(kwargs["exception"])
+            span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def _create_s3_client():
+    """Создание клиента S3 с указанием ссылки на хранилище"""
+    import boto3
+    from botocore.config import Config
+
+    client = boto3.client(
+        "s3",
+        endpoint_url=settings.S3_HOST,
+        aws_access_key_id=settings.S3_ACCESS_KEY,
+        aws_secret_access_key=settings.S3_SECRET_KEY,
+        config=Config(signature_version="s3v4"),
+        use_ssl=False,
+    )
+    client.meta.events.register("before-call.s3", _start_s3_timer)
+    client.meta.events.register("after-call.s3", _observe_s3_call)
+    client.meta.events.register("after-call-error.s3", _observe_s3_call)
+    return client
+
+
+def get_s3_client():
+    """
+    Клиент S3 создаётся при первом обращении:
+    импорт boto3 и создание клиента заметно увеличивают время старта
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = _create_s3_client()
+    return _s3_client
 
 
 def check_file_exists_to_s3(
@@ -33,19 +89,21 @@ def check_file_exists_to_s3(
     Проверка файла в хранилище S3
     """
     try:
-        s3_client.head_object(
+        get_s3_client().head_object(
             Bucket=settings.S3_BACKET,
             Key=file_path,
         )
-        logger.info(f"File found in S3: {file_path}")
+        logger.info("File found in S3: %s", file_path)
         return True
     except ClientError as e:
         if e.response["Error"]["Code"] == "404":
-            logger.info(f"File not found in S3: {file_path}")
+            logger.info("File not found in S3: %s", file_path)
             return False
         else:
             logger.error(
-                f"Error checking file in S3: {file_path}, {e}",
+                "Error checking file in S3: %s, %s",
+                file_path,
+                e,
                 exc_info=True,
             )
             raise e
@@ -56,7 +114,7 @@ def get_last_modified_to_s3(file_path: str):
     Получение даты последнего изменения файла в S3
     """
     try:
-        response = s3_client.head_object(
+        response = get_s3_client().head_object(
             Bucket=settings.S3_BACKET,
             Key=file_path,
         )
@@ -64,7 +122,9 @@ def get_last_modified_to_s3(file_path: str):
         return last_modified
     except ClientError as e:
         logger.error(
-            f"Error getting last modified date for {file_path}: {e}",
+            "Error getting last modified date for %s: %s",
+            file_path,
+            e,
             exc_info=True,
         )
         raise e
@@ -84,7 +144,7 @@ async def upload_to_s3(
     """
     new_file_name = file.filename
     file_path = f"{settings.STATIC_DIR}/{file_folder}/{new_file_name}"
-    logger.info(f"Uploading file to S3: {file_path}")
+    logger.info("Uploading file to S3: %s", file_path)
     file_exists = check_file_exists_to_s3(file_path)
     if file_exists:
         async with AsyncSessionLocal() as session:
@@ -105,17 +165,19 @@ async def upload_to_s3(
     if old_file_name and old_file_name != new_file_name:
         await delete_from_s3(file_folder, old_file_name)
     try:
-        s3_client.upload_fileobj(
+        get_s3_client().upload_fileobj(
             file.file,
             settings.S3_BACKET,
             file_path,
             ExtraArgs={"ACL": "public-read"},
         )
-        logger.info(f"File uploaded successfully: {file_path}")
+        logger.info("File uploaded successfully: %s", file_path)
         return new_file_name
     except Exception as e:
         logger.error(
-            f"Failed to upload file {file_path}: {e}",
+            "Failed to upload file %s: %s",
+            file_path,
+            e,
             exc_info=True,
         )
         raise e
@@ -129,14 +191,16 @@ async def delete_from_s3(file_folder: str, file_name: str):
         return None
     file_path = f"{settings.STATIC_DIR}/{file_folder}/{file_name}"
     try:
-        s3_client.delete_object(
+        get_s3_client().delete_object(
             Bucket=settings.S3_BACKET,
             Key=file_path,
         )
-        logger.info(f"File deleted from S3: {file_path}")
+        logger.info("File deleted from S3: %s", file_path)
     except Exception as e:
         logger.error(
-            f"Failed to delete file {file_path}: {e}",
+            "Failed to delete file %s: %s",
+            file_path,
+            e,
             exc_info=True,
         )
         raise e
@@ -151,5 +215,5 @@ def get_s3_url(file_folder: str, file_name: str):
     if check_file_exists_to_s3(file_path=file_path):
         file_url = f"/{file_path}?{last_modifed}"
         return f"{settings.S3_HOST}{settings.S3_BACKET}{file_url}"
-    logger.warning(f"File not found in S3, cannot generate URL: {file_path}")
+    logger.warning("File not found in S3, cannot generate URL: %s", file_path)
     return None
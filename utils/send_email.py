@@ -1,28 +1,39 @@
 import logging
-import logging.config
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from utils.logger import logging_config
 from config import settings
 
 
-logging.config.dictConfig(logging_config)
 logger = logging.getLogger("send_email")
 
+_mail = None
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-)
+
+def get_mail():
+    """
+    Клиент почты создаётся при первой отправке:
+    импорт fastapi_mail и валидация конфига заметно увеличивают время старта
+    """
+    global _mail
+    if _mail is None:
+        from fastapi_mail import FastMail, ConnectionConfig
+
+        conf = ConnectionConfig(
+            MAIL_USERNAME=settings.MAIL_USERNAME,
+            MAIL_PASSWORD=settings.MAIL_PASSWORD,
+            MAIL_FROM=settings.MAIL_FROM,
+            MAIL_PORT=settings.MAIL_PORT,
+            MAIL_SERVER=settings.MAIL_SERVER,
+            MAIL_STARTTLS=True,
+            MAIL_SSL_TLS=False,
+            USE_CREDENTIALS=True,
+        )
+        _mail = FastMail(conf)
+    return _mail
 
 
 async def send_confirmation_email(email: str, token: str):
     """Функция отправки письма подтверждения почты"""
+    from fastapi_mail import MessageSchema
+
     confirm_url = (
         f"http://{settings.SERVER_HOST}:{settings.SERVER_PORT}/"
         f"users/confirm-email/{token}/"
@@ -55,11 +66,7 @@ async def send_confirmation_email(email: str, token: str):
         subtype="html",
     )
     try:
-        fm = FastMail(conf)
-        await fm.send_message(message)
+        await get_mail().send_message(message)
         logger.info("Confirmation email successfully sent")
     except Exception as e:
-        logger.error(
-            f"Failed to send confirmation email {e}",
-            exc_info=True,
-        )
+        logger.error("Failed to send confirmation email %s", e, exc_info=True)
@@ -0,0 +1,50 @@
+import base64
+import json
+import os
+import threading
+from google.protobuf.json_format import MessageToDict
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import (
+    encode_spans,
+)
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+
+def _hex_ids(value):
+    """
+    Перевод trace/span id из base64 (protobuf JSON) в hex,
+    как требует спецификация OTLP/JSON
+    """
+    if isinstance(value, dict):
+        return {
+            key: (
+                base64.b64decode(item).hex()
+                if key in ("traceId", "spanId", "parentSpanId")
+                else _hex_ids(item)
+            )
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_hex_ids(item) for item in value]
+    return value
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Экспорт спанов в файл в формате OTLP/JSON (одна строка на батч),
+    файл читается ресивером otlpjsonfile у OpenTelemetry Collector
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans):
+        request = MessageToDict(encode_spans(spans))
+        line = json.dumps(_hex_ids(request), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from config import settings
+
+
+SERVICE_NAME = "fastfood-api"
+
+
+class AppTracer(trace.Tracer):
+    """
+    Трейсер приложения: спаны через провайдер из setup_tracing,
+    без него (и после shutdown_tracing) - no-op. Глобальный провайдер
+    OpenTelemetry не используется, поэтому настройку можно повторить
+    """
+
+    def __init__(self):
+        self.real: trace.Tracer | None = None
+        self.noop = trace.NoOpTracer()
+
+    def start_span(self, *args, **kwargs) -> trace.Span:
+        return (self.real or self.noop).start_span(*args, **kwargs)
+
+    @contextmanager
+    def start_as_current_span(self, *args, **kwargs):
+        with (self.real or self.noop).start_as_current_span(
+            *args, **kwargs
+        ) as span:
+            yield span
+
+
+tracer = AppTracer()
+
+_provider = None
+
+
+def setup_tracing():
+    """
+    Настройка трейсинга: семплирование по доле trace id,
+    экспорт по OTLP HTTP или в файл (если OTLP_ENDPOINT не задан),
+    спаны SQL запросов движков БД. Без настройки все спаны no-op
+    """
+    global _provider
+    if not settings.TRACING_ENABLED or _provider is not None:
+        return
+    # SDK импортируется только при включённом трейсинге
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import (
+        ParentBased,
+        TraceIdRatioBased,
+    )
+
+    if settings.OTLP_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        exporter = OTLPSpanExporter(endpoint=settings.OTLP_ENDPOINT)
+    else:
+        from utils.trace_exporter import FileSpanExporter
+
+        exporter = FileSpanExporter(settings.TRACE_FILE)
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATE)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    tracer.real = _provider.get_tracer(SERVICE_NAME)
+
+    from db.connect import engine, replica_engine
+
+    for db_engine in (engine, replica_engine):
+        if db_engine is not None:
+            instrument_engine(db_engine.sync_engine)
+
+
+def shutdown_tracing():
+    """Выгрузка оставшихся спанов, дальше спаны no-op"""
+    global _provider
+    if _provider is not None:
+        tracer.real = None
+        _provider.shutdown()
+        _provider = None
+
+
+@contextmanager
+def start_span(
+    name: str,
+    attributes: dict | None = None,
+    kind: SpanKind = SpanKind.CLIENT,
+    context=None,
+):
+    """
+    Контекстный менеджер спана с записью исключения в спан
+    (context - родительский контекст, если он не текущий)
+    """
+    with tracer.start_as_current_span(
+        name,
+        context=context,
+        kind=kind,
+        attributes=attributes,
+        record_exception=True,
+        set_status_on_exception=True,
+    ) as span:
+        yield span
+
+
+def _start_db_span(conn, cursor, statement, params, context, many):
+    context._trace_span = tracer.start_span(
+        f"db {statement.split(None, 1)[0].upper()}",
+        kind=SpanKind.CLIENT,
+        attributes={
+            "db.system": "postgresql",
+            "db.statement": statement,
+        },
+    )
+
+
+def _end_db_span(conn, cursor, statement, params, context, many):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.end()
+
+
+def _fail_db_span(exception_context):
+    context = exception_context.execution_context
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+
+def instrument_engine(engine):
+    """
+    Спаны для SQL запросов через события движка SQLAlchemy,
+    повторный вызов для того же движка ничего не делает
+    """
+    from sqlalchemy import event
+
+    if event.contains(engine, "before_cursor_execute", _start_db_span):
+        return
+    event.listen(engine, "before_cursor_execute", _start_db_span)
+    event.listen(engine, "after_cursor_execute", _end_db_span)
+    event.listen(engine, "handle_error", _fail_db_span)
@@ -0,0 +1,48 @@
+import signal
+import sys
+import time
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn_worker import UvicornWorker
+from utils import lifespan
+from config import settings
+
+
+class DrainingServer(Server):
+    """
+    Сервер uvicorn, который на первый SIGTERM не останавливается сразу:
+    /health/ready начинает отвечать 503, а запросы принимаются ещё
+    SHUTDOWN_DRAIN_DELAY секунд, пока балансировщик снимает воркер.
+    Затем обычная остановка uvicorn: новые соединения не принимаются,
+    текущие запросы дорабатывают, выполняется shutdown lifespan
+    """
+
+    drain_until: float | None = None
+
+    def handle_exit(self, sig, frame):
+        if sig == signal.SIGTERM and not lifespan.draining:
+            lifespan.draining = True
+            self.drain_until = time.monotonic() + settings.SHUTDOWN_DRAIN_DELAY
+            return
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        drain_until = self.drain_until
+        if drain_until is not None and time.monotonic() >= drain_until:
+            self.drain_until = None
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+class AppUvicornWorker(UvicornWorker):
+    """Воркер gunicorn с event loop uvloop и HTTP парсером httptools"""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+    async def _serve(self):
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)